@@ -5,12 +5,17 @@ import tkMessageBox
 import ttk
 
 from components.util import ordinal
-from components.messaging import Receiver, Broadcaster
+from components.messaging import Receiver, Broadcaster, reacts_to
+from components.concurrency import Reactor, ReactorPool
 from components.robots import HamsterComm, Robot
 from components.world import VirtualWorld
 
 MIN_RSSI = -60
 
+def _canvas_item_key(signal):
+    """Returns the canvas item id of an UpdateCoords Signal."""
+    return signal.Data[0]
+
 class AutoScrollbar(ttk.Scrollbar):
     """A scrollbar that automatically hides if unneeded."""
     def set(self, low, high):
@@ -28,6 +33,10 @@ class GUIReactor(Receiver):
     the caller until the GUI exits.
     Has the same abstract method semantics as Reactors. Unlike Reactors, this
     must run in the main thread.
+    If an EventLoop is set, the GUI also runs the EventLoop each time it reacts to
+    received Signals, so that threads on the EventLoop share the Tk mainloop's thread.
+    Updates are scheduled at whole multiples of the update interval, so that they do not
+    drift and stay aligned with TimerWheel timers of the same period.
     """
     def __init__(self, name="GUI", update_interval=10):
         super(GUIReactor, self).__init__()
@@ -36,6 +45,7 @@ class GUIReactor(Receiver):
         self._root.title(name)
         self.__initialize_theming()
         self.__update_interval = update_interval
+        self.__event_loop = None
     def __initialize_theming(self):
         style = ttk.Style()
         # Set theme
@@ -54,6 +64,9 @@ class GUIReactor(Receiver):
     def get_name(self):
         """Returns the name of the thread instance as specified during instantiation."""
         return self.__name
+    def set_event_loop(self, event_loop):
+        """Runs the EventLoop from the Tk mainloop, without blocking it."""
+        self.__event_loop = event_loop
 
     # Event loop
     def start(self):
@@ -69,7 +82,11 @@ class GUIReactor(Receiver):
     def _run(self):
         """Reacts to any received signals and then sleeps for a bit."""
         self._react_all()
-        self._root.after(self.__update_interval, self._run)
+        if self.__event_loop is not None:
+            self.__event_loop.run_once(0)
+        interval = self.__update_interval
+        delay = interval - int(time.time() * 1000) % interval
+        self._root.after(delay, self._run)
 
     # Abstract methods
     def _run_pre(self):
@@ -80,14 +97,28 @@ class GUIReactor(Receiver):
         pass
 
 class RobotApp(GUIReactor, Broadcaster):
-    """Shows a simple window with a hello world message and a quit button."""
-    def __init__(self, name="App", update_interval=10, num_robots=1):
+    """Shows a simple window with a hello world message and a quit button.
+    If a number of workers is given, the Reactors managed by the app run on a shared
+    ReactorPool with that many worker threads, instead of one thread each. If an
+    EventLoop is given instead, all threads managed by the app run on the EventLoop,
+    which runs in the GUI's thread. If a TimerWheel is given, the periodic work of
+    threads managed by the app which are not Reactors, such as VirtualRobots and
+    Monitors, runs as timers on the TimerWheel, which the app starts and quits.
+    """
+    def __init__(self, name="App", update_interval=10, num_robots=1, num_workers=None,
+                 event_loop=None, timer_wheel=None):
         super(RobotApp, self).__init__(name, update_interval)
         self.__hamster_comm = None
         self._num_robots = num_robots
         self.__virtual_robot_generator = self._generate_virtual_robots()
         self._robots = []
         self._threads = {}
+        if num_workers is None:
+            self.__reactor_pool = None
+        else:
+            self.__reactor_pool = ReactorPool(num_workers, "{} Reactor Pool".format(name))
+        self.__event_loop = event_loop
+        self.__timer_wheel = timer_wheel
         self.__connect_button = None
         self.__quit_button = None
 
@@ -95,6 +126,10 @@ class RobotApp(GUIReactor, Broadcaster):
     def _run_post(self):
         for _, thread in self._threads.items():
             thread.quit()
+        if self.__reactor_pool is not None:
+            self.__reactor_pool.quit()
+        if self.__timer_wheel is not None:
+            self.__timer_wheel.quit()
         if self.__hamster_comm is None:
             return
         for hamster_robot in self.__hamster_comm.robotList:
@@ -127,6 +162,20 @@ class RobotApp(GUIReactor, Broadcaster):
         self._threads[thread.get_name()] = thread
     def _start_threads(self):
         """Starts all threads managed by the app."""
+        if self.__reactor_pool is not None:
+            for _, thread in self._threads.items():
+                if isinstance(thread, Reactor):
+                    thread.set_executor(self.__reactor_pool)
+            self.__reactor_pool.start()
+        if self.__event_loop is not None:
+            for _, thread in self._threads.items():
+                thread.set_event_loop(self.__event_loop)
+            self.set_event_loop(self.__event_loop)
+        if self.__timer_wheel is not None:
+            for _, thread in self._threads.items():
+                if not isinstance(thread, Reactor):
+                    thread.set_timer_wheel(self.__timer_wheel)
+            self.__timer_wheel.start()
         for _, thread in self._threads.items():
             thread.start()
     def _disable_connect_button(self, new_text):
@@ -203,16 +252,20 @@ class Simulator(RobotApp):
     Signals Received:
         Will react to any Signal of correct name.
         UpdateCoords: Data should be a 2-tuple of the canvas item specifier and a
-        tuple of the new coords.
+        tuple of the new coords. Conflated per canvas item, so only the latest
+        coords of each item are drawn.
     """
-    def __init__(self, name="Simulator", update_interval=10, num_robots=1):
-        super(Simulator, self).__init__(name, update_interval, num_robots)
+    def __init__(self, name="Simulator", update_interval=10, num_robots=1, num_workers=None,
+                 event_loop=None, timer_wheel=None):
+        super(Simulator, self).__init__(name, update_interval, num_robots, num_workers,
+                                        event_loop, timer_wheel)
         self.__canvas = None
         self.__bounds = None
         self.__scale = 1
         self.__reset_button = None
         self.__run_button = None
         self._world = None
+        self.conflate("UpdateCoords", _canvas_item_key)
 
     # Utility for subclasses
     def _initialize_simulator_widgets(self, parent, bounds, scale=1):
@@ -324,12 +377,13 @@ class Simulator(RobotApp):
 
     # Implementation of parent abstract methods
     def _react(self, signal):
-        if signal.Name == "UpdateCoords":
-            self.__canvas.coords(signal.Data[0], *signal.Data[1])
-        elif signal.Name == "UpdateConfig":
-            self.__canvas.itemconfig(signal.Data[0], **signal.Data[1])
-        else:
-            self._react_simulator(signal)
+        self._dispatch(signal, self._react_simulator)
+    @reacts_to("UpdateCoords")
+    def __react_update_coords(self, signal):
+        self.__canvas.coords(signal.Data[0], *signal.Data[1])
+    @reacts_to("UpdateConfig")
+    def __react_update_config(self, signal):
+        self.__canvas.itemconfig(signal.Data[0], **signal.Data[1])
     def _add_robot_post(self, robot):
         """Add the robot to the virtual world."""
         self._world.add_robot(robot)
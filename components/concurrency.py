@@ -1,26 +1,136 @@
 """Convenience classes to support Actor model of concurrency, backed by threads."""
+import time
+import heapq
 import threading
-from collections import namedtuple
+import traceback
+import math
+from itertools import count
+from collections import namedtuple, deque
 import Queue as queue
 
 from components.messaging import Receiver
 
+_STEP_TOLERANCE = 1e-9 # fraction of a SimulationClock step or TimerWheel tick by which
+                       # times are rounded down
+
+class Clock(object):
+    """Interface class for a source of time, so that time can be simulated."""
+    def time(self):
+        """Returns the current time, in seconds."""
+        pass
+    def sleep(self, seconds):
+        """Blocks for the specified number of seconds."""
+        pass
+    def wait(self, condition, timeout=None):
+        """Waits on the acquired threading.Condition until notified or until the timeout,
+        in seconds, elapses.
+        """
+        pass
+
+class RealClock(Clock):
+    """A Clock which follows the wall clock."""
+    def time(self):
+        return time.time()
+    def sleep(self, seconds):
+        time.sleep(seconds)
+    def wait(self, condition, timeout=None):
+        condition.wait(timeout)
+
+class SimulationClock(Clock):
+    """A Clock which advances in fixed steps only when something waits or sleeps on it.
+    Time never passes while callbacks run, and waiting jumps straight to the end of the
+    wait, rounded up to a whole step, so that simulations run as fast as the CPU allows
+    and the same inputs always give the same results. Times are computed from an integer
+    step count so that they do not accumulate rounding error; a time within rounding error
+    of a step is reached exactly, so that timers scheduled for it are due.
+    Should only be used by an EventLoop and by the coroutines and Reactors running on it;
+    a sleep on the clock stalls the loop, as it would with a RealClock. A loop with nothing
+    ready and no timers blocks until another thread schedules something or stops it.
+    """
+    def __init__(self, step=0.001, start=0.0):
+        super(SimulationClock, self).__init__()
+        self.__step = step
+        self.__start = start
+        self.__num_steps = 0
+        self.__time = start
+        self.__lock = threading.Lock()
+
+    def get_step(self):
+        """Returns the length of a step, in seconds."""
+        return self.__step
+    def get_num_steps(self):
+        """Returns the number of steps the clock has advanced by."""
+        return self.__num_steps
+    def advance(self, seconds):
+        """Advances the clock by at least the specified number of seconds."""
+        self.advance_to(self.time() + seconds)
+    def advance_to(self, when):
+        """Advances the clock to the first step at or after the specified time."""
+        num_steps = int(math.ceil((when - self.__start) / self.__step - _STEP_TOLERANCE))
+        with self.__lock:
+            if num_steps >= self.__num_steps:
+                self.__num_steps = num_steps
+                self.__time = max(self.__time, when, self.__start + num_steps * self.__step)
+
+    # Implementation of parent abstract methods
+    def time(self):
+        return self.__time
+    def sleep(self, seconds):
+        self.advance(seconds)
+    def wait(self, condition, timeout=None):
+        # Without a timeout there is no time to skip ahead to, so only another thread can
+        # make progress, by notifying the condition; with one, time skips to its end.
+        if timeout is None:
+            condition.wait()
+        else:
+            self.advance(timeout)
+
 class InterruptableThread(object):
-    """Interface class to support easier threading."""
+    """Interface class to support easier threading.
+    If an EventLoop is set before the thread is started, the _run_coroutine method is
+    run as a coroutine on the EventLoop instead of running the _run method in a new thread.
+    If a TimerWheel is set instead, the _start_timers method schedules the thread's
+    periodic work on the TimerWheel.
+    """
     def __init__(self, name):
         super(InterruptableThread, self).__init__()
         self.__name = name
         self.__quit_flag = threading.Event()
         self.__thread = threading.Thread(target=self._run, name=name)
+        self.__event_loop = None
+        self.__task = None
+        self.__timer_wheel = None
 
     def get_name(self):
         """Returns the name of the thread instance as specified during instantiation."""
         return self.__name
+    def set_event_loop(self, event_loop):
+        """Runs the thread as a coroutine on the EventLoop instead of in its own thread.
+        Must be called before the thread is started.
+        """
+        self.__event_loop = event_loop
+    def set_timer_wheel(self, timer_wheel):
+        """Runs the thread's periodic work as timers on the TimerWheel instead of in its
+        own thread. Must be called before the thread is started.
+        """
+        self.__timer_wheel = timer_wheel
 
     # Threading
     def start(self):
-        """Starts the thread."""
-        self.__thread.start()
+        """Starts the thread.
+
+        Exceptions:
+            ValueError: an EventLoop or TimerWheel was set, but the thread does not
+            implement the abstract method needed to run on it.
+        """
+        if self.__timer_wheel is not None:
+            self.__check_implemented("_start_timers", "a TimerWheel")
+            self._start_timers(self.__timer_wheel)
+        elif self.__event_loop is None:
+            self.__thread.start()
+        else:
+            self.__check_implemented("_run_coroutine", "an EventLoop")
+            self.__task = self.__event_loop.spawn(self._run_coroutine())
     def will_quit(self):
         """Checks whether the thread is supposed to quit."""
         return self.__quit_flag.is_set()
@@ -28,11 +138,25 @@ class InterruptableThread(object):
         """Quits and joins with the thread, if it's running."""
         self._quit_soon()
         self._wake()
-        if self.__thread.is_alive():
+        if self.__timer_wheel is not None:
+            self._stop_timers()
+        elif self.__task is not None:
+            self.__task.wake()
+            self.__event_loop.join_task(self.__task)
+        elif self.__thread.is_alive():
             self.__thread.join()
+    def __check_implemented(self, method_name, executor_description):
+        if getattr(type(self), method_name) == getattr(InterruptableThread, method_name):
+            raise ValueError("{} cannot run on {}".format(type(self).__name__,
+                                                          executor_description))
     def _quit_soon(self):
         """Marks the flag that the thread will check to quit."""
         self.__quit_flag.set()
+    def _resume(self):
+        """Resumes the coroutine as soon as possible, if it's running on an EventLoop and
+        sleeping. Thread-safe."""
+        if self.__task is not None:
+            self.__task.wake()
 
     # Abstract methods
     def _wake(self):
@@ -41,11 +165,77 @@ class InterruptableThread(object):
     def _run(self):
         """The function that will be run in a new thread."""
         pass
+    def _run_coroutine(self):
+        """A generator to be run as a coroutine on an EventLoop in place of the _run method.
+        It should yield the number of seconds to sleep before resuming, 0 to let other
+        work run, or None to sleep until woken, and should return when the thread is
+        supposed to quit.
+        """
+        pass
+    def _start_timers(self, timer_wheel):
+        """Schedules the thread's periodic work on the TimerWheel, in place of the _run
+        method. Timer callbacks run on the TimerWheel's thread, so they should not block.
+        """
+        pass
+    def _stop_timers(self):
+        """Cancels the timers scheduled by _start_timers, as the thread quits."""
+        pass
 
 class Reactor(InterruptableThread, Receiver):
-    """Models an event-driven thread that receives & handles Signals as messages."""
+    """Models an event-driven thread that receives & handles Signals as messages.
+    By default each Reactor runs in its own thread. If an executor, such as a ReactorPool,
+    is set before the Reactor is started, the Reactor instead runs on the executor's
+    threads, with the same start, quit, and abstract method semantics; its Signals are
+    still processed one at a time, in order.
+    """
     def __init__(self, name):
         super(Reactor, self).__init__(name)
+        self.__executor = None
+
+    def set_executor(self, executor):
+        """Runs the Reactor on a shared executor instead of its own thread.
+        Must be called before the Reactor is started.
+
+        Arguments:
+            executor: a ReactorPool or an EventLoop, or None to run the Reactor in its
+            own thread.
+        """
+        self.__executor = executor
+    def get_executor(self):
+        """Returns the executor the Reactor runs on, or None if it runs in its own thread."""
+        return self.__executor
+    def set_event_loop(self, event_loop):
+        """Runs the Reactor on the EventLoop instead of in its own thread.
+        Must be called before the Reactor is started.
+        """
+        self.set_executor(event_loop)
+
+    # Extending parent functions in InterruptableThread and Receiver
+    def start(self):
+        """Starts the Reactor."""
+        if self.__executor is None:
+            super(Reactor, self).start()
+        else:
+            self.__executor.start_reactor(self)
+    def quit(self):
+        """Quits the Reactor and waits for it to finish, if it's running."""
+        if self.__executor is None:
+            super(Reactor, self).quit()
+        else:
+            self._quit_soon()
+            self._wake()
+            self.__executor.join_reactor(self)
+    def send(self, signal):
+        """Receives a Signal and wakes the Reactor if it is sleeping."""
+        super(Reactor, self).send(signal)
+        if self.__executor is not None:
+            self.__executor.schedule(self)
+    def send_many(self, signals):
+        """Receives a sequence of Signals in order and wakes the Reactor once if it is
+        sleeping."""
+        super(Reactor, self).send_many(signals)
+        if self.__executor is not None:
+            self.__executor.schedule(self)
 
     # Implementation of parent abstract methods
     def _wake(self):
@@ -62,6 +252,24 @@ class Reactor(InterruptableThread, Receiver):
                 self._quit_soon()
             self._received_done()
         self._run_post()
+    def _run_slice(self, max_signals):
+        """Reacts to up to max_signals waiting Signals without blocking, as in one pass
+        of the _run loop. Used by executors in place of the _run method.
+        Returns whether the Reactor should keep running.
+        """
+        for _ in xrange(0, max_signals):
+            if self.will_quit():
+                return False
+            try:
+                signal = self._receive(False)
+            except queue.Empty:
+                return True
+            if signal is not None:
+                self._react(signal)
+            else:
+                self._quit_soon()
+            self._received_done()
+        return not self.will_quit()
 
     # Abstract methods
     def _run_pre(self):
@@ -70,3 +278,584 @@ class Reactor(InterruptableThread, Receiver):
     def _run_post(self):
         """Executes after the thread ends. Useful for initialization."""
         pass
+
+class _PooledReactor(object):
+    """Bookkeeping for a Reactor running in a ReactorPool."""
+    def __init__(self):
+        super(_PooledReactor, self).__init__()
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.started = False
+        self.finished = threading.Event()
+
+class ReactorPool(object):
+    """Multiplexes many Reactors over a small, fixed number of worker threads.
+    A Reactor with waiting Signals is scheduled onto the pool's run queue, and a worker
+    then reacts to a batch of its Signals before moving on to the next scheduled Reactor.
+    Each Reactor is run by at most one worker at a time, so its Signals are processed
+    serially and in order, and its _run_pre and _run_post methods are called by a worker
+    before its first Signal and after it quits.
+    Reactors which block in _react, e.g. by sleeping, occupy a worker while they do so,
+    and Reactors which override the _run method cannot be pooled.
+    """
+    def __init__(self, num_workers=4, name="Reactor Pool", batch_size=16):
+        super(ReactorPool, self).__init__()
+        self.__name = name
+        self.__batch_size = batch_size
+        self.__run_queue = queue.Queue()
+        self.__reactors = {}
+        self.__reactors_lock = threading.Lock()
+        self.__workers = [threading.Thread(target=self.__work,
+                                           name="{} Worker {}".format(name, index))
+                          for index in range(0, num_workers)]
+
+    def get_name(self):
+        """Returns the name of the pool as specified during instantiation."""
+        return self.__name
+    def get_num_workers(self):
+        """Returns the number of worker threads."""
+        return len(self.__workers)
+
+    # Threading
+    def start(self):
+        """Starts the worker threads. Reactors may be started before or after the pool."""
+        for worker in self.__workers:
+            worker.start()
+    def quit(self):
+        """Stops and joins with the worker threads.
+        Reactors running in the pool should be quit first.
+        """
+        for _ in self.__workers:
+            self.__run_queue.put(None)
+        for worker in self.__workers:
+            if worker.is_alive():
+                worker.join()
+
+    # Reactor scheduling
+    def start_reactor(self, reactor):
+        """Starts running the Reactor in the pool. Called by Reactor.start."""
+        with self.__reactors_lock:
+            self.__reactors[reactor] = _PooledReactor()
+        self.schedule(reactor)
+    def schedule(self, reactor):
+        """Schedules the Reactor to react to its waiting Signals, unless it is already
+        scheduled or running. Called when a Signal is sent to the Reactor.
+        """
+        pooled = self.__reactors.get(reactor)
+        if pooled is None:
+            return # the Reactor has not been started yet, or has finished
+        with pooled.lock:
+            if pooled.scheduled:
+                return
+            pooled.scheduled = True
+        self.__run_queue.put(reactor)
+    def join_reactor(self, reactor):
+        """Blocks until the Reactor has quit and run its _run_post method, if it's running.
+        Does not block if called from a worker, since the worker may be needed to run it.
+        Called by Reactor.quit.
+        """
+        pooled = self.__reactors.get(reactor)
+        if pooled is None or threading.current_thread() in self.__workers:
+            return
+        pooled.finished.wait()
+    def __work(self):
+        while True:
+            reactor = self.__run_queue.get()
+            if reactor is None:
+                return
+            self.__run_reactor(reactor)
+    def __run_reactor(self, reactor):
+        pooled = self.__reactors[reactor]
+        try:
+            if not pooled.started:
+                pooled.started = True
+                reactor._run_pre()
+            running = reactor._run_slice(self.__batch_size)
+            if not running:
+                reactor._run_post()
+        except Exception:
+            # Like an exception in a Reactor's own thread, this stops the Reactor
+            traceback.print_exc()
+            running = False
+        if not running:
+            with self.__reactors_lock:
+                del self.__reactors[reactor]
+            pooled.finished.set()
+            return
+        with pooled.lock:
+            if reactor._num_waiting():
+                self.__run_queue.put(reactor)
+            else:
+                pooled.scheduled = False
+
+class TimerHandle(object):
+    """A callback scheduled on an EventLoop, which can be cancelled before it runs."""
+    def __init__(self, when, callback, args):
+        super(TimerHandle, self).__init__()
+        self.__when = when
+        self.__callback = callback
+        self.__args = args
+        self.__cancelled = False
+
+    def get_time(self):
+        """Returns the time at which the callback is scheduled to run."""
+        return self.__when
+    def cancel(self):
+        """Keeps the callback from running, if it hasn't run yet."""
+        self.__cancelled = True
+    def is_cancelled(self):
+        """Checks whether the callback was cancelled."""
+        return self.__cancelled
+    def _run(self):
+        if not self.__cancelled:
+            self.__callback(*self.__args)
+
+class Task(object):
+    """A generator-based coroutine running on an EventLoop.
+    The generator yields the number of seconds to sleep before it is resumed, or None to
+    sleep until the Task is woken. Starts running as soon as it is created.
+    """
+    def __init__(self, event_loop, coroutine):
+        super(Task, self).__init__()
+        self.__event_loop = event_loop
+        self.__coroutine = coroutine
+        self.__done = threading.Event()
+        self.__handle = event_loop.call_soon(self._step)
+
+    def is_done(self):
+        """Checks whether the coroutine has returned."""
+        return self.__done.is_set()
+    def wait(self, timeout=None):
+        """Blocks until the coroutine has returned. Must not be called on the EventLoop."""
+        self.__done.wait(timeout)
+    def wake(self):
+        """Resumes the coroutine as soon as possible, if it's sleeping."""
+        self.__event_loop.call_soon(self.__wake)
+    def cancel(self):
+        """Stops the coroutine without resuming it."""
+        self.__event_loop.call_soon(self.__cancel)
+    def _step(self):
+        self.__handle = None
+        try:
+            delay = next(self.__coroutine)
+        except StopIteration:
+            self.__done.set()
+            return
+        except Exception:
+            # Like an exception in a thread, this stops the coroutine
+            traceback.print_exc()
+            self.__done.set()
+            return
+        if delay:
+            self.__handle = self.__event_loop.call_later(delay, self._step)
+        elif delay is not None:
+            self.__handle = self.__event_loop.call_soon(self._step)
+    def __wake(self):
+        if not self.is_done():
+            if self.__handle is not None:
+                self.__handle.cancel()
+            self.__handle = self.__event_loop.call_soon(self._step)
+    def __cancel(self):
+        if self.__handle is not None:
+            self.__handle.cancel()
+            self.__handle = None
+        self.__coroutine.close()
+        self.__done.set()
+
+class EventLoop(object):
+    """Runs callbacks, timers, coroutines, and Reactors on a single thread.
+    The loop can be run in its own thread with the start method, in the calling thread
+    with the run_forever method, or one pass at a time with the run_once method, e.g.
+    from the Tk mainloop. Methods which schedule callbacks are thread-safe.
+    Reactors whose executor is an EventLoop react to one Signal at a time between other
+    callbacks, so they should not block in _react; nor should coroutines or callbacks.
+    The loop keeps time with its Clock, a RealClock by default. With a SimulationClock,
+    the loop skips ahead to its next timer instead of waiting for it.
+    """
+    def __init__(self, name="Event Loop", batch_size=16, clock=None):
+        super(EventLoop, self).__init__()
+        self.__name = name
+        self.__batch_size = batch_size
+        self.__wakeup = threading.Condition(threading.Lock())
+        self.__ready = deque()
+        self.__timers = []
+        self.__sequence = count()
+        self.__stopping = False
+        self.__loop_thread = None
+        self.__in_callback = False
+        self.__thread = threading.Thread(target=self.run_forever, name=name)
+        self.__reactors = {}
+        self.__clock = RealClock() if clock is None else clock
+
+    def get_name(self):
+        """Returns the name of the loop as specified during instantiation."""
+        return self.__name
+    def get_clock(self):
+        """Returns the loop's Clock."""
+        return self.__clock
+    def time(self):
+        """Returns the current time, in seconds, of the loop's clock."""
+        return self.__clock.time()
+
+    # Scheduling
+    def call_soon(self, callback, *args):
+        """Schedules the callback to be run on the loop as soon as possible.
+        Returns a TimerHandle.
+        """
+        handle = TimerHandle(None, callback, args)
+        with self.__wakeup:
+            self.__ready.append(handle)
+            self.__wakeup.notify()
+        return handle
+    def call_later(self, delay, callback, *args):
+        """Schedules the callback to be run on the loop after the delay, in seconds.
+        Returns a TimerHandle.
+        """
+        return self.call_at(self.time() + delay, callback, *args)
+    def call_at(self, when, callback, *args):
+        """Schedules the callback to be run on the loop at the specified time.
+        Returns a TimerHandle.
+        """
+        handle = TimerHandle(when, callback, args)
+        with self.__wakeup:
+            heapq.heappush(self.__timers, (when, next(self.__sequence), handle))
+            self.__wakeup.notify()
+        return handle
+    def spawn(self, coroutine):
+        """Starts running the generator-based coroutine on the loop. Returns a Task."""
+        return Task(self, coroutine)
+
+    # Running
+    def start(self):
+        """Runs the loop in a new thread."""
+        self.__thread.start()
+    def quit(self):
+        """Stops the loop and joins with its thread, if it was started with start."""
+        self.stop()
+        if self.__thread.is_alive():
+            self.__thread.join()
+    def run_forever(self):
+        """Runs the loop in the calling thread until the stop method is called."""
+        while True:
+            with self.__wakeup:
+                if self.__stopping:
+                    self.__stopping = False
+                    return
+            self.run_once()
+    def stop(self):
+        """Makes the loop return from run_forever after its current pass."""
+        with self.__wakeup:
+            self.__stopping = True
+            self.__wakeup.notify()
+    def run_once(self, timeout=None):
+        """Runs all ready callbacks and due timers once.
+        If nothing is ready, first blocks until something is, or until the timeout,
+        in seconds, elapses; a timeout of 0 never blocks.
+        """
+        self.__loop_thread = threading.current_thread()
+        with self.__wakeup:
+            if not self.__ready and not self.__stopping:
+                wait_time = timeout
+                if self.__timers:
+                    next_time = max(0, self.__timers[0][0] - self.time())
+                    wait_time = next_time if wait_time is None else min(wait_time, next_time)
+                if wait_time is None or wait_time > 0:
+                    self.__clock.wait(self.__wakeup, wait_time)
+            now = self.time()
+            while self.__timers and self.__timers[0][0] <= now:
+                self.__ready.append(heapq.heappop(self.__timers)[2])
+            ready = self.__ready
+            self.__ready = deque()
+        self.__in_callback = True
+        try:
+            for handle in ready:
+                try:
+                    handle._run()
+                except Exception:
+                    traceback.print_exc()
+        finally:
+            self.__in_callback = False
+    def run_until(self, predicate=None, timeout=None):
+        """Runs the loop in the calling thread until the predicate returns True, until the
+        loop has no ready callbacks or timers left, or until the timeout, in seconds of the
+        loop's clock, elapses. Returns whether the predicate returned True.
+        """
+        end_time = None if timeout is None else self.time() + timeout
+        while predicate is None or not predicate():
+            with self.__wakeup:
+                if self.__stopping:
+                    self.__stopping = False
+                    return False
+                if not self.__ready and not self.__timers:
+                    return False
+            if end_time is None:
+                self.run_once()
+            elif self.time() >= end_time:
+                return False
+            else:
+                self.run_once(end_time - self.time())
+        return True
+    def is_loop_thread(self):
+        """Checks whether the calling thread is the one which last ran the loop."""
+        return threading.current_thread() is self.__loop_thread
+    def join_task(self, task):
+        """Blocks until the Task is done.
+        On the loop's own thread, runs the loop until the Task is done instead, unless
+        called from within a callback, in which case it does not block.
+        """
+        if not self.is_loop_thread():
+            task.wait()
+        elif not self.__in_callback:
+            while not task.is_done():
+                self.run_once(0.1)
+
+    # Reactor executor interface
+    def start_reactor(self, reactor):
+        """Starts running the Reactor on the loop. Called by Reactor.start."""
+        self.__reactors[reactor] = Task(self, self.__run_reactor(reactor))
+    def schedule(self, reactor):
+        """Schedules the Reactor to react to its waiting Signals.
+        Called when a Signal is sent to the Reactor.
+        """
+        task = self.__reactors.get(reactor)
+        if task is not None:
+            task.wake()
+    def join_reactor(self, reactor):
+        """Blocks until the Reactor has quit, as in join_task. Called by Reactor.quit."""
+        task = self.__reactors.get(reactor)
+        if task is not None:
+            self.join_task(task)
+    def __run_reactor(self, reactor):
+        """A coroutine to run the Reactor, sleeping whenever it has no waiting Signals."""
+        reactor._run_pre()
+        while reactor._run_slice(self.__batch_size):
+            yield 0 if reactor._num_waiting() else None
+        reactor._run_post()
+        self.__reactors.pop(reactor, None)
+
+# TimerStats summarizes how punctually a periodic timer on a TimerWheel fired.
+# Fired is the number of times the callback ran, and Missed is the number of deadlines
+# which were skipped because the previous callback ran later than them.
+# MeanLateness and MaxLateness are how late the callback ran after its deadline, in seconds.
+TimerStats = namedtuple("TimerStats", ["Fired", "Missed", "MeanLateness", "MaxLateness"])
+
+class PeriodicTimer(object):
+    """A callback scheduled on a TimerWheel, which can be cancelled.
+    Periodic timers have drift-corrected deadlines: each deadline is a whole number of
+    periods after the first, regardless of how late the previous callback ran.
+    """
+    def __init__(self, deadline, period, callback, args):
+        super(PeriodicTimer, self).__init__()
+        self.deadline = deadline
+        self.__period = period
+        self.__callback = callback
+        self.__args = args
+        self.__cancelled = False
+        self.__fired = 0
+        self.__missed = 0
+        self.__total_lateness = 0.0
+        self.__max_lateness = 0.0
+
+    def get_period(self):
+        """Returns the period in seconds, or None if the timer only fires once."""
+        return self.__period
+    def cancel(self):
+        """Keeps the callback from running again."""
+        self.__cancelled = True
+    def is_cancelled(self):
+        """Checks whether the timer was cancelled."""
+        return self.__cancelled
+    def get_stats(self):
+        """Returns the TimerStats of the timer."""
+        mean_lateness = self.__total_lateness / self.__fired if self.__fired else 0.0
+        return TimerStats(self.__fired, self.__missed, mean_lateness, self.__max_lateness)
+    def _fire(self, now):
+        """Runs the callback and advances the deadline.
+        Returns whether the timer should be rescheduled.
+        """
+        if self.__cancelled:
+            return False
+        lateness = max(0.0, now - self.deadline)
+        self.__fired += 1
+        self.__total_lateness += lateness
+        self.__max_lateness = max(self.__max_lateness, lateness)
+        self.__callback(*self.__args)
+        if self.__period is None or self.__cancelled:
+            return False
+        periods = max(1, int(math.floor((now - self.deadline) / self.__period)) + 1)
+        self.__missed += periods - 1
+        self.deadline += periods * self.__period
+        return True
+
+class TimerWheel(InterruptableThread):
+    """A hierarchical timing wheel which runs timer callbacks on one thread.
+    Time is divided into ticks of the specified resolution. Level 0 of the wheel has one
+    slot per tick, and each higher level has slots spanning a whole turn of the level
+    below it; timers are kept in the lowest level which can hold their deadline, and
+    cascade down as the wheel turns, so scheduling and firing take constant time.
+    Periodic deadlines are aligned to whole multiples of their periods, so periodic timers
+    with the same period fire together in the same tick, whenever they were scheduled.
+    The wheel can be run in its own thread with the start method, or turned manually
+    with the advance method. Deadlines are timed with clock, a RealClock by default.
+    """
+    def __init__(self, name="Timer Wheel", resolution=0.005, slots_per_level=64,
+                 num_levels=4, clock=None):
+        super(TimerWheel, self).__init__(name)
+        self.__clock = RealClock() if clock is None else clock
+        self.__resolution = float(resolution)
+        self.__num_slots = slots_per_level
+        self.__levels = [[[] for _ in range(0, slots_per_level)]
+                         for _ in range(0, num_levels)]
+        self.__overflow = []
+        self.__lock = threading.Condition(threading.Lock())
+        self.__current_tick = self.__to_current_tick(self.__clock.time())
+        self.__num_timers = 0
+        self.__late_ticks = 0
+        self.__max_tick_lateness = 0.0
+
+    def get_resolution(self):
+        """Returns the duration of one tick, in seconds."""
+        return self.__resolution
+    def __len__(self):
+        return self.__num_timers
+    def get_tick_stats(self):
+        """Returns a 2-tuple of the number of ticks which were processed later than one
+        tick after their deadlines, and the maximum lateness of any tick, in seconds."""
+        return (self.__late_ticks, self.__max_tick_lateness)
+
+    # Scheduling
+    def call_later(self, delay, callback, *args):
+        """Schedules the callback to run once after the delay, in seconds.
+        Returns a PeriodicTimer with no period.
+        """
+        timer = PeriodicTimer(self.__clock.time() + delay, None, callback, args)
+        self.__schedule(timer)
+        return timer
+    def call_every(self, period, callback, *args):
+        """Schedules the callback to run periodically, starting at the next whole
+        multiple of the period. Returns a PeriodicTimer.
+        """
+        now = self.__clock.time()
+        timer = PeriodicTimer((math.floor(now / period) + 1) * period, period, callback, args)
+        self.__schedule(timer)
+        return timer
+    def __schedule(self, timer):
+        with self.__lock:
+            if not self.__num_timers: # skip the ticks while the wheel was empty
+                self.__current_tick = max(self.__current_tick,
+                                          self.__to_current_tick(self.__clock.time()))
+            self.__insert(timer)
+            self.__num_timers += 1
+            self.__lock.notify()
+    def __to_tick(self, when):
+        """Returns the first tick at or after the time."""
+        return int(math.ceil(when / self.__resolution - _STEP_TOLERANCE))
+    def __to_current_tick(self, now):
+        """Returns the last tick at or before the time."""
+        return int(math.floor(now / self.__resolution + _STEP_TOLERANCE))
+    def __insert(self, timer):
+        """Puts the timer into the slot for its deadline. Must be called with the lock held."""
+        tick = max(self.__to_tick(timer.deadline), self.__current_tick + 1)
+        delta = tick - self.__current_tick
+        span = 1
+        for level in self.__levels:
+            if delta < span * self.__num_slots:
+                level[(tick // span) % self.__num_slots].append(timer)
+                return
+            span *= self.__num_slots
+        self.__overflow.append(timer)
+
+    # Turning
+    def advance(self, now=None):
+        """Processes all ticks up to the current time, firing the timers which are due.
+        Returns the number of callbacks run.
+        """
+        if now is None:
+            now = self.__clock.time()
+        target_tick = self.__to_current_tick(now)
+        num_fired = 0
+        while True:
+            with self.__lock:
+                if self.__current_tick >= target_tick:
+                    return num_fired
+                self.__current_tick += 1
+                due = self.__turn()
+            if due:
+                lateness = now - self.__current_tick * self.__resolution
+                if lateness > self.__resolution:
+                    self.__late_ticks += 1
+                self.__max_tick_lateness = max(self.__max_tick_lateness, lateness)
+            for timer in due:
+                try:
+                    rescheduled = timer._fire(now)
+                except Exception:
+                    traceback.print_exc()
+                    rescheduled = False
+                num_fired += 1
+                with self.__lock:
+                    if rescheduled:
+                        self.__insert(timer)
+                    else:
+                        self.__num_timers -= 1
+    def __turn(self):
+        """Cascades timers down for the current tick and returns the timers which are due.
+        Must be called with the lock held.
+        """
+        tick = self.__current_tick
+        cascaded = []
+        span = 1
+        for (level_index, level) in enumerate(self.__levels):
+            if level_index > 0:
+                if tick % span:
+                    break
+                cascaded.extend(level[(tick // span) % self.__num_slots])
+                level[(tick // span) % self.__num_slots] = []
+            span *= self.__num_slots
+        else:
+            if tick % span == 0:
+                cascaded.extend(self.__overflow)
+                self.__overflow = []
+        level = self.__levels[0]
+        slot = level[tick % self.__num_slots]
+        level[tick % self.__num_slots] = []
+        for timer in cascaded:
+            # Timers cascading down at their own deadline tick are due now
+            if self.__to_tick(timer.deadline) <= tick:
+                slot.append(timer)
+            else:
+                self.__insert(timer)
+        due = []
+        for timer in slot:
+            if timer.is_cancelled():
+                self.__num_timers -= 1
+            else:
+                due.append(timer)
+        return due
+    def __next_event_tick(self):
+        """Returns the next tick at which timers may be due or must cascade.
+        Must be called with the lock held.
+        """
+        tick = self.__current_tick + 1
+        boundary = (self.__current_tick // self.__num_slots + 1) * self.__num_slots
+        level = self.__levels[0]
+        while tick < boundary and not level[tick % self.__num_slots]:
+            tick += 1
+        return tick
+
+    # Implementation of parent abstract methods
+    def _wake(self):
+        with self.__lock:
+            self.__lock.notify()
+    def _run(self):
+        while not self.will_quit():
+            with self.__lock:
+                if self.will_quit(): # checked under the lock, so the notify of _wake is not lost
+                    break
+                if not self.__num_timers:
+                    self.__lock.wait()
+                    continue
+                delay = self.__next_event_tick() * self.__resolution - self.__clock.time()
+                if delay > 0:
+                    # woken early if a timer is scheduled
+                    self.__clock.wait(self.__lock, delay)
+            self.advance()
@@ -1,12 +1,14 @@
 """Controls robot motion using sensors and simulation data."""
 from collections import namedtuple, defaultdict
-from time import sleep
+import math
+import threading
 
 import numpy as np
 
 from components.util import within, initialized_coroutine
-from components.messaging import Signal, Broadcaster
-from components.concurrency import Reactor
+from components.messaging import Signal, Broadcaster, reacts_to
+from components.messaging import TELEMETRY_PRIORITY
+from components.concurrency import Reactor, EventLoop, RealClock
 from components.geometry import normalize_angle, positive_angle, direction_vector
 from components.geometry import to_vector, vector_to_tuple, Pose
 
@@ -37,6 +39,14 @@ class PrimitiveController(Reactor, Broadcaster):
         Proximity: Data should be a 2-tuple of the left and right proximity values.
         PSD: Data should be a positive int of the PSD scanner value.
         Floor: Data should be a 2-tuple of the left and right floor values.
+        Deadline: sent by the Controller to itself at the predicted completion time of
+        the active Motion command. Data is the id of the motion.
+        Pose, Proximity, PSD, and Floor Signals are conflated, so only their latest
+        values are processed.
+        Pose, Proximity, PSD, and Floor Signals are received after all other waiting
+        Signals, so a backlog of them cannot delay a Stop. All waiting Pose, Proximity, PSD,
+        and Floor Signals are processed before a Motion, Localize, or Resume Signal, so
+        commands are not executed with stale telemetry.
 
     Motion Commands:
         MoveTo: attempt to move in the robot's current direction to the target x-coord, y-coord,
@@ -60,6 +70,11 @@ class PrimitiveController(Reactor, Broadcaster):
     Motion Command Control modes:
         DeadReckoning: use only the virtual robot's position for motion control.
         Associated with MoveTo, MoveBy, RotateTo, RotateTowards, RotateBy.
+        If the robot is purely virtual, the time at which the motion will complete is
+        predicted from the commanded speed and the robot's speed multipliers, and the
+        robot is stopped at exactly that time by a Deadline Signal scheduled on the
+        scheduler. Otherwise, and as a fallback, each Pose update is checked for whether
+        the robot has reached its target.
         SensorDistance: stop the motion when some criterion involving sensor data is met.
         Associated with MoveUntil, RotateUntil. Stopping criterion should be given as the
         Data field of the command, and should be a function returning a boolean value and
@@ -90,8 +105,12 @@ class PrimitiveController(Reactor, Broadcaster):
     Signals Broadcast:
         Moved: sent when the last command has been executed. Data is a 2-tuple of the
         last command and the current pose.
+
+    Deadline Signals are scheduled with the call_later method of scheduler, e.g. an
+    EventLoop or a TimerWheel. If scheduler is None, they are scheduled on the EventLoop
+    the Controller runs on, if any, or else with a threading.Timer.
     """
-    def __init__(self, name, robot, monitor=None):
+    def __init__(self, name, robot, monitor=None, scheduler=None):
         super(PrimitiveController, self).__init__(name)
         self._robot = robot
         self._robot.get_virtual().register("Pose", self)
@@ -107,6 +126,9 @@ class PrimitiveController(Reactor, Broadcaster):
         self._waiting_psd_localization = None
         self._distance_criterion = None
         self._last_command = None
+        self.__scheduler = scheduler
+        self.__motion_id = 0
+        self.__deadline = None
         self._sensors = {
             "floorLeft": defaultdict(lambda: None),
             "floorRight": defaultdict(lambda: None),
@@ -114,47 +136,84 @@ class PrimitiveController(Reactor, Broadcaster):
             "proximityRight": defaultdict(lambda: None),
             "psd": defaultdict(lambda: None)
         }
+        for signal_name in ("Pose", "Floor", "Proximity", "PSD"):
+            self.conflate(signal_name)
+            self.prioritize(signal_name, TELEMETRY_PRIORITY)
 
     # Implementation of parent abstract methods
     def _react(self, signal):
         if not signal.Namespace == self._robot.get_name():
             return
-        if signal.Name == "Stop":
-            self.__finish_motion(False)
-        elif signal.Name == "Pause":
-            self._robot.move(0)
-        elif (signal.Name == "Resume" and self._target_pose is not None
-              and self._last_command is not None):
-            command = self._last_command
-            if command.Name == "MoveTo" or command.Name == "MoveBy":
-                self.__move_to(command.Direction, command.Speed, self._target_pose.Coord)
-            elif (command.Name == "RotateTo" or command.Name == "RotateBy"
-                  or command.Name == "RotateTowards"):
-                self.__rotate_to(command.Speed, self._target_pose.Angle)
-        elif signal.Name == "ResetPose":
-            self._robot_pose = self._robot.get_virtual().get_pose()
-            self._previous_pose = self._robot_pose
-        elif signal.Name == "Pose":
-            self.__update_pose(signal.Data)
-        elif signal.Name == "Floor":
-            self._sensors["floorLeft"][signal.Namespace] = signal.Data[0]
-            self._sensors["floorRight"][signal.Namespace] = signal.Data[1]
-        elif signal.Name == "Proximity":
-            self._sensors["proximityLeft"][signal.Namespace] = signal.Data[0]
-            self._sensors["proximityRight"][signal.Namespace] = signal.Data[1]
-        elif signal.Name == "PSD":
-            self._sensors["psd"][signal.Namespace] = signal.Data
-            if signal.Data is not None and self._waiting_psd_localization is not None:
-                self.broadcast(Signal("LocalizePSD", self.get_name(), self._robot.get_name(),
-                                      (self._waiting_psd_localization.Rectangle,
-                                       self._waiting_psd_localization.Side)))
-                self._waiting_psd_localization = None
-        elif signal.Name == "Localize":
-            self.__react_localize(signal.Data)
-        elif signal.Name == "Motion" and signal.Data.Control == "DeadReckoning":
+        self._dispatch(signal)
+    def _run_post(self):
+        self.__cancel_deadline()
+
+    # Signal handlers
+    @reacts_to("Stop")
+    def __react_stop(self, _):
+        self.__finish_motion(False)
+    @reacts_to("Pause")
+    def __react_pause(self, _):
+        self.__cancel_deadline()
+        self._robot.move(0)
+    @reacts_to("Resume")
+    def __react_resume(self, _):
+        self.__react_telemetry()
+        if self._target_pose is None or self._last_command is None:
+            return
+        command = self._last_command
+        if command.Name == "MoveTo" or command.Name == "MoveBy":
+            self.__move_to(command.Direction, command.Speed, self._target_pose.Coord)
+        elif (command.Name == "RotateTo" or command.Name == "RotateBy"
+              or command.Name == "RotateTowards"):
+            self.__rotate_to(command.Speed, self._target_pose.Angle)
+    @reacts_to("Deadline")
+    def __react_deadline(self, signal):
+        if signal.Data != self.__motion_id or self._target_pose is None:
+            return
+        self._robot.move(0)
+        self._previous_pose = self._robot_pose
+        self._robot_pose = self._robot.get_virtual().get_pose()
+        self.__finish_motion(True)
+    @reacts_to("ResetPose")
+    def __react_reset_pose(self, _):
+        self._robot_pose = self._robot.get_virtual().get_pose()
+        self._previous_pose = self._robot_pose
+    @reacts_to("Pose")
+    def __react_pose(self, signal):
+        self.__update_pose(signal.Data)
+    @reacts_to("Floor")
+    def __react_floor(self, signal):
+        self._sensors["floorLeft"][signal.Namespace] = signal.Data[0]
+        self._sensors["floorRight"][signal.Namespace] = signal.Data[1]
+    @reacts_to("Proximity")
+    def __react_proximity(self, signal):
+        self._sensors["proximityLeft"][signal.Namespace] = signal.Data[0]
+        self._sensors["proximityRight"][signal.Namespace] = signal.Data[1]
+    @reacts_to("PSD")
+    def __react_psd(self, signal):
+        self._sensors["psd"][signal.Namespace] = signal.Data
+        if signal.Data is not None and self._waiting_psd_localization is not None:
+            self.broadcast(Signal("LocalizePSD", self.get_name(), self._robot.get_name(),
+                                  (self._waiting_psd_localization.Rectangle,
+                                   self._waiting_psd_localization.Side)))
+            self._waiting_psd_localization = None
+    @reacts_to("Localize")
+    def __react_localize_signal(self, signal):
+        self.__react_telemetry()
+        self.__react_localize(signal.Data)
+    @reacts_to("Motion")
+    def __react_motion(self, signal):
+        self.__react_telemetry()
+        if signal.Data.Control == "DeadReckoning":
             self.__react_motion_deadreckoning(signal.Data)
-        elif signal.Name == "Motion" and signal.Data.Control == "SensorDistance":
+        elif signal.Data.Control == "SensorDistance":
             self.__react_motion_sensordistance(signal.Data)
+    def __react_telemetry(self):
+        """Processes all waiting Pose and sensor Signals ahead of the current command."""
+        for signal in self._receive_all(TELEMETRY_PRIORITY):
+            self._react(signal)
+            self._received_done()
     def __update_pose(self, pose):
         self._previous_pose = self._robot_pose
         self._robot_pose = pose
@@ -167,6 +226,7 @@ class PrimitiveController(Reactor, Broadcaster):
                                   (self._last_command, self._robot_pose)))
         self._target_pose = None
         self._distance_criterion = None
+        self.__cancel_deadline()
         self._robot.move(0)
     def __react_motion_deadreckoning(self, command):
         if command.Name == "MoveTo":
@@ -181,7 +241,7 @@ class PrimitiveController(Reactor, Broadcaster):
         elif command.Name == "RotateTo":
             self._last_command = command
             try:
-                target_angle = np.arctan2(command.Data[1], command.Data[0])
+                target_angle = math.atan2(command.Data[1], command.Data[0])
             except TypeError:
                 target_angle = command.Data
             self.__rotate_to(command.Speed, normalize_angle(target_angle))
@@ -193,7 +253,7 @@ class PrimitiveController(Reactor, Broadcaster):
             self._last_command = command
             target_coords = to_vector(*command.Data)
             offset = vector_to_tuple(target_coords - self._robot_pose.Coord)
-            target_angle = np.arctan2(offset[1], offset[0])
+            target_angle = math.atan2(offset[1], offset[0])
             if command.Direction == -1:
                 target_angle = normalize_angle(target_angle + np.pi)
             self.__rotate_to(command.Speed, target_angle)
@@ -243,6 +303,9 @@ class PrimitiveController(Reactor, Broadcaster):
             self.__finish_motion(True)
         else:
             self._robot.move(abs(speed) * direction)
+            if not self._robot.is_real():
+                self.__schedule_deadline(self.__predict_move_time(abs(speed) * direction,
+                                                                  target))
     def __rotate_to(self, speed, target):
         delta = normalize_angle(normalize_angle(target) - normalize_angle(self._robot_pose.Angle))
         self._target_pose = Pose(to_vector(None, None), delta + self._robot_pose.Angle)
@@ -250,6 +313,58 @@ class PrimitiveController(Reactor, Broadcaster):
             self.__finish_motion(True)
         else:
             self._robot.rotate(int(speed * np.sign(delta)))
+            if not self._robot.is_real():
+                self.__schedule_deadline(self.__predict_rotate_time(int(speed * np.sign(delta)),
+                                                                    self._target_pose.Angle))
+    def __predict_move_time(self, speed, target):
+        """Returns the time, in seconds, the virtual robot will take to reach the target
+        coords at the commanded speed, or None if it will not reach them."""
+        velocity = self._robot.to_virtual_move_speed(speed)
+        pose = self._robot.get_virtual().get_pose()
+        heading = vector_to_tuple(direction_vector(pose.Angle))
+        current = vector_to_tuple(pose.Coord)
+        target = vector_to_tuple(target)
+        if velocity == 0:
+            return None
+        if target[0] is None or target[1] is None:
+            axis = 0 if target[1] is None else 1
+            if heading[axis] == 0:
+                return None
+            time = (target[axis] - current[axis]) / (velocity * heading[axis])
+        else:
+            time = ((target[0] - current[0]) * heading[0]
+                    + (target[1] - current[1]) * heading[1]) / velocity
+        return time if time >= 0 else None
+    def __predict_rotate_time(self, speed, target):
+        """Returns the time, in seconds, the virtual robot will take to reach the target
+        unnormalized angle at the commanded speed, or None if it will not reach it."""
+        velocity = self._robot.to_virtual_rotate_speed(speed)
+        if velocity == 0:
+            return None
+        time = (target - self._robot.get_virtual().get_pose().Angle) / velocity
+        return time if time >= 0 else None
+    def __schedule_deadline(self, delay):
+        """Schedules a Deadline Signal for the active motion after the delay, in seconds."""
+        self.__cancel_deadline()
+        if delay is None:
+            return
+        deadline = Signal("Deadline", self.get_name(), self._robot.get_name(),
+                          self.__motion_id)
+        scheduler = self.__scheduler
+        if scheduler is None and isinstance(self.get_executor(), EventLoop):
+            scheduler = self.get_executor()
+        if scheduler is None:
+            self.__deadline = threading.Timer(delay, self.send, (deadline,))
+            self.__deadline.daemon = True
+            self.__deadline.start()
+        else:
+            self.__deadline = scheduler.call_later(delay, self.send, deadline)
+    def __cancel_deadline(self):
+        """Cancels the Deadline Signal of the active motion, if one was scheduled."""
+        self.__motion_id += 1
+        if self.__deadline is not None:
+            self.__deadline.cancel()
+            self.__deadline = None
     def __move_until(self, direction, speed):
         if self.__fulfilled_distance_criterion():
             self.__finish_motion(True)
@@ -282,62 +397,86 @@ class SimplePrimitivePlanner(Reactor, Broadcaster):
 
     Generator Commands:
         Motion, Localize, Pause, Wait, Finished, Color, Beep, Servo
+        Pause commands are timed with clock, a RealClock by default.
     """
-    def __init__(self, name, robot, monitor=None):
+    def __init__(self, name, robot, monitor=None, clock=None):
         super(SimplePrimitivePlanner, self).__init__(name)
         robot.get_virtual().register("SetPose", self)
         self._robot = robot
+        self._clock = RealClock() if clock is None else clock
         self.__command_generator = self._generate_commands()
         self._active = False
         next(self.__command_generator)
+        # Handlers of generator commands, keyed by command type name. Handlers of commands
+        # which the planner should wait on return the command; the rest return None, so that
+        # the next command is generated immediately.
+        self.__command_handlers = {
+            "Pause": self.__run_pause,
+            "Finished": self.__send_continue,
+            "Color": self.__set_color,
+            "Beep": self.__send_beep,
+            "Servo": self.__send_servo,
+            "Wait": self.__wait,
+            "Motion": self.__send_motion,
+            "Localize": self.__send_localize
+        }
 
     # Implementation of parent abstract methods
     def _react(self, signal):
-        if signal.Name == "Continue" and signal.Data == self._robot.get_name():
-            self._broadcast_next_command()
-            return
-        if not signal.Namespace == self._robot.get_name():
-            return
-        if signal.Name == "Start":
+        if signal.Name == "Continue" or signal.Namespace == self._robot.get_name():
+            self._dispatch(signal)
+
+    # Signal handlers
+    @reacts_to("Continue")
+    def __react_continue(self, signal):
+        if signal.Data == self._robot.get_name():
             self._broadcast_next_command()
-            self._active = True
-        elif (signal.Name == "Moved" or signal.Name == "SetPose") and self._active:
+    @reacts_to("Start")
+    def __react_start(self, _):
+        self._broadcast_next_command()
+        self._active = True
+    @reacts_to("Moved", "SetPose")
+    def __react_moved(self, _):
+        if self._active:
             self._broadcast_next_command()
-        elif signal.Name == "Reset":
-            self.broadcast(Signal("Stop", self.get_name(), self._robot.get_name(), None))
-            self.__command_generator.send(False)
-            self.clear()
-            self._active = False
+    @reacts_to("Reset")
+    def __react_reset(self, _):
+        self.broadcast(Signal("Stop", self.get_name(), self._robot.get_name(), None))
+        self.__command_generator.send(False)
+        self.clear()
+        self._active = False
+
+    # Command handlers
     def _broadcast_next_command(self):
         command = None
         while command is None:
             command = self.__command_generator.send(True)
             if command is None:
                 return
-            if type(command).__name__ == "Pause":
-                sleep(command.Data)
-                command = None
-            elif type(command).__name__ == "Finished":
-                self.broadcast(Signal("Continue", self.get_name(), self._robot.get_name(),
-                                      command.Target))
-                command = None
-            elif type(command).__name__ == "Color":
-                self._robot.led(command.LeftColor, command.RightColor)
-                command = None
-            elif type(command).__name__ == "Beep":
-                self.broadcast(Signal("Beep", self.get_name(), self._robot.get_name(),
-                                      (command.Note, command.Duration)))
-                command = None
-            elif type(command).__name__ == "Servo":
-                self.broadcast(Signal("Servo", self.get_name(), self._robot.get_name(),
-                                      command.Angle))
-                command = None
-        if type(command).__name__ == "Wait":
-            pass
-        elif type(command).__name__ == "Motion":
-            self.broadcast(Signal("Motion", self.get_name(), self._robot.get_name(), command))
-        elif type(command).__name__ == "Localize":
-            self.broadcast(Signal("Localize", self.get_name(), self._robot.get_name(), command))
+            handler = self.__command_handlers.get(type(command).__name__)
+            if handler is not None:
+                command = handler(command)
+    def __run_pause(self, command):
+        self._clock.sleep(command.Data)
+    def __send_continue(self, command):
+        self.broadcast(Signal("Continue", self.get_name(), self._robot.get_name(),
+                              command.Target))
+    def __set_color(self, command):
+        self._robot.led(command.LeftColor, command.RightColor)
+    def __send_beep(self, command):
+        self.broadcast(Signal("Beep", self.get_name(), self._robot.get_name(),
+                              (command.Note, command.Duration)))
+    def __send_servo(self, command):
+        self.broadcast(Signal("Servo", self.get_name(), self._robot.get_name(),
+                              command.Angle))
+    def __wait(self, command):
+        return command
+    def __send_motion(self, command):
+        self.broadcast(Signal("Motion", self.get_name(), self._robot.get_name(), command))
+        return command
+    def __send_localize(self, command):
+        self.broadcast(Signal("Localize", self.get_name(), self._robot.get_name(), command))
+        return command
 
     # Abstract methods
     def _generate_commands(self):
@@ -1,28 +1,45 @@
 """Support for 2-D geometric operations.
 Mathematics for poses, frames, and coordinate transformations derived from Peter Corke's
 "Robotics, Vision, and Control: Fundamental Algorithms in MATLAB".
+Functions which take angles are computed with the math module on plain floats when given
+a single angle, which avoids NumPy's per-call overhead, and with NumPy when given arrays.
 """
 from collections import namedtuple
 from itertools import chain
+import math
 
 import numpy as np
 
 from components.messaging import Broadcaster
-from components.util import between, within, iter_first_not_none, min_first
+from components.util import between, within, clip, iter_first_not_none, min_first
 
 # Coord should be a numpy array representing a column vector.
 # Angle should be in radians from the frame's +x axis.
 Pose = namedtuple("Pose", ["Coord", "Angle"])
+# Compact alternative to Pose for hot paths.
+# X and Y should be floats, Angle should be in radians from the frame's +x axis.
+FlatPose = namedtuple("FlatPose", ["X", "Y", "Angle"])
+
+_SCALAR_TYPES = (int, long, float, np.generic)
+
+def is_scalar(value):
+    """Checks whether the value is a single number, rather than an array of numbers."""
+    return isinstance(value, _SCALAR_TYPES)
 
 # Angles
 def normalize_angle(angle):
     """Converts an angle in radians to an angle with -pi < value <= pi.
     This encompasses the output range of the arctan function."""
-    negative = angle % -(2 * np.pi)
-    return negative - (2 * np.pi * int(negative / np.pi))
+    if is_scalar(angle):
+        negative = float(angle) % -(2 * math.pi)
+        return negative - (2 * math.pi * int(negative / math.pi))
+    negative = np.asarray(angle, dtype=float) % -(2 * np.pi)
+    return negative - (2 * np.pi * np.trunc(negative / np.pi))
 def positive_angle(angle):
     """Converts an angle in radians to an angle with 0 <= value < 2 * pi."""
-    return angle % (2 * np.pi)
+    if is_scalar(angle):
+        return float(angle) % (2 * math.pi)
+    return np.asarray(angle, dtype=float) % (2 * np.pi)
 
 # Vector representations
 def to_vector(*values):
@@ -30,41 +47,78 @@ def to_vector(*values):
     return np.array([[value] for value in values])
 def vector_to_tuple(vector):
     """Converts a column vector into a tuple."""
-    return tuple(row[0] for row in vector)
+    return tuple(vector.ravel().tolist())
 def vectors_to_flat(vectors):
     """Converts iterable of column vectors to flat tuple of alternating coords."""
     return tuple(chain.from_iterable(vector_to_tuple(vector) for vector in vectors))
+def to_flat_pose(pose):
+    """Converts a Pose into a FlatPose."""
+    return FlatPose(float(pose.Coord[0, 0]), float(pose.Coord[1, 0]), float(pose.Angle))
+def from_flat_pose(flat_pose):
+    """Converts a FlatPose into a Pose."""
+    return Pose(to_vector(flat_pose.X, flat_pose.Y), flat_pose.Angle)
 def homogeneous_form(vector):
     """Returns the homogeneous form of a 2-D column vector."""
     return np.vstack([vector, [1]])
 def point_form(homogeneous_vector):
     """Returns the 2-D column vector of two elements from the homogeneous form."""
     return homogeneous_vector[0:2, 0:1]
+# Point set representations
+# Points should be a contiguous (N, 2) numpy array of floats, with one row per point.
+def to_points(*coords):
+    """Converts the input 2-tuples of x and y coords into points."""
+    return np.array(coords, dtype=float).reshape(-1, 2)
+def vectors_to_points(vectors):
+    """Converts an iterable of column vectors into points."""
+    return np.array([vector_to_tuple(vector) for vector in vectors], dtype=float).reshape(-1, 2)
+def points_to_vectors(points):
+    """Converts points into a tuple of column vectors."""
+    return tuple(to_vector(x, y) for (x, y) in points)
+def points_to_flat(points):
+    """Converts points to flat tuple of alternating coords."""
+    return tuple(points.ravel().tolist())
 def direction_vector(angle):
-    """Converts an angle from the +x axis into a unit direction vector."""
-    return to_vector(np.cos(angle), np.sin(angle))
+    """Converts an angle from the +x axis into a unit direction vector.
+    If an array of N angles is given, returns a 2xN array of direction vectors.
+    """
+    if is_scalar(angle):
+        return np.array([[math.cos(angle)], [math.sin(angle)]])
+    return np.vstack((np.cos(angle), np.sin(angle)))
 def to_angle(direction):
-    """Convers a direction vector into an angle in radians."""
-    return np.arctan2(direction[1], direction[0])[0]
+    """Convers a direction vector into an angle in radians.
+    If a 2xN array of direction vectors is given, returns an array of N angles.
+    """
+    if direction.shape == (2, 1):
+        return math.atan2(direction[1, 0], direction[0, 0])
+    return np.arctan2(direction[1], direction[0])
 
 # Transformation matrices
 def rotation_matrix(angle):
     """Converts an angle from the +x axis into a 2-D rotation matrix."""
-    return np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    if is_scalar(angle):
+        (cos, sin) = (math.cos(angle), math.sin(angle))
+    else:
+        (cos, sin) = (np.cos(angle), np.sin(angle))
+    return np.array([[cos, -sin], [sin, cos]])
 def transformation(pose, x_scale=1, y_scale=1):
     """Returns the homogeneous transformation matrix of a frame to its reference."""
-    scale_mat = np.array([[x_scale, 0], [0, y_scale]])
-    rot_mat = rotation_matrix(pose.Angle)
-    rot_scale_mat = np.dot(scale_mat, rot_mat)
-    transl = pose.Coord
-    return np.vstack([np.hstack([rot_scale_mat, transl]), [0, 0, 1]])
+    (x, y) = vector_to_tuple(pose.Coord)
+    return flat_transformation(FlatPose(x, y, pose.Angle), x_scale, y_scale)
 def transformation_inverse(pose, x_scale=1, y_scale=1):
     """Returns the homogeneous transformation matrix into a frame from its reference."""
-    scale_mat = np.array([[x_scale, 0], [0, y_scale]])
-    rot_mat = rotation_matrix(pose.Angle)
-    rot_scale_mat = np.dot(scale_mat, rot_mat).transpose()
-    transl = pose.Coord
-    return np.vstack([np.hstack([rot_scale_mat, -1 * np.dot(rot_scale_mat, transl)]), [0, 0, 1]])
+    (x, y) = vector_to_tuple(pose.Coord)
+    (cos, sin) = (math.cos(pose.Angle), math.sin(pose.Angle))
+    # Transpose of the product of the scaling and rotation matrices
+    (a, b, c, d) = (x_scale * cos, y_scale * sin, -x_scale * sin, y_scale * cos)
+    return np.array([[a, b, -(a * x + b * y)],
+                     [c, d, -(c * x + d * y)],
+                     [0.0, 0.0, 1.0]])
+def flat_transformation(flat_pose, x_scale=1, y_scale=1):
+    """Returns the homogeneous transformation matrix of a frame given by a FlatPose."""
+    (cos, sin) = (math.cos(flat_pose.Angle), math.sin(flat_pose.Angle))
+    return np.array([[x_scale * cos, -x_scale * sin, flat_pose.X],
+                     [y_scale * sin, y_scale * cos, flat_pose.Y],
+                     [0.0, 0.0, 1.0]])
 def compose(transformation_one, transformation_two):
     """Returns the transformation that is the composition of the two inputs."""
     return np.dot(transformation_one, transformation_two)
@@ -72,7 +126,7 @@ def compose(transformation_one, transformation_two):
 # Transformations
 def transform(matrix, frame_coords):
     """Transforms the non-homogeneous 2-D column vector using the homogeneous transformation matrix."""
-    return point_form(np.dot(matrix, homogeneous_form(frame_coords)))
+    return np.dot(matrix[0:2, 0:2], frame_coords) + matrix[0:2, 2:3]
 def transform_x(matrix, frame_x):
     """Converts x-coord in the frame to x-coord in the parent's frame."""
     return transform(matrix, to_vector(frame_x, 0))[0][0]
@@ -82,6 +136,9 @@ def transform_y(matrix, frame_y):
 def transform_all(matrix, vectors):
     """Transforms every vector in a tuple into the parent's frame."""
     return tuple(transform(matrix, vector) for vector in vectors)
+def transform_points(matrix, points):
+    """Transforms all points into the parent's frame with a single matrix product."""
+    return np.dot(points, matrix[0:2, 0:2].T) + matrix[0:2, 2]
 def rotate_pose(pose, rotation_center, angle):
     """Rotates the pose about the specified point by the specified angle."""
     center_to_pose = pose.Coord - rotation_center
@@ -98,12 +155,14 @@ def line_intersection(first_point, first_direction, second_point, second_directi
     Uses the algorithm outlined in Gareth Rees's answer at
     http://stackoverflow.com/questions/563198
     """
-    cross_direction = np.cross(first_direction.flatten(), second_direction.flatten())
-    difference_point = second_point - first_point
+    (first_x, first_y) = vector_to_tuple(first_direction)
+    (second_x, second_y) = vector_to_tuple(second_direction)
+    cross_direction = first_x * second_y - first_y * second_x
     if cross_direction == 0:
         return None # Lines are collinear or parallel
-    second_location = float(np.cross(difference_point, first_direction, axis=0)) / cross_direction
-    first_location = float(np.cross(difference_point, second_direction, axis=0)) / cross_direction
+    (difference_x, difference_y) = vector_to_tuple(second_point - first_point)
+    second_location = float(difference_x * first_y - difference_y * first_x) / cross_direction
+    first_location = float(difference_x * second_y - difference_y * second_x) / cross_direction
     return (first_location, second_location)
 def ray_segment_intersection(ray_point, ray_angle, segment_left, segment_right):
     """Finds the intersection (if any) between the ray and the segment defined by two endpoints.
@@ -116,6 +175,36 @@ def ray_segment_intersection(ray_point, ray_angle, segment_left, segment_right):
         return None
     else:
         return intersection[0]
+def ray_segment_intersections(ray_points, ray_angles, segment_lefts, segment_rights):
+    """Finds the intersections between every ray and every segment in a single pass.
+    Vectorized form of ray_segment_intersection.
+
+    Arguments:
+        ray_points: an (M, 2) array of the origins of the rays.
+        ray_angles: an (M,) array of the directions of the rays, in radians.
+        segment_lefts: an (N, 2) array of the "left" endpoints of the segments.
+        segment_rights: an (N, 2) array of the "right" endpoints of the segments.
+
+    Return:
+        An (M, N) array of the distances along each ray to each segment, with
+        np.inf wherever the ray does not intersect the segment.
+    """
+    ray_directions = np.column_stack((np.cos(ray_angles), np.sin(ray_angles)))
+    segment_directions = segment_rights - segment_lefts
+    cross_direction = (np.outer(ray_directions[:, 0], segment_directions[:, 1])
+                       - np.outer(ray_directions[:, 1], segment_directions[:, 0]))
+    difference_x = segment_lefts[np.newaxis, :, 0] - ray_points[:, np.newaxis, 0]
+    difference_y = segment_lefts[np.newaxis, :, 1] - ray_points[:, np.newaxis, 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ray_location = ((difference_x * segment_directions[np.newaxis, :, 1]
+                         - difference_y * segment_directions[np.newaxis, :, 0])
+                        / cross_direction)
+        segment_location = ((difference_x * ray_directions[:, np.newaxis, 1]
+                             - difference_y * ray_directions[:, np.newaxis, 0])
+                            / cross_direction)
+    hit = ((cross_direction != 0) & (ray_location >= 0)
+           & (segment_location >= 0) & (segment_location <= 1))
+    return np.where(hit, ray_location, np.inf)
 def perpendicular_to_line(point, line_left, line_right):
     """Finds the vector from the point to the nearest point on the line.
     Uses the formula from Pablo's answer at http://stackoverflow.com/questions/5227373
@@ -124,6 +213,14 @@ def perpendicular_to_line(point, line_left, line_right):
     line_direction = line_direction / float(np.linalg.norm(line_direction))
     vector_projection = line_direction * np.vdot((point - line_left), line_direction)
     return line_left + vector_projection - point
+def point_segment_distance(point, segment_left, segment_right):
+    """Finds the distance from the point to the nearest point on the segment."""
+    segment_direction = segment_right - segment_left
+    length_squared = float(np.vdot(segment_direction, segment_direction))
+    if length_squared == 0:
+        return float(np.linalg.norm(point - segment_left))
+    location = clip(0, 1, np.vdot(point - segment_left, segment_direction) / length_squared)
+    return float(np.linalg.norm(segment_left + location * segment_direction - point))
 def segment_transformation(from_left, from_right, to_left, to_right):
     """Finds a transformation to move the "from" segment so that it overlaps the "to" line.
     The transformation will rotate the "from" vector the minimum angle to become parallel with the
@@ -180,7 +277,10 @@ class MobileFrame(Frame, Broadcaster):
         pass
 
 class Rectangle(Frame):
-    """Models a rectangular shape."""
+    """Models a rectangular shape.
+    The transformation matrices and the parent-frame corners and sides are cached, and
+    are only recomputed once the center or angle of the Rectangle is reassigned.
+    """
     def __init__(self, center_x, center_y, x_length, y_length, angle=0):
         super(Rectangle, self).__init__()
         self.__bounds = (-0.5 * x_length, -0.5 * y_length, 0.5 * x_length, 0.5 * y_length)
@@ -195,10 +295,45 @@ class Rectangle(Frame):
             "West": (-delta_x + delta_y, -delta_x - delta_y),
             "South": (-delta_x - delta_y, delta_x - delta_y)
         }
+        self.__cache = None
 
     # Implementation of parent abstract methods
     def get_pose(self):
         return Pose(self._center, self._angle)
+    def get_transformation(self):
+        return self.__get_cache()["transformation"]
+    def get_transformation_inverse(self):
+        return self.__get_cache()["transformationInverse"]
+
+    # Cache of parent-frame geometry
+    def __get_cache(self):
+        """Returns the cached parent-frame geometry, recomputing it if the pose has changed."""
+        cache = self.__cache
+        if (cache is None or cache["center"] is not self._center
+                or cache["angle"] != self._angle):
+            cache = self.__compute_cache()
+            self.__cache = cache
+        return cache
+    def __compute_cache(self):
+        matrix = super(Rectangle, self).get_transformation()
+        matrix_inverse = super(Rectangle, self).get_transformation_inverse()
+        matrix.flags.writeable = False
+        matrix_inverse.flags.writeable = False
+        sides = {}
+        for (side_name, side) in self._sides.items():
+            transformed = transform_all(matrix, side)
+            for vector in transformed:
+                vector.flags.writeable = False
+            sides[side_name] = transformed
+        return {
+            "center": self._center,
+            "angle": self._angle,
+            "transformation": matrix,
+            "transformationInverse": matrix_inverse,
+            "sides": sides,
+            "corners": (sides["East"][0], sides["North"][0],
+                        sides["West"][0], sides["South"][0])
+        }
 
     def get_center(self):
         """Returns the center of the Wall."""
@@ -210,6 +345,12 @@ class Rectangle(Frame):
     def get_side(self, side_name):
         """Returns the specified side."""
         return self._sides[side_name]
+    def get_transformed_corners(self):
+        """Returns a 4-tuple of the corners as column vectors in the parent frame."""
+        return self.__get_cache()["corners"]
+    def get_transformed_side(self, side_name):
+        """Returns the specified side in the parent frame."""
+        return self.__get_cache()["sides"][side_name]
 
     def in_rectangle(self, coords):
         """Checks whether the coordinate, given as a column vector, is in the Rectangle."""
@@ -235,6 +376,9 @@ class Rectangle(Frame):
             return "East"
         elif slope * point[0] < -abs(point[1]):
             return "West"
+    def get_transformed_sides(self):
+        """Returns a dict of the names of the sides to the sides in the parent frame."""
+        return dict(self.__get_cache()["sides"])
     def ray_distance_to(self, ray_point, ray_angle, side=None):
         """Returns the distance to the Rectangle from the given ray, if the ray intersects.
         The ray should be given in the parent frame as a column vector and an angle.
@@ -242,18 +386,23 @@ class Rectangle(Frame):
         If a side is specified, finds the ray distance to that side, rather than the distance
         to the first side the ray intersects.
         """
-        matrix = self.get_transformation()
+        sides = self.__get_cache()["sides"]
         if side is not None:
-            distance = ray_segment_intersection(ray_point, ray_angle,
-                                                *transform_all(matrix, self.get_side(side)))
+            distance = ray_segment_intersection(ray_point, ray_angle, *sides[side])
             return (distance, side)
-        distances = tuple((ray_segment_intersection(ray_point, ray_angle,
-                                                    *transform_all(matrix, side)), side_name)
-                          for (side_name, side) in self._sides.items())
+        distances = tuple((ray_segment_intersection(ray_point, ray_angle, *side), side_name)
+                          for (side_name, side) in sides.items())
         try:
             return min_first(iter_first_not_none(distances))
         except ValueError:
             return (None, None)
+    def boundary_distance_to(self, point):
+        """Returns the distance from the given point in the parent frame to the nearest point
+        of the Rectangle, or 0 if the point is inside the Rectangle."""
+        if self.in_rectangle(point):
+            return 0.0
+        return min(point_segment_distance(point, *side)
+                   for side in self.__get_cache()["sides"].values())
     def point_distance_to(self, point):
         """Returns the distance to the Rectangle from the given point in the parent frame.
         Returns a 2-tuple of the distance between the point and the nearest side (as a line)
@@ -268,6 +417,66 @@ class Rectangle(Frame):
                     / np.linalg.norm(side[1] - side[0]))
         return (distance, side_name)
 
+class RayCaster(object):
+    """Packs the sides of many Rectangles into arrays for vectorized ray casting.
+    The sides are captured in the parent frame of the Rectangles when the RayCaster
+    is created, so a new RayCaster should be made whenever any of the Rectangles moves.
+    """
+    def __init__(self, rectangles=()):
+        super(RayCaster, self).__init__()
+        lefts = []
+        rights = []
+        self.__side_names = []
+        self.__rectangle_ids = []
+        for rectangle in rectangles:
+            rectangle_id = rectangle.get_id()
+            for (side_name, side) in rectangle.get_transformed_sides().items():
+                lefts.append(vector_to_tuple(side[0]))
+                rights.append(vector_to_tuple(side[1]))
+                self.__side_names.append(side_name)
+                self.__rectangle_ids.append(rectangle_id)
+        self.__lefts = np.array(lefts, dtype=float).reshape(-1, 2)
+        self.__rights = np.array(rights, dtype=float).reshape(-1, 2)
+
+    def get_num_segments(self):
+        """Returns the number of packed segments."""
+        return len(self.__side_names)
+
+    def ray_distances_to(self, ray_points, ray_angles):
+        """Determines the first segment hit by each of the specified rays.
+
+        Arguments:
+            ray_points: an iterable of the origins of the rays, as column vectors.
+            ray_angles: an iterable of the directions of the rays, in radians.
+
+        Return:
+            A list with an element for each ray. If a segment is hit by the ray, the element
+            is a 3-tuple of the distance to that segment, the name of the side the segment
+            belongs to, and the id of its rectangle. Otherwise, the element is None.
+        """
+        ray_points = np.array([vector_to_tuple(point) for point in ray_points],
+                              dtype=float).reshape(-1, 2)
+        ray_angles = np.array(ray_angles, dtype=float).reshape(-1)
+        if not self.__side_names:
+            return [None] * len(ray_angles)
+        distances = ray_segment_intersections(ray_points, ray_angles,
+                                              self.__lefts, self.__rights)
+        nearest = np.argmin(distances, axis=1)
+        results = []
+        for (ray_index, segment_index) in enumerate(nearest):
+            distance = distances[ray_index, segment_index]
+            if np.isinf(distance):
+                results.append(None)
+            else:
+                results.append((float(distance), self.__side_names[segment_index],
+                                self.__rectangle_ids[segment_index]))
+        return results
+    def ray_distance_to(self, coords, angle):
+        """Determines the first segment hit by the specified ray, and the distance along the ray.
+        Returns the same values as the ray_distance_to function.
+        """
+        return self.ray_distances_to((coords,), (angle,))[0]
+
 def ray_distance_to(rectangles, coords, angle):
     """Determines the first rectangle hit by the specified ray, and the distance along the ray.
 
@@ -281,10 +490,4 @@ def ray_distance_to(rectangles, coords, angle):
         name of the side of the rectangle hit by the ray, and the id of the rectangle.
         Otherwise, returns None.
     """
-    distances = [rectangle.ray_distance_to(coords, angle) + (rectangle.get_id(),)
-                 for rectangle in rectangles]
-    try:
-        return min_first(iter_first_not_none(distances))
-    except ValueError:
-        return None
-
+    return RayCaster(rectangles).ray_distance_to(coords, angle)
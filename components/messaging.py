@@ -1,5 +1,7 @@
 """Mixin classes to support queue-based message-passing between objects."""
-from collections import namedtuple
+from collections import namedtuple, deque, OrderedDict
+import threading
+import time
 import Queue as queue
 
 # Signals are the messages passed around by Receivers for inter-thread communication.
@@ -11,29 +13,493 @@ import Queue as queue
 # to the name or ID of a robot. Along with Sender, it helps Receivers decide which
 # Signals to handle and how to do so.
 # Data is the payload data, and may correspond to a single value, a tuple, etc.
-Signal = namedtuple("Signal", ["Name", "Sender", "Namespace", "Data"])
+# Code is a small int which uniquely identifies the Signal's Name within the process,
+# and is assigned automatically; Receivers use it to look up handlers.
+_SIGNAL_CODES = {}
+_SIGNAL_CODES_LOCK = threading.Lock()
+
+def signal_code(signal_name):
+    """Returns the small int code of the specified Signal name.
+    Codes are assigned in order of first use and are stable for the life of the process.
+    """
+    try:
+        return _SIGNAL_CODES[signal_name]
+    except KeyError:
+        with _SIGNAL_CODES_LOCK:
+            return _SIGNAL_CODES.setdefault(signal_name, len(_SIGNAL_CODES))
+
+class Signal(object):
+    """A lightweight message with the same fields and tuple semantics as a namedtuple of
+    Name, Sender, Namespace, and Data, plus the Code of its Name.
+    Signals are shared between threads, so they should be treated as immutable; use the
+    _replace method to derive modified Signals.
+    """
+    __slots__ = ("Name", "Sender", "Namespace", "Data", "Code")
+    _fields = ("Name", "Sender", "Namespace", "Data")
+
+    def __init__(self, Name, Sender, Namespace, Data):
+        self.Name = Name
+        self.Sender = Sender
+        self.Namespace = Namespace
+        self.Data = Data
+        self.Code = _SIGNAL_CODES.get(Name)
+        if self.Code is None:
+            self.Code = signal_code(Name)
+
+    # Tuple semantics
+    def __iter__(self):
+        return iter((self.Name, self.Sender, self.Namespace, self.Data))
+    def __len__(self):
+        return 4
+    def __getitem__(self, index):
+        return (self.Name, self.Sender, self.Namespace, self.Data)[index]
+    def __eq__(self, other):
+        if isinstance(other, (Signal, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+    def __hash__(self):
+        return hash(tuple(self))
+    def __repr__(self):
+        return "Signal(Name={!r}, Sender={!r}, Namespace={!r}, Data={!r})".format(*self)
+    def __reduce__(self):
+        return (Signal, tuple(self))
+    def _replace(self, **kwargs):
+        """Returns a new Signal with the specified fields replaced."""
+        fields = dict(zip(self._fields, self))
+        fields.update(kwargs)
+        return Signal(**fields)
+
+def reacts_to(*signal_names):
+    """Decorator to register a method of a Receiver as the handler of Signals of the
+    specified names. The method should take a Signal. Receivers look up the handler of a
+    Signal by its Code in the _dispatch method; handlers of subclasses override handlers
+    of their parent classes.
+    """
+    def decorator(method):
+        method.handled_signal_names = signal_names
+        return method
+    return decorator
+
+# Priority classes of Signals in a Mailbox. Lower values are received first.
+CONTROL_PRIORITY = 0 # Signals which must pre-empt everything else, even queued commands
+DEFAULT_PRIORITY = 1
+TELEMETRY_PRIORITY = 2 # bulk state updates, e.g. Pose and sensor values
+
+# QueueDelay summarizes the time Signals of one priority class spent waiting in a Mailbox.
+# Count is the number of Signals received, and Mean and Max are in seconds.
+QueueDelay = namedtuple("QueueDelay", ["Count", "Mean", "Max"])
+
+# Policies for putting a Signal into a Mailbox which is at its maximum depth.
+BLOCK = "block" # block the sender until there is room for the Signal
+DROP_OLDEST = "drop_oldest" # discard the oldest waiting Signal to make room
+DROP_NEWEST = "drop_newest" # discard the Signal being put
+CONFLATE = "conflate" # replace the newest waiting Signal of the same name and key, if any
+_QUEUE_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, CONFLATE)
+
+def namespace_key(signal):
+    """Returns the Namespace of the Signal. The default conflation key."""
+    return signal.Namespace
+
+class Mailbox(object):
+    """A thread-safe queue of Signals, with optional priority classes and conflation.
+    Signals are queued in FIFO order within each priority class, and all waiting Signals
+    of a higher priority class are received before any of a lower one. Signals default to
+    DEFAULT_PRIORITY; None is always of DEFAULT_PRIORITY, so it stays ordered with commands.
+    Signals of conflated names are state-like: when a new one is put while an older one
+    with the same conflation key is still waiting, the new Signal replaces the older one
+    in its place in the queue instead of queuing behind it.
+    The queue can be bounded, both overall and per Signal name, with a policy for what
+    to do with Signals put while it is full; None always bypasses the bounds, and Signals
+    of CONTROL_PRIORITY bypass the overall bound and are never dropped to make room for
+    other Signals under it.
+    Records how long received Signals waited in the queue, per priority class, and how
+    many Signals were dropped, per Signal name.
+    Has the same get, put, and empty semantics as Queue.Queue.
+    """
+    def __init__(self):
+        super(Mailbox, self).__init__()
+        lock = threading.Lock()
+        self.__not_empty = threading.Condition(lock)
+        self.__not_full = threading.Condition(lock)
+        self.__lanes = {DEFAULT_PRIORITY: deque()}
+        self.__lane_order = [DEFAULT_PRIORITY]
+        self.__size = 0
+        self.__priorities = {}
+        self.__conflation_keys = {}
+        self.__waiting = {} # maps conflation keys to the entries holding them
+        self.__delays = {}
+        self.__limits = {} # maps Signal names, or None for overall, to depths and policies
+        self.__name_sizes = {}
+        self.__drops = {}
+        self.__next_sequence = 0
+
+    def conflate(self, signal_name, key=namespace_key):
+        """Makes newer Signals of the specified name replace waiting ones of the same key.
+
+        Arguments:
+            signal_name: the name of the Signals to conflate.
+            key: a function taking a Signal and returning its conflation key. Only
+            Signals with equal conflation keys replace each other.
+        """
+        with self.__not_empty:
+            self.__conflation_keys[signal_name] = key
+    def is_conflated(self, signal_name):
+        """Checks whether Signals of the specified name are conflated."""
+        return signal_name in self.__conflation_keys
+    def prioritize(self, signal_name, priority):
+        """Sets the priority class of Signals of the specified name.
+        Only affects Signals put after the priority class is set.
+
+        Arguments:
+            signal_name: the name of the Signals to prioritize.
+            priority: an int, such as CONTROL_PRIORITY or TELEMETRY_PRIORITY. Signals of
+            lower priority values are received first.
+        """
+        with self.__not_empty:
+            self.__priorities[signal_name] = priority
+            if priority not in self.__lanes:
+                self.__lanes[priority] = deque()
+                self.__lane_order = sorted(self.__lanes.keys())
+    def get_priority(self, signal_name):
+        """Returns the priority class of Signals of the specified name."""
+        return self.__priorities.get(signal_name, DEFAULT_PRIORITY)
+    def set_queue_limit(self, max_depth, policy=BLOCK, signal_name=None):
+        """Bounds the number of waiting Signals.
+
+        Arguments:
+            max_depth: the maximum number of waiting Signals, or None for no bound.
+            policy: BLOCK, DROP_OLDEST, DROP_NEWEST, or CONFLATE. CONFLATE replaces the
+            newest waiting Signal with the same conflation key, if the name is conflated,
+            or else with the same name and Namespace; when it finds none, it falls back to
+            DROP_OLDEST. Under the overall bound, DROP_OLDEST drops the oldest Signal of
+            the lowest priority class which has any.
+            signal_name: if not None, only bounds the number of waiting Signals of the
+            specified name. Otherwise, bounds the number of all waiting Signals.
+
+        Exceptions:
+            ValueError: the policy is not one of the supported policies.
+        """
+        if policy not in _QUEUE_POLICIES:
+            raise ValueError("Unknown queue policy \"{}\"".format(policy))
+        with self.__not_empty:
+            if max_depth is None:
+                self.__limits.pop(signal_name, None)
+            else:
+                self.__limits[signal_name] = (max_depth, policy)
+            self.__not_full.notify_all()
+
+    def put(self, signal):
+        """Puts the Signal into the queue, conflating it if applicable."""
+        with self.__not_empty:
+            if self.__put_entry(signal):
+                self.__not_empty.notify()
+    def put_many(self, signals):
+        """Puts the Signals into the queue in order, as if by the put method.
+        Acquires the lock and wakes the receiving thread only once for all of them.
+        """
+        with self.__not_empty:
+            queued = False
+            for signal in signals:
+                queued = self.__put_entry(signal) or queued
+            if queued:
+                self.__not_empty.notify()
+    def __put_entry(self, signal):
+        """Puts the Signal into the queue. Must be called with the lock held.
+        Returns whether a new entry was added to the queue.
+        """
+        key = self.__conflation_key(signal)
+        if key is not None and key in self.__waiting:
+            entry = self.__waiting[key]
+            entry[0] = signal
+            entry[2] = time.time()
+            return False
+        if signal is not None and not self.__make_room(signal):
+            return False
+        if key is not None and key in self.__waiting: # in case the sender was blocked
+            entry = self.__waiting[key]
+            entry[0] = signal
+            entry[2] = time.time()
+            return False
+        # each entry is a list of the signal, its conflation key, its enqueue time,
+        # its priority class, and its sequence number
+        priority = DEFAULT_PRIORITY if signal is None else self.get_priority(signal.Name)
+        entry = [signal, key, time.time(), priority, self.__next_sequence]
+        self.__next_sequence += 1
+        self.__lanes[priority].append(entry)
+        self.__size += 1
+        if signal is not None:
+            self.__name_sizes[signal.Name] = self.__name_sizes.get(signal.Name, 0) + 1
+        if key is not None:
+            self.__waiting[key] = entry
+        return True
+    def get(self, block=True):
+        """Removes and returns the next Signal from the queue.
+
+        Arguments:
+            block: if True, blocks until a Signal is available. Otherwise, raises the
+            Queue.Empty exception if no Signal is available.
+        """
+        with self.__not_empty:
+            if not block and not self.__size:
+                raise queue.Empty
+            while not self.__size:
+                self.__not_empty.wait()
+            return self.__pop_entry()
+    def get_all(self, priority=None):
+        """Removes and returns a list of all waiting Signals, in the order they would be
+        returned by the get method. Does not block; returns an empty list if no Signal
+        is available.
+        If priority is not None, only removes the waiting Signals of that priority class.
+        """
+        with self.__not_empty:
+            signals = []
+            if priority is not None:
+                lane = self.__lanes.get(priority, ())
+                while lane:
+                    signals.append(self.__pop_entry(lane))
+                return signals
+            while self.__size:
+                signals.append(self.__pop_entry())
+            return signals
+    def empty(self):
+        """Checks whether the queue has no waiting Signals."""
+        with self.__not_empty:
+            return not self.__size
+    def clear(self):
+        """Discards all waiting Signals."""
+        with self.__not_empty:
+            for lane in self.__lanes.values():
+                lane.clear()
+            self.__size = 0
+            self.__name_sizes.clear()
+            self.__waiting.clear()
+            self.__not_full.notify_all()
+    def __len__(self):
+        with self.__not_empty:
+            return self.__size
+    def __conflation_key(self, signal):
+        if signal is None or signal.Name not in self.__conflation_keys:
+            return None
+        return (signal.Name, self.__conflation_keys[signal.Name](signal))
+    def __pop_entry(self, lane=None):
+        if lane is None:
+            for priority in self.__lane_order:
+                lane = self.__lanes[priority]
+                if lane:
+                    break
+        entry = lane.popleft()
+        self.__discard_entry(entry)
+        self.__record_delay(entry[3], time.time() - entry[2])
+        return entry[0]
+    def __discard_entry(self, entry):
+        """Updates the bookkeeping for an entry which was removed from its lane."""
+        (signal, key) = (entry[0], entry[1])
+        self.__size -= 1
+        if signal is not None:
+            self.__name_sizes[signal.Name] -= 1
+        if key is not None:
+            del self.__waiting[key]
+        self.__not_full.notify()
+
+    # Queue bounds
+    def __make_room(self, signal):
+        """Applies the queue bounds before the Signal is put.
+        Returns whether the Signal should be put. Must be called with the lock held.
+        """
+        while True:
+            (limit_name, policy) = self.__exceeded_limit(signal.Name)
+            if policy is None:
+                return True
+            if policy == BLOCK:
+                self.__not_empty.notify() # in case Signals were put earlier in a batch
+                self.__not_full.wait()
+            elif policy == CONFLATE and self.__replace_newest(signal):
+                return False
+            elif policy == DROP_NEWEST or not self.__drop_oldest(limit_name):
+                self.__record_drop(signal.Name)
+                return False
+    def __exceeded_limit(self, signal_name):
+        """Returns the Signal name and policy of the first bound which is full.
+        Returns (None, None) if there is room for a Signal of the specified name.
+        """
+        if signal_name in self.__limits:
+            (max_depth, policy) = self.__limits[signal_name]
+            if self.__name_sizes.get(signal_name, 0) >= max_depth:
+                return (signal_name, policy)
+        if None in self.__limits and self.get_priority(signal_name) > CONTROL_PRIORITY:
+            (max_depth, policy) = self.__limits[None]
+            if self.__size >= max_depth:
+                return (None, policy)
+        return (None, None)
+    def __drop_oldest(self, signal_name=None):
+        """Drops the oldest waiting Signal of the specified name, if given. Otherwise,
+        drops the oldest waiting Signal of the lowest priority class which has any, other
+        than CONTROL_PRIORITY. None is never dropped. Returns whether a Signal was dropped.
+        """
+        oldest = None
+        if signal_name is None:
+            for priority in reversed(self.__lane_order):
+                if priority <= CONTROL_PRIORITY:
+                    break
+                lane = self.__lanes[priority]
+                for (index, entry) in enumerate(lane):
+                    if entry[0] is not None:
+                        oldest = (lane, index, entry)
+                        break
+                if oldest is not None:
+                    break
+        else:
+            for lane in self.__lanes.values():
+                for (index, entry) in enumerate(lane):
+                    if entry[0] is not None and entry[0].Name == signal_name:
+                        if oldest is None or entry[4] < oldest[2][4]:
+                            oldest = (lane, index, entry)
+                        break
+        if oldest is None:
+            return False
+        (lane, index, entry) = oldest
+        del lane[index]
+        self.__discard_entry(entry)
+        self.__record_drop(entry[0].Name)
+        return True
+    def __replace_newest(self, signal):
+        """Replaces the newest waiting Signal with the same conflation key as the Signal,
+        if its name is conflated, or else with the same name and Namespace.
+        Returns whether a Signal was replaced.
+        """
+        key = self.__conflation_key(signal)
+        newest = None
+        for lane in self.__lanes.values():
+            for entry in reversed(lane):
+                if (entry[0] is not None and entry[0].Name == signal.Name
+                        and (entry[1] == key if key is not None
+                             else entry[0].Namespace == signal.Namespace)):
+                    if newest is None or entry[4] > newest[4]:
+                        newest = entry
+                    break
+        if newest is None:
+            return False
+        self.__record_drop(newest[0].Name)
+        if newest[1] is not None:
+            del self.__waiting[newest[1]]
+        newest[0] = signal
+        newest[1] = key
+        if newest[1] is not None:
+            self.__waiting[newest[1]] = newest
+        newest[2] = time.time()
+        return True
+    def __record_drop(self, signal_name):
+        self.__drops[signal_name] = self.__drops.get(signal_name, 0) + 1
+    def get_drop_counts(self):
+        """Returns a dict of the numbers of dropped Signals, keyed by Signal name."""
+        with self.__not_empty:
+            return dict(self.__drops)
+    def reset_drop_counts(self):
+        """Discards the recorded numbers of dropped Signals."""
+        with self.__not_empty:
+            self.__drops.clear()
+
+    # Queueing delay statistics
+    def __record_delay(self, priority, delay):
+        (count, total, maximum) = self.__delays.get(priority, (0, 0.0, 0.0))
+        self.__delays[priority] = (count + 1, total + delay, max(maximum, delay))
+    def get_queue_delays(self):
+        """Returns a dict of QueueDelays of the received Signals, keyed by priority class."""
+        with self.__not_empty:
+            return {priority: QueueDelay(count, total / count, maximum)
+                    for (priority, (count, total, maximum)) in self.__delays.items()}
+    def reset_queue_delays(self):
+        """Discards the recorded queueing delays."""
+        with self.__not_empty:
+            self.__delays.clear()
 
 class Receiver(object):
     """Provides mixin functionality to receive Signals."""
     def __init__(self):
         super(Receiver, self).__init__()
-        self.__queue = queue.Queue()
+        self.__queue = Mailbox()
+        self.__handlers = self.__collect_handlers()
 
     # Message-passing
     def send(self, signal):
         """Receives a Signal and wakes the thread if it is sleeping."""
         self.__queue.put(signal)
+    def send_many(self, signals):
+        """Receives a sequence of Signals in order and wakes the thread once if it is
+        sleeping."""
+        self.__queue.put_many(signals)
     def clear(self):
         """Discards all waiting Signals. Useful if the Receiver was sleeping."""
-        while not self.__queue.empty():
-            try:
-                self.__queue.get(False)
-            except queue.Empty:
-                continue
-            self.__queue.task_done()
-    def _receive(self):
-        """Gets the next Signal from the queue. Blocks until it can do so."""
-        return self.__queue.get()
+        self.__queue.clear()
+    def conflate(self, signal_name, key=namespace_key):
+        """Makes newer Signals of the specified name replace waiting ones, instead of
+        queuing behind them. Useful for state-like Signals, such as Poses and sensor values,
+        where only the latest value matters. Signals are only replaced by Signals with the
+        same key, which by default is the Namespace.
+
+        Arguments:
+            signal_name: the name of the Signals to conflate.
+            key: a function taking a Signal and returning its conflation key.
+        """
+        self.__queue.conflate(signal_name, key)
+    def prioritize(self, signal_name, priority):
+        """Sets the priority class of Signals of the specified name, so that they are
+        received before all waiting Signals of lower priority classes. Useful for telemetry,
+        such as Poses, which must not delay the commands queued behind it.
+
+        Arguments:
+            signal_name: the name of the Signals to prioritize.
+            priority: CONTROL_PRIORITY, DEFAULT_PRIORITY, TELEMETRY_PRIORITY, or any other
+            int. Signals of lower priority values are received first.
+        """
+        self.__queue.prioritize(signal_name, priority)
+    def get_queue_delays(self):
+        """Returns a dict of QueueDelays, keyed by priority class, summarizing how long
+        received Signals waited in the queue."""
+        return self.__queue.get_queue_delays()
+    def reset_queue_delays(self):
+        """Discards the recorded queueing delays."""
+        self.__queue.reset_queue_delays()
+    def set_queue_limit(self, max_depth, policy=BLOCK, signal_name=None):
+        """Bounds the number of waiting Signals, so that a slow Receiver cannot accumulate
+        an unbounded backlog. None is always accepted, so the Receiver can still quit.
+        With the BLOCK policy, a Receiver must not send Signals to itself.
+
+        Arguments:
+            max_depth: the maximum number of waiting Signals, or None for no bound.
+            policy: what to do when a Signal is sent while the queue is full.
+            BLOCK: block the sender until there is room.
+            DROP_OLDEST: discard the oldest waiting Signal.
+            DROP_NEWEST: discard the Signal being sent.
+            CONFLATE: replace the newest waiting Signal of the same name, or discard the
+            oldest waiting Signal if there is none.
+            signal_name: if not None, only bounds the number of waiting Signals of the
+            specified name.
+        """
+        self.__queue.set_queue_limit(max_depth, policy, signal_name)
+    def get_drop_counts(self):
+        """Returns a dict of the numbers of Signals dropped by the queue bounds,
+        keyed by Signal name."""
+        return self.__queue.get_drop_counts()
+    def reset_drop_counts(self):
+        """Discards the recorded numbers of dropped Signals."""
+        self.__queue.reset_drop_counts()
+    def _receive(self, block=True):
+        """Gets the next Signal from the queue. Blocks until it can do so.
+        If block is False, raises the Queue.Empty exception if no Signal is waiting.
+        """
+        return self.__queue.get(block)
+    def _receive_all(self, priority=None):
+        """Gets a list of all waiting Signals from the queue. Does not block.
+        If priority is not None, only gets the waiting Signals of that priority class.
+        """
+        return self.__queue.get_all(priority)
+    def _num_waiting(self):
+        """Returns the number of waiting Signals."""
+        return len(self.__queue)
     def _received_done(self):
         """Acknowledges that the Signal received has been processed.
         Only useful for other threads that are joining the __queue.
@@ -42,81 +508,153 @@ class Receiver(object):
     # Message processing
     def _react_all(self):
         """Reacts to all received Signals.
-        Blocks until all received Signals, if any exist, have been reacted to.
+        Drains all waiting Signals at once, then blocks until they have been reacted to;
+        Signals received in the meantime are left for the next call.
         Delegates any special handling of None signals to the _react method: to
         quit from within _react, raise the queue.Empty exception.
         """
-        while not self.__queue.empty(): # Process all waiting Signals
+        for signal in self._receive_all():
             try:
-                self._react(self.__queue.get(False))
+                self._react(signal)
             except queue.Empty:
                 continue
             self._received_done()
 
+    def _dispatch(self, signal, default=None):
+        """Calls the handler registered with reacts_to for the Signal's name.
+
+        Arguments:
+            signal: the Signal to handle.
+            default: a function taking the Signal, called if no handler is registered.
+            If None, Signals with no handler are ignored.
+        """
+        handler = self.__handlers.get(signal.Code, default)
+        if handler is not None:
+            handler(signal)
+    def __collect_handlers(self):
+        """Returns a dict of bound handler methods, keyed by Signal Code."""
+        handlers = {}
+        for cls in reversed(type(self).__mro__):
+            for (attribute_name, attribute) in vars(cls).items():
+                for signal_name in getattr(attribute, "handled_signal_names", ()):
+                    handlers[signal_code(signal_name)] = getattr(self, attribute_name)
+        return handlers
+
     # Abstract methods
     def _react(self, signal):
-        """Processes a Signal."""
+        """Processes a Signal. Implementations may delegate to the _dispatch method."""
         pass
 
 class Broadcaster(object):
     """Provides mixin functionality to broadcast Signals to groups of Receivers.
     Receivers can be registered to listen to Signals (based on Signal name)
-    that the Broadcaster emits.
+    that the Broadcaster emits. Receivers can also be registered to listen only to
+    Signals in one namespace, so that they are not sent Signals meant for other robots.
+    Receivers are sent Signals in the order in which they were registered.
     """
     def __init__(self):
         super(Broadcaster, self).__init__()
         self.__receivers = {}
 
-    def register(self, signal_name, receiver):
+    def register(self, signal_name, receiver, namespace=None):
         """Registers a Receiver to listen for all signals of the specified name.
 
         Arguments:
             signal_name: the name of the type of Signal to listen to.
             receiver: a Receiver.
+            namespace: if not None, the Receiver will only be sent Signals whose
+            Namespace matches namespace.
         """
-        if signal_name not in self.__receivers:
-            self.__receivers[signal_name] = set()
-        self.__receivers[signal_name].add(receiver)
-    def deregister(self, signal_name, receiver):
+        key = (signal_name, namespace)
+        if key not in self.__receivers:
+            self.__receivers[key] = OrderedDict()
+        self.__receivers[key][receiver] = None
+    def deregister(self, signal_name, receiver, namespace=None):
         """Removes a Receiver that previously listened for signals.
 
         Arguments:
             signal_name: the name of the type of Signal to listen to.
             receiver: a Receiver that was previously registered to listen to signals
             of type signal_name.
+            namespace: the namespace the Receiver was registered with, if any.
 
         Exceptions:
             ValueError: no Receiver has ever been registered to listen to signals of
-            type signal_name.
+            type signal_name in the namespace.
             ValueError: the provided Receiver is not currently registered to listen to
-            signals of type signal_name.
+            signals of type signal_name in the namespace.
         """
-        if signal_name not in self.__receivers:
+        key = (signal_name, namespace)
+        if key not in self.__receivers:
             raise ValueError("No Receiver has ever been registered to listen to "
-                             "\"{}\" signals".format(signal_name))
-        if receiver not in self.__receivers[signal_name]:
+                             "\"{}\" signals{}".format(signal_name,
+                                                      self.__describe_namespace(namespace)))
+        if receiver not in self.__receivers[key]:
             raise ValueError("Receiver \"{}\" is not currently registered to listen "
-                             "to \"{}\" signals".format(receiver.get_name(), signal_name))
-        self.__receivers[signal_name].remove(receiver)
-    def is_registered(self, signal_name, receiver):
+                             "to \"{}\" signals{}".format(receiver.get_name(), signal_name,
+                                                         self.__describe_namespace(namespace)))
+        del self.__receivers[key][receiver]
+    def is_registered(self, signal_name, receiver, namespace=None):
         """Checks whether a Receiver is currently listening for signals."""
-        return signal_name in self.__receivers and receiver in self.__receivers[signal_name]
-    def toggle_registered(self, signal_name, receiver):
+        key = (signal_name, namespace)
+        return key in self.__receivers and receiver in self.__receivers[key]
+    def toggle_registered(self, signal_name, receiver, namespace=None):
         """Toggles whether a Receiver is currently listening for signals."""
-        if self.is_registered(signal_name, receiver):
-            self.deregister(signal_name, receiver)
+        if self.is_registered(signal_name, receiver, namespace):
+            self.deregister(signal_name, receiver, namespace)
         else:
-            self.register(signal_name, receiver)
+            self.register(signal_name, receiver, namespace)
+    @staticmethod
+    def __describe_namespace(namespace):
+        return "" if namespace is None else " in namespace \"{}\"".format(namespace)
 
     def broadcast(self, signal):
         """Broadcasts a signal to all Receiver registered with the specified Signal's name.
-        If no Receiver is registered with the specified Signal's name, does nothing.
+        Receivers registered with a namespace are only sent the signal if its Namespace
+        matches. If no Receiver is registered with the specified Signal's name, does nothing.
 
         Arguments:
             signal: the signal to broadcast.
         """
-        if signal.Name not in self.__receivers:
+        receivers = self._get_receivers(signal)
+        if not receivers:
             return
-        for receiver in self.__receivers[signal.Name]:
+        for receiver in receivers:
             receiver.send(signal)
+    def broadcast_many(self, signals):
+        """Broadcasts a sequence of Signals, as if by the broadcast method.
+        Each Receiver is sent all of the Signals meant for it at once, in order, so that it
+        is only woken once.
+
+        Arguments:
+            signals: an iterable of the Signals to broadcast.
+        """
+        broadcast_all((self, signal) for signal in signals)
+    def _get_receivers(self, signal):
+        """Returns a sequence of the Receivers to send the Signal to."""
+        receivers = self.__receivers.get((signal.Name, None), ())
+        namespaced_receivers = self.__receivers.get((signal.Name, signal.Namespace))
+        if namespaced_receivers and signal.Namespace is not None:
+            if receivers:
+                receivers = list(receivers) + [receiver for receiver in namespaced_receivers
+                                               if receiver not in receivers]
+            else:
+                receivers = namespaced_receivers
+        return receivers
 
+def broadcast_all(broadcasts):
+    """Broadcasts Signals from any number of Broadcasters, as if by their broadcast methods.
+    Each Receiver is sent all of the Signals meant for it at once, in order, so that it
+    is only woken once.
+
+    Arguments:
+        broadcasts: an iterable of 2-tuples of a Broadcaster and a Signal for it to broadcast.
+    """
+    batches = OrderedDict()
+    for (broadcaster, signal) in broadcasts:
+        for receiver in broadcaster._get_receivers(signal):
+            if receiver not in batches:
+                batches[receiver] = []
+            batches[receiver].append(signal)
+    for (receiver, batch) in batches.items():
+        receiver.send_many(batch)
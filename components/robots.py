@@ -1,6 +1,6 @@
 """Classes for management of hamster and virtual robots."""
-import time
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+import threading
 from sys import platform
 
 import numpy as np
@@ -13,12 +13,14 @@ if platform == "darwin":
     from hamster.comm_ble import RobotComm as HamsterComm
 else:
     from hamster.comm_usb import RobotComm as HamsterComm
+from hamster.robot import RobotAPI as HamsterAPI
+from hamster import HS2_Rx
 
 from components.util import rescale, clip, get_interpolator
-from components.messaging import Signal
-from components.concurrency import InterruptableThread, Reactor
+from components.messaging import Signal, DROP_OLDEST
+from components.concurrency import InterruptableThread, Reactor, RealClock
 from components.geometry import Pose, MobileFrame, direction_vector, to_vector
-from components.geometry import transform_all
+from components.geometry import transform_all, to_points, points_to_vectors, normalize_angle
 
 _PSD_PORT = 0
 _SERVO_PORT = 1
@@ -26,15 +28,48 @@ _SERVO_PORT = 1
 _INSTANT_CENTER_OFFSET = 0.5 # cm
 _ROBOT_SIZE = 4 # cm
 
+# Shapes of the virtual robot in its own frame, as read-only points
+_CHASSIS_POINTS = to_points((-0.75, 2.1), (-0.75, 1.7), (-1.5, 1.7),
+                            (-1.5, -1.7), (-0.75, -1.7), (-0.75, -2.1),
+                            (2.5, -2.1), (3, -1.5), (3.4, -1), (2.5, -1.4),
+                            (2.5, 1.4), (3.4, 1), (3, 1.5), (2.5, 2.1))
+_FLOOR_CENTER_POINTS = to_points((1.75, 0.85), (1.75, -0.85))
+_LEFT_FLOOR_POINTS = to_points((1.6, 0.6), (1.6, 1.1), (1.9, 1.1), (1.9, 0.6))
+_RIGHT_FLOOR_POINTS = to_points((1.6, -0.6), (1.6, -1.1), (1.9, -1.1), (1.9, -0.6))
+_PROXIMITY_POINTS = to_points((2.5, 1.7), (2.5, -1.7))
+_PSD_POINTS = to_points((2.5, -1), (3, -1))
+for _points in (_CHASSIS_POINTS, _FLOOR_CENTER_POINTS, _LEFT_FLOOR_POINTS,
+                _RIGHT_FLOOR_POINTS, _PROXIMITY_POINTS, _PSD_POINTS):
+    _points.flags.writeable = False
+
+# Sensor values decoded from a single packet received from a Hamster robot.
+# Sequence counts received packets from 1 and Time is when the packet was received.
+# Floor, Proximity and Acceleration are tuples of the left/right and x/y/z values.
+# Light, Battery and Temperature are only sent in some packets, so they hold the most
+# recently received values.
+SensorSnapshot = namedtuple("SensorSnapshot", ["Sequence", "Time", "Floor", "Proximity",
+                                               "PSD", "Acceleration", "Light", "Battery",
+                                               "Temperature", "Signal"])
 # Coord should be a numpy array, Angle and Servo should be in radians
 VirtualState = namedtuple("VirtualState", ["State", "Data"])
+# Codes of VirtualState States in the state array of a VirtualFleet
+_STATE_CODES = {"Stopped": 0, "Moving": 1, "Rotating": 2}
 
 class Robot(object):
     """Proxy for a Hamster robot and/or a simulated version of the robot.
-    Public attributes calibrate virtual robot sensors and effectors against real values."""
-    def __init__(self, hamster_robot=None, virtual_robot=None):
+    Public attributes calibrate virtual robot sensors and effectors against real values.
+    Packets received from the Hamster robot are timestamped with clock, a RealClock by
+    default."""
+    def __init__(self, hamster_robot=None, virtual_robot=None, clock=None):
         self._hamster = hamster_robot
         self._virtual = virtual_robot
+        self.__clock = RealClock() if clock is None else clock
+        self.__snapshot_lock = threading.Lock()
+        self.__snapshot = None
+        self.__sensor_listeners = []
+        if hamster_robot is not None:
+            self.__receive_sensors = hamster_robot.set_sensors
+            hamster_robot.set_sensors = self.__set_sensors
         self.move_multiplier = 0.095 # speed multiplier
         self.rotate_multiplier = 0.052 # speed multiplier
         self.floor_black = 10 # the blackest measurable value
@@ -141,6 +176,44 @@ class Robot(object):
             The PSD value.
         """
         return self._hamster.get_port(_PSD_PORT)
+    def get_sensor_snapshot(self):
+        """Return the values of all sensors from the most recently received packet.
+
+        Return:
+            A SensorSnapshot, or None if no packet has been received yet.
+        """
+        with self.__snapshot_lock:
+            return self.__snapshot
+    def add_sensor_listener(self, listener):
+        """Calls the listener with each new SensorSnapshot as soon as its packet is received.
+        Listeners are called on the Hamster communication thread, so they should not block.
+        """
+        with self.__snapshot_lock:
+            self.__sensor_listeners = self.__sensor_listeners + [listener]
+    def remove_sensor_listener(self, listener):
+        """Stops calling a listener previously added with add_sensor_listener."""
+        with self.__snapshot_lock:
+            self.__sensor_listeners = [existing for existing in self.__sensor_listeners
+                                       if existing != listener]
+    def __set_sensors(self, buf, from_hex):
+        # Called by the Hamster communication thread for every received packet, which
+        # is the only thread that replaces the packet read by the hamster getters
+        self.__receive_sensors(buf, from_hex)
+        hamster = self._hamster
+        with self.__snapshot_lock:
+            sequence = 1 if self.__snapshot is None else self.__snapshot.Sequence + 1
+            self.__snapshot = SensorSnapshot(
+                sequence, self.__clock.time(),
+                (hamster.get_floor(0), hamster.get_floor(1)),
+                (hamster.get_proximity(0), hamster.get_proximity(1)),
+                hamster.get_port(_PSD_PORT),
+                tuple(hamster.get_acceleration(axis) for axis in range(3)),
+                hamster.get_light(), hamster.get_battery(), hamster.get_temperature(),
+                hamster.get_signal())
+            snapshot = self.__snapshot
+            listeners = self.__sensor_listeners
+        for listener in listeners:
+            listener(snapshot)
 
     # Calibration
     def set_wheel_balance(self, wheel_balance):
@@ -175,21 +248,62 @@ class Robot(object):
         psd = self.psd_profile_inverse_interp(distance)
         return None if np.isnan(psd) else psd
 
+class LocalPacketSource(InterruptableThread):
+    """Stand-in for the Hamster communication thread, for use without a robot or dongle.
+    Feeds sensor packets to a Hamster API object at a fixed interval, as the dongle would,
+    so that the API object can be given to a Robot in place of a real Hamster robot.
+    Sensor values are read from read_sensors, a function which returns a dict of any of
+    the following keys, or from send_packet. Fields which are not given are left as 0.
+        floor: a 2-tuple of the left and right floor values.
+        proximity: a 2-tuple of the left and right proximity values.
+        psd: the PSD value.
+    Packets are timed with clock, a RealClock by default.
+    """
+    def __init__(self, name="Local Packet Source", packet_interval=0.02, read_sensors=None,
+                 clock=None):
+        super(LocalPacketSource, self).__init__(name)
+        self.__hamster = HamsterAPI(None)
+        self.__packet_interval = packet_interval
+        self.__read_sensors = dict if read_sensors is None else read_sensors
+        self.__clock = RealClock() if clock is None else clock
+
+    def get_hamster(self):
+        """Returns the Hamster API object which receives the packets."""
+        return self.__hamster
+    def send_packet(self, floor=(0, 0), proximity=(0, 0), psd=0):
+        """Immediately delivers one packet with the specified sensor values."""
+        packet = bytearray(HS2_Rx.packet_size)
+        (packet[HS2_Rx.line_left], packet[HS2_Rx.line_right]) = floor
+        (packet[HS2_Rx.proximity_left], packet[HS2_Rx.proximity_right]) = proximity
+        packet[HS2_Rx.port_a + _PSD_PORT] = psd
+        self.__hamster.set_sensors(packet, False)
+
+    # Implementation of parent abstract methods
+    def _run(self):
+        while not self.will_quit():
+            self.send_packet(**self.__read_sensors())
+            self.__clock.sleep(self.__packet_interval)
+
 class Beeper(Reactor):
     """Beeps. Useful for notifications.
 
     Signals Received:
         Will react to any Signal named Beep whose Namespace matches the name of its robot.
         Data should be a 2-tuple of the note and its duration.
+        At most queue_depth Beeps wait to be played; further Beeps make the oldest waiting
+        ones be dropped, so that the last note of a sequence, usually 0 to end it, is played.
+        Beeps are timed with clock, a RealClock by default.
     """
-    def __init__(self, name, robot):
+    def __init__(self, name, robot, queue_depth=8, clock=None):
         super(Beeper, self).__init__(name)
         self._robot = robot
+        self._clock = RealClock() if clock is None else clock
+        self.set_queue_limit(queue_depth, DROP_OLDEST)
 
     def _react(self, signal):
         if signal.Name == "Beep" and signal.Namespace == self._robot.get_name():
             self._robot.beep(signal.Data[0])
-            time.sleep(signal.Data[1])
+            self._clock.sleep(signal.Data[1])
     def _run_post(self):
         self._robot.beep(0)
 class Mover(Reactor):
@@ -256,10 +370,22 @@ class VirtualScanner(MobileFrame):
         the first tuple member as a point and the difference between the second and first
         tuple members as the direction.
         """
-        return (to_vector(2.5, -1), to_vector(3, -1))
+        return points_to_vectors(_PSD_POINTS)
     def get_psd_distance_coords(self, distance):
         """Returns the coordinates of the obstacle from the PSD sensor as a column vector."""
         return None if distance is None else self.get_psd_coords()[0] + to_vector(distance, 0)
+    def get_psd_points(self):
+        """Returns the PSD sensor line segment, as given by get_psd_coords, as points."""
+        return _PSD_POINTS
+    def get_psd_beam_points(self, distance):
+        """Returns the PSD beam as points from the sensor to the obstacle.
+        If there is no obstacle, the beam ends at the front end of the sensor.
+        """
+        beam = _PSD_POINTS.copy()
+        if distance is not None:
+            beam[1] = beam[0]
+            beam[1, 0] += distance
+        return beam
 
 class VirtualRobot(InterruptableThread, MobileFrame):
     """Virtual robot to simulate a hamster robot.
@@ -268,19 +394,71 @@ class VirtualRobot(InterruptableThread, MobileFrame):
         Pose: broadcasts the current pose of the robot. Angle is not normalized.
         ScannerPose: broadcasts the current pose of the robot's Scanner.
         ResetPose: broadcasts the current pose of the robot as it is (re)initialized.
+
+    Motion is integrated over the time elapsed on clock, a RealClock by default. With a
+    SimulationClock on an EventLoop, the same commands always give the same trajectory.
+    If the robot is added to a VirtualFleet, the fleet integrates its motion instead, and
+    the robot does not run its own thread.
+
+    Pose updates during motion can be throttled with set_pose_thresholds, which skips
+    updates until the robot has moved or rotated far enough, and with set_max_pose_rate,
+    which limits how often each Receiver is sent updates. Regardless of either, the Pose
+    is always broadcast to every Receiver when the robot changes its motion, e.g. as it
+    stops, and send_pose sends a Receiver a snapshot of the current Pose on demand.
     """
     def __init__(self, name, update_interval=0.02,
                  pose=centroid_to_instant_center(Pose(to_vector(0, 0), 0)),
-                 servo_angle=0):
+                 servo_angle=0, clock=None):
         # The Coord of the input pose specifies the centroid of the robot
         super(VirtualRobot, self).__init__(name)
+        self.__fleet = None
+        self.__fleet_index = None
         self.__initial_pose = pose
         self._pose_coord = pose.Coord
         self._pose_angle = pose.Angle
         self._scanner = VirtualScanner(servo_angle)
         self.__update_interval = update_interval
-        self.__update_time = time.time()
+        self.__clock = RealClock() if clock is None else clock
+        self.__update_time = self.__clock.time()
         self._state = VirtualState("Stopped", None)
+        self.__lock = threading.Lock()
+        self.__timer = None
+        self.__emission_lock = threading.Lock()
+        self.__min_translation = 0
+        self.__min_rotation = 0
+        self.__emitted_pose = None
+        self.__pose_intervals = {}
+        self.__pose_send_times = {}
+
+    # Pose storage, which is delegated to the robot's VirtualFleet if it has one
+    @property
+    def _pose_coord(self):
+        if self.__fleet is None:
+            return self.__pose_coord
+        return self.__fleet._get_pose(self.__fleet_index).Coord
+    @_pose_coord.setter
+    def _pose_coord(self, coord):
+        if self.__fleet is None:
+            self.__pose_coord = coord
+        else:
+            self.__fleet._set_coord(self.__fleet_index, coord)
+    @property
+    def _pose_angle(self):
+        if self.__fleet is None:
+            return self.__pose_angle
+        return self.__fleet._get_pose(self.__fleet_index).Angle
+    @_pose_angle.setter
+    def _pose_angle(self, angle):
+        if self.__fleet is None:
+            self.__pose_angle = angle
+        else:
+            self.__fleet._set_angle(self.__fleet_index, angle)
+    def _join_fleet(self, fleet, index):
+        """Hands integration of the robot's motion over to the VirtualFleet.
+        Called by VirtualFleet.add_robot.
+        """
+        self.__fleet = fleet
+        self.__fleet_index = index
 
     def move(self, speed):
         """Move the robot forwards/backwards at the specified speed.
@@ -288,22 +466,30 @@ class VirtualRobot(InterruptableThread, MobileFrame):
         Arguments:
             speed: the movement speed. -100 (backwards) to 100 (forwards).
         """
-        self.__update_time = time.time()
         if speed == 0:
-            self._state = VirtualState("Stopped", None)
+            self.__set_state(VirtualState("Stopped", None))
         else:
-            self._state = VirtualState("Moving", speed)
+            self.__set_state(VirtualState("Moving", speed))
     def rotate(self, speed):
         """Rotate the robot counterclockwise/clockwise at the specified speed.
 
         Arguments:
             speed: the movement speed. -100 (clockwise) to 100 (counterclockwise).
         """
-        self.__update_time = time.time()
         if speed == 0:
-            self._state = VirtualState("Stopped", None)
+            self.__set_state(VirtualState("Stopped", None))
+        else:
+            self.__set_state(VirtualState("Rotating", speed))
+    def __set_state(self, state):
+        # Motion under the previous state is integrated up to the moment the state changes
+        if self.__fleet is not None:
+            moved = self.__fleet._integrate_robot(self.__fleet_index, state)
         else:
-            self._state = VirtualState("Rotating", speed)
+            with self.__lock:
+                moved = self.__integrate()
+        self._state = state
+        if moved:
+            self._broadcast_pose(True)
     def servo(self, angle):
         """Rotate the PSD scanner's servo to the specified angle in degrees.
 
@@ -315,26 +501,36 @@ class VirtualRobot(InterruptableThread, MobileFrame):
     # Chassis
     def get_corners(self):
         """Returns a tuple of the robot chassis's coordinates as column vectors."""
-        return (to_vector(-0.75, 2.1), to_vector(-0.75, 1.7), to_vector(-1.5, 1.7),
-                to_vector(-1.5, -1.7), to_vector(-0.75, -1.7), to_vector(-0.75, -2.1),
-                to_vector(2.5, -2.1), to_vector(3, -1.5), to_vector(3.4, -1), to_vector(2.5, -1.4),
-                to_vector(2.5, 1.4), to_vector(3.4, 1), to_vector(3, 1.5), to_vector(2.5, 2.1))
+        return points_to_vectors(_CHASSIS_POINTS)
+    def get_corner_points(self):
+        """Returns the robot chassis's coordinates as points."""
+        return _CHASSIS_POINTS
     # Floor sensors
     def get_floor_centers(self):
         """Returns the centers of the robot's left & right floor sensors as column vectors."""
-        return (to_vector(1.75, 0.85), to_vector(1.75, -0.85))
+        return points_to_vectors(_FLOOR_CENTER_POINTS)
+    def get_floor_center_points(self):
+        """Returns the centers of the robot's left & right floor sensors as points."""
+        return _FLOOR_CENTER_POINTS
     def get_left_floor_corners(self):
         """Returns a tuple of the corners of the robot's left floor sensor as column vectors."""
-        return (to_vector(1.6, 0.6), to_vector(1.6, 1.1),
-                to_vector(1.9, 1.1), to_vector(1.9, 0.6))
+        return points_to_vectors(_LEFT_FLOOR_POINTS)
+    def get_left_floor_corner_points(self):
+        """Returns the corners of the robot's left floor sensor as points."""
+        return _LEFT_FLOOR_POINTS
     def get_right_floor_corners(self):
         """Returns a tuple of the corners of the robot's right floor sensor as column vectors."""
-        return (to_vector(1.6, -0.6), to_vector(1.6, -1.1),
-                to_vector(1.9, -1.1), to_vector(1.9, -0.6))
+        return points_to_vectors(_RIGHT_FLOOR_POINTS)
+    def get_right_floor_corner_points(self):
+        """Returns the corners of the robot's right floor sensor as points."""
+        return _RIGHT_FLOOR_POINTS
     # Proximity IR sensors
     def get_proximity_coords(self):
         """Returns the locations of the robot's left & right proximity sensors as column vectors."""
-        return (to_vector(2.5, 1.7), to_vector(2.5, -1.7))
+        return points_to_vectors(_PROXIMITY_POINTS)
+    def get_proximity_points(self):
+        """Returns the locations of the robot's left & right proximity sensors as points."""
+        return _PROXIMITY_POINTS
     def get_proximity_distance_coords(self, left_distance, right_distance):
         """Returns the coordinates of the obstacles from the left and right proximity distances."""
         sensor_coords = self.get_proximity_coords()
@@ -343,6 +539,17 @@ class VirtualRobot(InterruptableThread, MobileFrame):
         right_coord = (None if right_distance is None
                        else sensor_coords[1] + to_vector(right_distance, 0))
         return (left_coord, right_coord)
+    def get_proximity_beam_points(self, left_distance, right_distance):
+        """Returns the left and right proximity beams as 4 points.
+        Each beam is a pair of points from the sensor to the obstacle; if there is no
+        obstacle, the beam ends at the sensor.
+        """
+        beams = _PROXIMITY_POINTS[(0, 0, 1, 1), :]
+        if left_distance is not None:
+            beams[1, 0] += left_distance
+        if right_distance is not None:
+            beams[3, 0] += right_distance
+        return beams
     # PSD scanner
     def get_scanner(self):
         """Returns the robot's VirtualScanner."""
@@ -355,36 +562,252 @@ class VirtualRobot(InterruptableThread, MobileFrame):
         """
         self._pose_coord = new_pose.Coord
         self._pose_angle = new_pose.Angle
+        self.__emitted_pose = None
         self.broadcast(Signal("SetPose", self.get_name(), self.get_name(), self.get_pose()))
 
+    # Pose emission
+    def set_pose_thresholds(self, min_translation=0, min_rotation=0):
+        """Skips Pose updates during motion until the robot has moved by at least
+        min_translation or rotated by at least min_rotation radians since the last
+        broadcast Pose. A threshold of 0 skips no updates which change the pose along its
+        axis. By default, every Pose update is broadcast.
+        """
+        self.__min_translation = min_translation
+        self.__min_rotation = min_rotation
+    def set_max_pose_rate(self, receiver, max_rate):
+        """Limits the rate, in updates per second, at which the Receiver is sent Pose
+        updates during motion. The Receiver is sent the latest Pose with the first update
+        after each interval elapses. A max_rate of None removes the limit.
+        """
+        with self.__emission_lock:
+            if max_rate is None:
+                self.__pose_intervals.pop(receiver, None)
+                self.__pose_send_times.pop(receiver, None)
+            else:
+                self.__pose_intervals[receiver] = 1.0 / max_rate
+    def send_pose(self, receiver):
+        """Sends the Receiver a Pose Signal with a snapshot of the robot's current pose,
+        regardless of the emission policy."""
+        if self.__fleet is not None:
+            moved = self.__fleet._integrate_robot(self.__fleet_index)
+        else:
+            with self.__lock:
+                moved = self.__integrate()
+        if moved:
+            self._broadcast_pose()
+        receiver.send(Signal("Pose", self.get_name(), self.get_name(), self.get_pose()))
+
+    # Threading
+    def start(self):
+        """Starts the robot's thread, unless the robot belongs to a VirtualFleet."""
+        if self.__fleet is None:
+            super(VirtualRobot, self).start()
+
     # Implementation of parent abstract methods
     def _run(self):
         while not self.will_quit():
-            curr_time = time.time()
-            delta_time = curr_time - self.__update_time
-            self.__update_time = curr_time
-            if self._state.State == "Moving":
-                speed = self._state.Data
-                direction = direction_vector(self._pose_angle)
-                self._pose_coord = self._pose_coord + speed * delta_time * direction
-                self.__broadcast_pose()
-            elif self._state.State == "Rotating":
-                speed = self._state.Data
-                self._pose_angle = self._pose_angle + speed * delta_time
-                self.__broadcast_pose()
-            time.sleep(self.__update_interval)
-    def __broadcast_pose(self):
-        self.broadcast(Signal("Pose", self.get_name(), self.get_name(), self.get_pose()))
+            self._update()
+            self.__clock.sleep(self.__update_interval)
+    def _run_coroutine(self):
+        while not self.will_quit():
+            self._update()
+            yield self.__update_interval
+    def _start_timers(self, timer_wheel):
+        self.__timer = timer_wheel.call_every(self.__update_interval, self._update)
+    def _stop_timers(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+    def _update(self):
+        """Integrates the robot's motion since the last update and broadcasts its pose."""
+        with self.__lock:
+            moved = self.__integrate()
+        if moved:
+            self._broadcast_pose()
+    def __integrate(self):
+        """Integrates the robot's motion up to the current time.
+        Returns whether the robot moved. Must be called with the lock held.
+        """
+        curr_time = self.__clock.time()
+        delta_time = curr_time - self.__update_time
+        self.__update_time = curr_time
+        if self._state.State == "Moving":
+            speed = self._state.Data
+            direction = direction_vector(self._pose_angle)
+            self._pose_coord = self._pose_coord + speed * delta_time * direction
+            return True
+        elif self._state.State == "Rotating":
+            speed = self._state.Data
+            self._pose_angle = self._pose_angle + speed * delta_time
+            return True
+        return False
+    def _broadcast_pose(self, forced=False):
+        """Broadcasts the current pose of the robot, subject to the emission policy
+        unless forced."""
+        signal = Signal("Pose", self.get_name(), self.get_name(), self.get_pose())
+        for receiver in self._get_pose_receivers(signal, forced):
+            receiver.send(signal)
+    def _get_pose_receivers(self, signal, forced=False):
+        """Returns a sequence of the Receivers to send the Pose Signal to under the
+        emission policy, which is ignored if forced."""
+        pose = signal.Data
+        with self.__emission_lock:
+            last_pose = self.__emitted_pose
+            if (not forced and last_pose is not None
+                    and (self.__min_translation or self.__min_rotation)
+                    and _below_threshold(np.hypot(*(pose.Coord - last_pose.Coord).ravel()),
+                                         self.__min_translation)
+                    and _below_threshold(abs(normalize_angle(pose.Angle - last_pose.Angle)),
+                                         self.__min_rotation)):
+                return ()
+            self.__emitted_pose = pose
+            receivers = self._get_receivers(signal)
+            if forced or not self.__pose_intervals:
+                return receivers
+            now = self.__clock.time()
+            limited_receivers = []
+            for receiver in receivers:
+                interval = self.__pose_intervals.get(receiver)
+                if interval is not None:
+                    send_time = self.__pose_send_times.get(receiver)
+                    if send_time is not None and now < send_time + interval:
+                        continue
+                    self.__pose_send_times[receiver] = now
+                limited_receivers.append(receiver)
+            return limited_receivers
     def __broadcast_servo_pose(self):
         self.broadcast(Signal("ScannerPose", self.get_name(), self.get_name(),
                               self._scanner.get_pose()))
     def get_pose(self):
-        return Pose(self._pose_coord, self._pose_angle)
+        if self.__fleet is None:
+            return Pose(self.__pose_coord, self.__pose_angle)
+        return self.__fleet._get_pose(self.__fleet_index)
     def reset_pose(self):
         self._pose_coord = self.__initial_pose.Coord
         self._pose_angle = self.__initial_pose.Angle
+        self.__emitted_pose = None
         self._scanner.reset_pose()
         self.broadcast(Signal("ResetPose", self.get_name(), self.get_name(), self.get_pose()))
         self.broadcast(Signal("ScannerPose", self.get_name(), self.get_name(),
                               self._scanner.get_pose()))
 
+def _below_threshold(change, threshold):
+    """Checks whether a change is too small to broadcast; with a threshold of 0, only no
+    change at all is."""
+    return change < threshold if threshold else change == 0
+
+class VirtualFleet(InterruptableThread):
+    """Integrates the motion of many VirtualRobots in a single thread.
+    The poses, states, and speeds of all robots in the fleet are kept in arrays, with one
+    column or element per robot, and are advanced together in one vectorized update.
+    Robots keep their own interfaces and Pose emission policies, but each only broadcasts
+    its Pose when it moved, and the Pose Signals of all robots are sent together to each
+    of their Receivers.
+    Motion is integrated over the time elapsed on clock, a RealClock by default.
+    """
+    def __init__(self, name="Virtual Fleet", update_interval=0.02, clock=None):
+        super(VirtualFleet, self).__init__(name)
+        self.__update_interval = update_interval
+        self.__clock = RealClock() if clock is None else clock
+        self.__robots = []
+        self.__coords = np.zeros((2, 0))
+        self.__angles = np.zeros(0)
+        self.__states = np.zeros(0, dtype=int)
+        self.__speeds = np.zeros(0)
+        self.__update_times = np.zeros(0)
+        self.__lock = threading.Lock()
+        self.__timer = None
+
+    def add_robot(self, virtual_robot):
+        """Adds a VirtualRobot to the fleet. Must be called before the robot is started."""
+        pose = virtual_robot.get_pose()
+        state = virtual_robot._state
+        with self.__lock:
+            index = len(self.__robots)
+            self.__robots.append(virtual_robot)
+            self.__coords = np.hstack((self.__coords, pose.Coord))
+            self.__angles = np.append(self.__angles, pose.Angle)
+            self.__states = np.append(self.__states, _STATE_CODES[state.State])
+            self.__speeds = np.append(self.__speeds, 0 if state.Data is None else state.Data)
+            self.__update_times = np.append(self.__update_times, self.__clock.time())
+        virtual_robot._join_fleet(self, index)
+    def get_robots(self):
+        """Returns a list of the VirtualRobots in the fleet."""
+        return list(self.__robots)
+    def __len__(self):
+        return len(self.__robots)
+
+    # Per-robot access, for VirtualRobots in the fleet
+    def _get_pose(self, index):
+        with self.__lock:
+            return Pose(self.__coords[:, index:index + 1].copy(), float(self.__angles[index]))
+    def _set_coord(self, index, coord):
+        with self.__lock:
+            self.__coords[:, index:index + 1] = coord
+    def _set_angle(self, index, angle):
+        with self.__lock:
+            self.__angles[index] = angle
+    def _integrate_robot(self, index, state=None):
+        """Integrates the motion of one robot up to the current time, then changes its
+        state to the VirtualState, if given. Returns whether the robot moved.
+        """
+        selected = np.zeros(len(self.__robots), dtype=bool)
+        selected[index] = True
+        with self.__lock:
+            moved = self.__integrate(selected)
+            if state is not None:
+                self.__states[index] = _STATE_CODES[state.State]
+                self.__speeds[index] = 0 if state.Data is None else state.Data
+        return len(moved) > 0
+
+    # Implementation of parent abstract methods
+    def _run(self):
+        while not self.will_quit():
+            self._update()
+            self.__clock.sleep(self.__update_interval)
+    def _run_coroutine(self):
+        while not self.will_quit():
+            self._update()
+            yield self.__update_interval
+    def _start_timers(self, timer_wheel):
+        self.__timer = timer_wheel.call_every(self.__update_interval, self._update)
+    def _stop_timers(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+    def _update(self):
+        """Integrates the motion of all robots since the last update and broadcasts the
+        poses of the robots which moved."""
+        selected = np.ones(len(self.__robots), dtype=bool)
+        with self.__lock:
+            moved = self.__integrate(selected)
+            coords = self.__coords[:, moved]
+            angles = self.__angles[moved].tolist()
+        batches = OrderedDict()
+        for (column, index) in enumerate(moved):
+            robot = self.__robots[index]
+            pose = Pose(coords[:, column:column + 1], angles[column])
+            signal = Signal("Pose", robot.get_name(), robot.get_name(), pose)
+            for receiver in robot._get_pose_receivers(signal):
+                if receiver not in batches:
+                    batches[receiver] = []
+                batches[receiver].append(signal)
+        for (receiver, batch) in batches.items():
+            receiver.send_many(batch)
+    def __integrate(self, selected):
+        """Integrates the motion of the selected robots up to the current time.
+        Returns an array of the indices of the robots which moved. Must be called with
+        the lock held.
+
+        Arguments:
+            selected: a boolean array with an element for each robot.
+        """
+        curr_time = self.__clock.time()
+        delta_times = curr_time - self.__update_times
+        self.__update_times[selected] = curr_time
+        moving = selected & (self.__states == _STATE_CODES["Moving"])
+        rotating = selected & (self.__states == _STATE_CODES["Rotating"])
+        if moving.any():
+            distances = self.__speeds[moving] * delta_times[moving]
+            self.__coords[:, moving] += distances * direction_vector(self.__angles[moving])
+        if rotating.any():
+            self.__angles[rotating] += self.__speeds[rotating] * delta_times[rotating]
+        return np.flatnonzero(moving | rotating)
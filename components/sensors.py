@@ -1,13 +1,10 @@
 """Support for continuous monitoring of hamster robot sensor data."""
-import time
-from threading import Semaphore
+from threading import Semaphore, Lock
 import Queue as queue
 
-from numpy import median
-
-from components.util import moving_average
+from components.util import FilterBank
 from components.messaging import Signal, Receiver, Broadcaster
-from components.concurrency import InterruptableThread, Reactor
+from components.concurrency import InterruptableThread, Reactor, RealClock
 from components.geometry import transformation, transform_all, compose, to_angle
 
 _WARMUP_TIME = 0.5
@@ -18,7 +15,81 @@ _FLOOR_FILTER_WINDOW = 4
 _PROXIMITY_FILTER_WINDOW = 8
 _PSD_FILTER_WINDOW = 4
 
-class Monitor(InterruptableThread, Receiver, Broadcaster):
+class DeadbandBroadcaster(Broadcaster):
+    """Provides mixin functionality to broadcast sensor Signals only when they change.
+    By default every Signal is broadcast. A deadband can be set for each Signal name, so
+    that a Signal is only broadcast when any of its values differs from the last broadcast
+    value by more than the deadband, or when a value appears or disappears; values must
+    drift out of the deadband around the last broadcast value, so noise within the
+    deadband does not cause repeated broadcasts. A keep-alive interval can also be set, so
+    that unchanged Signals are broadcast again after that many seconds.
+    The latest Signal of each name is kept regardless, and can be sent on demand.
+    """
+    def __init__(self):
+        super(DeadbandBroadcaster, self).__init__()
+        self.__publish_lock = Lock()
+        self.__deadbands = {}
+        self.__published = {}
+        self.__latest = {}
+
+    def set_deadband(self, signal_name, deadband, keep_alive=None):
+        """Only broadcasts Signals of the specified name when their values change by more
+        than the deadband, or when keep_alive seconds have passed since the last broadcast.
+        A deadband of 0 broadcasts only changed values, and a deadband of None broadcasts
+        every Signal.
+        """
+        with self.__publish_lock:
+            if deadband is None:
+                self.__deadbands.pop(signal_name, None)
+            else:
+                self.__deadbands[signal_name] = (deadband, keep_alive)
+            self.__published.pop(signal_name, None)
+    def send_latest(self, receiver, signal_name=None):
+        """Sends the Receiver the latest Signal of the specified name, or of every name if
+        signal_name is None, whether or not it was broadcast."""
+        with self.__publish_lock:
+            if signal_name is None:
+                signals = self.__latest.values()
+            elif signal_name in self.__latest:
+                signals = [self.__latest[signal_name]]
+            else:
+                signals = []
+        receiver.send_many(signals)
+
+    def _publish(self, signal, now):
+        """Broadcasts the Signal if it has changed enough since the last broadcast Signal
+        of its name, as of the specified time."""
+        with self.__publish_lock:
+            self.__latest[signal.Name] = signal
+            if signal.Name in self.__deadbands:
+                (deadband, keep_alive) = self.__deadbands[signal.Name]
+                published = self.__published.get(signal.Name)
+                if (published is not None
+                        and (keep_alive is None or now - published[1] < keep_alive)
+                        and not _exceeds_deadband(published[0].Data, signal.Data, deadband)):
+                    return
+                self.__published[signal.Name] = (signal, now)
+        self.broadcast(signal)
+    def _reset_published(self, signal_name):
+        """Broadcasts the next Signal of the specified name regardless of its deadband."""
+        with self.__publish_lock:
+            self.__published.pop(signal_name, None)
+
+def _exceeds_deadband(published, value, deadband):
+    """Checks whether any element of the value differs from the corresponding element
+    of the published value by more than the deadband. Values may be scalars or tuples,
+    whose elements may be None."""
+    if not isinstance(value, tuple):
+        (published, value) = ((published,), (value,))
+    for (published_element, element) in zip(published, value):
+        if published_element is None or element is None:
+            if published_element is not element:
+                return True
+        elif abs(element - published_element) > deadband:
+            return True
+    return False
+
+class Monitor(InterruptableThread, Receiver, DeadbandBroadcaster):
     """Abstract class for monitoring sensor values and broadcasting them.
     Can be set to sleep when no Reactors are currently registered.
 
@@ -33,25 +104,44 @@ class Monitor(InterruptableThread, Receiver, Broadcaster):
         registered to receive Signals from the Monitor. Signals are only processed
         if their Namespace matches the name of the Monitor's robot.
         Servo: rotates the PSD scanner. Data should be a positive int of the target angle.
+        Packet: wakes an event-driven Monitor's thread to update. Sent by the Monitor to
+        itself when its robot receives a packet. Packet Signals are conflated.
         None: immediately prepares to quit the Monitor's thread.
+
+    Signals are broadcast according to the deadbands set with set_deadband.
+    Sensor updates and scanner stabilization are timed with clock, a RealClock by default.
+    Each update reads all sensor values from a single SensorSnapshot of the robot, and is
+    skipped if the robot has not received a new packet since the previous update.
+    If event_driven is True, the Monitor updates as soon as each new packet is received
+    instead of every update_interval. In its own thread, it then blocks until a packet or
+    a Signal is received; on an EventLoop or TimerWheel, update_interval still bounds how
+    long received Signals may wait to be processed when no packets arrive.
     """
-    def __init__(self, name, robot, update_interval=0.1, auto_sleep=True):
+    def __init__(self, name, robot, update_interval=0.1, auto_sleep=True, clock=None,
+                 event_driven=False):
         super(Monitor, self).__init__(name)
         self._robot = robot
         self._update_interval = update_interval
+        self._clock = RealClock() if clock is None else clock
         self.__auto_sleep = auto_sleep
+        self.__event_driven = event_driven
+        if event_driven:
+            self.conflate("Packet")
         self._num_listeners = Semaphore(0) # tracks the number of registered Reactors
         self._psd_start_time = 0
+        self._sequence = None # of the most recently processed SensorSnapshot
+        self.__timer = None
+        self.__timer_wheel = None
 
     # Extending parent functions in Broadcaster
-    def register(self, signal_name, reactor):
+    def register(self, signal_name, reactor, namespace=None):
         """Registers a Reactor to listen for all signals of the specified name."""
-        super(Monitor, self).register(signal_name, reactor)
+        super(Monitor, self).register(signal_name, reactor, namespace)
         if self.__auto_sleep:
             self._num_listeners.release()
-    def deregister(self, signal_name, reactor):
+    def deregister(self, signal_name, reactor, namespace=None):
         """Removes a Reactor that previously listened for signals."""
-        super(Monitor, self).deregister(signal_name, reactor)
+        super(Monitor, self).deregister(signal_name, reactor, namespace)
         if self.__auto_sleep:
             self._num_listeners.acquire()
 
@@ -61,17 +151,88 @@ class Monitor(InterruptableThread, Receiver, Broadcaster):
         self.send(None)
     def _run(self):
         self._run_pre()
+        if self.__event_driven:
+            self._robot.add_sensor_listener(self.__wake_on_packet)
         while not self.will_quit():
             if self.__auto_sleep:
                 self._num_listeners.acquire()
                 self._num_listeners.release()
-            self._react_all()
-            self._update_floor()
-            self._update_proximity()
-            if time.time() >= self._psd_start_time:
-                self._update_psd()
-            time.sleep(self._update_interval)
+            self._update()
+            if self.__event_driven:
+                self.__wait_for_packet()
+            else:
+                self._clock.sleep(self._update_interval)
+        if self.__event_driven:
+            self._robot.remove_sensor_listener(self.__wake_on_packet)
         self._run_post()
+    def __wake_on_packet(self, snapshot):
+        self.send(Signal("Packet", self.get_name(), self._robot.get_name(), snapshot.Sequence))
+    def __wait_for_packet(self):
+        # Blocks until a Packet or any other Signal is received, then reacts to it
+        try:
+            self._react(self._receive())
+        except queue.Empty:
+            pass
+    def _run_coroutine(self):
+        # Same as _run, but sleeps by yielding and polls for listeners instead of blocking
+        yield _WARMUP_TIME
+        self._robot.init_psd_scanner()
+        self._robot.servo(90)
+        yield _PSD_STABILIZATION_INTERVAL
+        if self.__event_driven:
+            self._robot.add_sensor_listener(self.__resume_on_packet)
+        while not self.will_quit():
+            if not self.__auto_sleep or self._num_listeners.acquire(False):
+                if self.__auto_sleep:
+                    self._num_listeners.release()
+                self._update()
+            yield self._update_interval
+        if self.__event_driven:
+            self._robot.remove_sensor_listener(self.__resume_on_packet)
+        self._robot.servo(90)
+        yield _PSD_STABILIZATION_INTERVAL
+    def __resume_on_packet(self, _):
+        self._resume()
+    def _start_timers(self, timer_wheel):
+        # Same as _run_pre, but waits for the PSD scanner to stabilize without blocking
+        self.__timer = timer_wheel.call_later(_WARMUP_TIME, self.__start_updates, timer_wheel)
+    def __start_updates(self, timer_wheel):
+        self._robot.init_psd_scanner()
+        self._robot.servo(90)
+        self._psd_start_time = self._clock.time() + _PSD_STABILIZATION_INTERVAL
+        if not self.will_quit():
+            if self.__event_driven:
+                self.__timer_wheel = timer_wheel
+                self._robot.add_sensor_listener(self.__update_on_packet)
+            self.__timer = timer_wheel.call_every(self._update_interval, self.__update_on_timer)
+    def __update_on_packet(self, _):
+        self.__timer_wheel.call_later(0, self.__update_on_timer)
+    def __update_on_timer(self):
+        if not self.__auto_sleep or self._num_listeners.acquire(False):
+            if self.__auto_sleep:
+                self._num_listeners.release()
+            self._update()
+    def _stop_timers(self):
+        if self.__timer_wheel is not None:
+            self._robot.remove_sensor_listener(self.__update_on_packet)
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self._run_post()
+    def _update(self):
+        """Reacts to received Signals and updates sensor values once."""
+        self._react_all()
+        snapshot = self._robot.get_sensor_snapshot()
+        if snapshot is None or snapshot.Sequence == self._sequence:
+            return
+        self._sequence = snapshot.Sequence
+        self._update_sensors(snapshot, self._clock.time() >= self._psd_start_time)
+    def _update_sensors(self, snapshot, update_psd):
+        """Processes and broadcasts the sensor values of a new SensorSnapshot.
+        Only processes the PSD value if update_psd is True."""
+        self._update_floor(snapshot.Floor)
+        self._update_proximity(snapshot.Proximity)
+        if update_psd:
+            self._update_psd(snapshot.PSD)
     def _react(self, signal):
         # should only be called from within a _react_all call
         if signal is None:
@@ -80,26 +241,27 @@ class Monitor(InterruptableThread, Receiver, Broadcaster):
             return
         elif signal.Name == "Servo":
             self._robot.servo(signal.Data)
-            self._psd_start_time = time.time() + _PSD_STABILIZATION_INTERVAL
+            self._psd_start_time = self._clock.time() + _PSD_STABILIZATION_INTERVAL
+            self._reset_published("PSD")
             self._react_servo_post()
     def _run_pre(self):
-        time.sleep(_WARMUP_TIME)
+        self._clock.sleep(_WARMUP_TIME)
         self._robot.init_psd_scanner()
         self._robot.servo(90)
-        time.sleep(_PSD_STABILIZATION_INTERVAL)
+        self._clock.sleep(_PSD_STABILIZATION_INTERVAL)
     def _run_post(self):
         self._robot.servo(90)
-        time.sleep(_PSD_STABILIZATION_INTERVAL)
+        self._clock.sleep(_PSD_STABILIZATION_INTERVAL)
 
     # Abstract methods
-    def _update_floor(self):
-        """Read and process floor sensor values and broadcast values."""
+    def _update_floor(self, floor):
+        """Process floor sensor values and broadcast values."""
         pass
-    def _update_proximity(self):
-        """Read and process proximity sensor values and broadcast values."""
+    def _update_proximity(self, proximity):
+        """Process proximity sensor values and broadcast values."""
         pass
-    def _update_psd(self):
-        """Read and process PSD sensor value and broadcast value."""
+    def _update_psd(self, psd):
+        """Process PSD sensor value and broadcast value."""
         pass
     def _react_servo_post(self):
         """Executes after reacting to a Servo signal."""
@@ -109,67 +271,71 @@ class SimpleMonitor(Monitor):
     """A Monitor that updates sensor values.
     The reference implementation of Monitor.
     """
-    def __init__(self, name, robot, update_interval=0.1, auto_sleep=True):
-        super(SimpleMonitor, self).__init__(name, robot, update_interval, auto_sleep)
+    def __init__(self, name, robot, update_interval=0.1, auto_sleep=True, clock=None,
+                 event_driven=False):
+        super(SimpleMonitor, self).__init__(name, robot, update_interval, auto_sleep, clock,
+                                            event_driven)
 
     # Implementation of parent abstract methods
-    def _update_floor(self):
-        floor = self._robot.get_floor()
-        self.broadcast(Signal("Floor", self.get_name(), self._robot.get_name(), floor))
-    def _update_proximity(self):
-        proximity = self._robot.get_proximity()
-        self.broadcast(Signal("Proximity", self.get_name(), self._robot.get_name(),
-                              proximity))
-    def _update_psd(self):
-        psd = self._robot.get_psd()
-        self.broadcast(Signal("PSD", self.get_name(), self._robot.get_name(), psd))
+    def _update_floor(self, floor):
+        self._publish(Signal("Floor", self.get_name(), self._robot.get_name(), floor),
+                      self._clock.time())
+    def _update_proximity(self, proximity):
+        self._publish(Signal("Proximity", self.get_name(), self._robot.get_name(),
+                             proximity), self._clock.time())
+    def _update_psd(self, psd):
+        self._publish(Signal("PSD", self.get_name(), self._robot.get_name(), psd),
+                      self._clock.time())
 
 class FilteringMonitor(Monitor):
     """A Monitor that updates low-pass filtered sensor values.
     Always collects and filters sensor data.
+    The median filters of all sensor channels are kept in a FilterBank and advanced
+    together once per update. Monitors of many robots may share one FilterBank by
+    passing the same filter_bank.
     """
-    def __init__(self, name, robot, update_interval=0.1):
-        super(FilteringMonitor, self).__init__(name, robot, update_interval, False)
-        self._floor_left_filter = moving_average(_FLOOR_FILTER_WINDOW, median)
-        self._floor_right_filter = moving_average(_FLOOR_FILTER_WINDOW, median)
-        self._proximity_left_filter = moving_average(_PROXIMITY_FILTER_WINDOW, median)
-        self._proximity_right_filter = moving_average(_PROXIMITY_FILTER_WINDOW, median)
-        self._psd_filter = moving_average(_PSD_FILTER_WINDOW, median)
+    def __init__(self, name, robot, update_interval=0.1, clock=None, filter_bank=None,
+                 event_driven=False):
+        super(FilteringMonitor, self).__init__(name, robot, update_interval, False, clock,
+                                               event_driven)
+        self._filter_bank = FilterBank() if filter_bank is None else filter_bank
+        channels = self._filter_bank.add_channels((_FLOOR_FILTER_WINDOW, _FLOOR_FILTER_WINDOW,
+                                                   _PROXIMITY_FILTER_WINDOW,
+                                                   _PROXIMITY_FILTER_WINDOW,
+                                                   _PSD_FILTER_WINDOW))
+        self._sensor_channels = channels[:4]
+        self._psd_channel = channels[4]
 
-    # Implementation of parent abstract methods
-    def _react_servo_post(self):
-        self._psd_filter.send(None)
-    def _update_floor(self):
-        floor = self._robot.get_floor()
-        floor_filtered = (self._floor_left_filter.send(floor[0]),
-                          self._floor_right_filter.send(floor[1]))
-        for value in floor_filtered:
+    # Extending parent functions in Monitor
+    def _update_sensors(self, snapshot, update_psd):
+        channels = list(self._sensor_channels)
+        values = list(snapshot.Floor) + list(snapshot.Proximity)
+        if update_psd:
+            channels.append(self._psd_channel)
+            values.append(snapshot.PSD)
+        filtered = self._filter_bank.update(values, channels)
+        self.__publish_filtered("Floor", tuple(filtered[0:2]))
+        self.__publish_filtered("Proximity", tuple(filtered[2:4]))
+        if update_psd and filtered[4] is not None:
+            self._publish(Signal("PSD", self.get_name(), self._robot.get_name(), filtered[4]),
+                          self._clock.time())
+    def __publish_filtered(self, signal_name, filtered):
+        for value in filtered:
             if value is None:
                 return
-        self.broadcast(Signal("Floor", self.get_name(), self._robot.get_name(),
-                              floor_filtered))
-    def _update_proximity(self):
-        proximity = self._robot.get_proximity()
-        proximity_filtered = (self._proximity_left_filter.send(proximity[0]),
-                              self._proximity_right_filter.send(proximity[1]))
-        for value in proximity_filtered:
-            if value is None:
-                return
-        self.broadcast(Signal("Proximity", self.get_name(), self._robot.get_name(),
-                              proximity_filtered))
-    def _update_psd(self):
-        psd = self._robot.get_psd()
-        psd_filtered = self._psd_filter.send(psd)
-        if psd_filtered is None:
-            return
-        self.broadcast(Signal("PSD", self.get_name(), self._robot.get_name(),
-                              psd_filtered))
+        self._publish(Signal(signal_name, self.get_name(), self._robot.get_name(), filtered),
+                      self._clock.time())
+
+    # Implementation of parent abstract methods
+    def _react_servo_post(self):
+        self._filter_bank.reset([self._psd_channel])
 
-class VirtualMonitor(Reactor, Broadcaster):
+class VirtualMonitor(Reactor, DeadbandBroadcaster):
     """A Monitor that uses data from the virtual world to simulate sensor data.
 
     Signals Sent:
-        Sends the same Signals as the Monitor class.
+        Sends the same Signals as the Monitor class, according to the deadbands set with
+        set_deadband. Keep-alive intervals are timed with clock, a RealClock by default.
 
     Signals Received:
         Receives the same signals as the Monitor class, plus the following Signals.
@@ -177,13 +343,17 @@ class VirtualMonitor(Reactor, Broadcaster):
         ScannerPose: Data should be the Pose of the robot's Scanner, relative to the
         robot's frame.
         Triggers an update of all sensor data.
+        Pose and ScannerPose Signals are conflated.
     """
-    def __init__(self, name, robot, virtual_world):
+    def __init__(self, name, robot, virtual_world, clock=None):
         super(VirtualMonitor, self).__init__(name)
         self._world = virtual_world
+        self._clock = RealClock() if clock is None else clock
         robot.get_virtual().register("Pose", self)
         robot.get_virtual().register("ScannerPose", self)
         robot.get_virtual().register("ResetPose", self)
+        self.conflate("Pose")
+        self.conflate("ScannerPose")
         self._robot = robot
         self._robot_pose = robot.get_virtual().get_pose()
         self._scanner_pose = robot.get_virtual().get_scanner().get_pose()
@@ -204,6 +374,7 @@ class VirtualMonitor(Reactor, Broadcaster):
             self._update_psd()
         elif signal.Name == "Servo":
             self._robot.servo(signal.Data)
+            self._reset_published("PSD")
             self._react_servo_post()
     def _update_floor(self):
         matrix = transformation(self._robot_pose)
@@ -211,8 +382,8 @@ class VirtualMonitor(Reactor, Broadcaster):
         sensor_coords = transform_all(matrix, virtual.get_floor_centers())
         floor_left = self._world.get_floor_color(sensor_coords[0])
         floor_right = self._world.get_floor_color(sensor_coords[1])
-        self.broadcast(Signal("Floor", self.get_name(), self._robot.get_name(),
-                              (floor_left, floor_right)))
+        self._publish(Signal("Floor", self.get_name(), self._robot.get_name(),
+                             (floor_left, floor_right)), self._clock.time())
     def _update_proximity(self):
         world = self._world
         matrix = transformation(self._robot_pose)
@@ -229,8 +400,8 @@ class VirtualMonitor(Reactor, Broadcaster):
             prox_right = robot.to_prox_ir(prox_dist_right[0])
         except TypeError:
             prox_right = None
-        self.broadcast(Signal("Proximity", self.get_name(), robot.get_name(),
-                              (prox_left, prox_right)))
+        self._publish(Signal("Proximity", self.get_name(), robot.get_name(),
+                             (prox_left, prox_right)), self._clock.time())
     def _update_psd(self):
         world = self._world
         matrix = compose(transformation(self._robot_pose), transformation(self._scanner_pose))
@@ -242,7 +413,7 @@ class VirtualMonitor(Reactor, Broadcaster):
             psd = robot.to_psd_ir(psd_dist[0])
         except TypeError:
             psd = None
-        self.broadcast(Signal("PSD", self.get_name(), robot.get_name(), psd))
+        self._publish(Signal("PSD", self.get_name(), robot.get_name(), psd), self._clock.time())
 
     # Abstract methods
     def _react_servo_post(self):
@@ -0,0 +1,194 @@
+"""Spatial indexing of UniqueRectangles for fast queries in large worlds."""
+from collections import defaultdict
+import heapq
+import math
+
+from components.geometry import vector_to_tuple
+
+class UniformGrid(object):
+    """Indexes UniqueRectangles by the square grid cells their bounding boxes overlap.
+    Supports ray queries by traversing the grid cells along the ray, point containment
+    queries, and k-nearest queries. Rectangles which move must be updated in the index.
+    """
+    def __init__(self, cell_size=10):
+        super(UniformGrid, self).__init__()
+        self.__cell_size = float(cell_size)
+        self.__cells = defaultdict(set)
+        self.__rectangles = {}
+        self.__rectangle_cells = {}
+        self.__order = {}
+        self.__next_order = 0
+        self.__cell_bounds = None
+
+    def get_cell_size(self):
+        """Returns the side length of each grid cell."""
+        return self.__cell_size
+    def __len__(self):
+        return len(self.__rectangles)
+
+    # Index maintenance
+    def add(self, rectangle):
+        """Adds a UniqueRectangle to the index, or updates it if it is already indexed."""
+        rectangle_id = rectangle.get_id()
+        if rectangle_id in self.__rectangles:
+            self.__remove_cells(rectangle_id)
+        else:
+            self.__order[rectangle_id] = self.__next_order
+            self.__next_order += 1
+        self.__rectangles[rectangle_id] = rectangle
+        corners = [vector_to_tuple(corner) for corner in rectangle.get_transformed_corners()]
+        (x_coords, y_coords) = zip(*corners)
+        (min_x, min_y) = self.__to_cell(min(x_coords), min(y_coords))
+        (max_x, max_y) = self.__to_cell(max(x_coords), max(y_coords))
+        cells = [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+        for cell in cells:
+            self.__cells[cell].add(rectangle_id)
+        self.__rectangle_cells[rectangle_id] = cells
+        self.__cell_bounds = None
+    def update(self, rectangle):
+        """Re-indexes a UniqueRectangle after it has moved."""
+        self.add(rectangle)
+    def remove(self, rectangle_id):
+        """Removes the UniqueRectangle with the specified id from the index.
+
+        Exceptions:
+            KeyError: no UniqueRectangle with the specified id is in the index.
+        """
+        self.__remove_cells(rectangle_id)
+        del self.__rectangles[rectangle_id]
+        del self.__order[rectangle_id]
+        self.__cell_bounds = None
+    def __remove_cells(self, rectangle_id):
+        for cell in self.__rectangle_cells.pop(rectangle_id):
+            members = self.__cells[cell]
+            members.discard(rectangle_id)
+            if not members:
+                del self.__cells[cell]
+    def __to_cell(self, x, y):
+        return (int(math.floor(x / self.__cell_size)), int(math.floor(y / self.__cell_size)))
+    def __get_cell_bounds(self):
+        """Returns the min x, min y, max x, and max y indices of all occupied cells."""
+        if self.__cell_bounds is None and self.__cells:
+            (x_indices, y_indices) = zip(*self.__cells.keys())
+            self.__cell_bounds = (min(x_indices), min(y_indices),
+                                  max(x_indices), max(y_indices))
+        return self.__cell_bounds
+    def __in_order(self, rectangle_ids):
+        return sorted(rectangle_ids, key=self.__order.__getitem__)
+
+    # Queries
+    def rectangles_at(self, coords):
+        """Returns a list of the UniqueRectangles containing the point.
+        The point should be given as a column vector. UniqueRectangles are returned in
+        the order they were first added to the index.
+        """
+        (x, y) = vector_to_tuple(coords)
+        cell = self.__to_cell(x, y)
+        if cell not in self.__cells:
+            return []
+        return [self.__rectangles[rectangle_id]
+                for rectangle_id in self.__in_order(self.__cells[cell])
+                if self.__rectangles[rectangle_id].in_rectangle(coords)]
+    def ray_distance_to(self, coords, angle):
+        """Determines the first UniqueRectangle hit by the specified ray.
+        Only tests the UniqueRectangles in the cells the ray passes through, and stops
+        traversing the grid once no further cell can contain a nearer intersection.
+
+        Arguments:
+            coords: the origin of the ray, as a column vector.
+            angle: the direction of the ray, in radians.
+
+        Return:
+            Returns the same values as the geometry.ray_distance_to function.
+        """
+        cell_bounds = self.__get_cell_bounds()
+        if cell_bounds is None:
+            return None
+        (x, y) = vector_to_tuple(coords)
+        (direction_x, direction_y) = (math.cos(angle), math.sin(angle))
+        (cell_x, cell_y) = self.__to_cell(x, y)
+        (step_x, next_x, delta_x) = self.__traversal_params(x, cell_x, direction_x)
+        (step_y, next_y, delta_y) = self.__traversal_params(y, cell_y, direction_y)
+        tested = set()
+        nearest = None
+        while not ((cell_x < cell_bounds[0] and step_x <= 0)
+                   or (cell_x > cell_bounds[2] and step_x >= 0)
+                   or (cell_y < cell_bounds[1] and step_y <= 0)
+                   or (cell_y > cell_bounds[3] and step_y >= 0)):
+            candidates = self.__cells.get((cell_x, cell_y), ())
+            for rectangle_id in self.__in_order(candidates):
+                if rectangle_id in tested:
+                    continue
+                tested.add(rectangle_id)
+                (distance, side_name) = self.__rectangles[rectangle_id].ray_distance_to(coords,
+                                                                                       angle)
+                if distance is not None and (nearest is None or distance < nearest[0]):
+                    nearest = (distance, side_name, rectangle_id)
+            exit_distance = min(next_x, next_y)
+            if nearest is not None and nearest[0] <= exit_distance:
+                break
+            if next_x < next_y:
+                cell_x += step_x
+                next_x += delta_x
+            else:
+                cell_y += step_y
+                next_y += delta_y
+        return nearest
+    def __traversal_params(self, coord, cell, direction):
+        """Returns the step, distance to the next cell boundary, and distance between
+        cell boundaries along the ray for one axis of grid traversal."""
+        if direction > 0:
+            return (1, ((cell + 1) * self.__cell_size - coord) / direction,
+                    self.__cell_size / direction)
+        elif direction < 0:
+            return (-1, (cell * self.__cell_size - coord) / direction,
+                    -self.__cell_size / direction)
+        else:
+            return (0, float("inf"), float("inf"))
+    def nearest(self, point, k=1):
+        """Finds the k UniqueRectangles nearest to the point.
+        Searches rings of grid cells outwards from the point's cell until no unsearched
+        cell can contain a nearer UniqueRectangle.
+
+        Arguments:
+            point: a column vector.
+            k: the number of UniqueRectangles to find.
+
+        Return:
+            A list of up to k 2-tuples of the distance between the point and the nearest
+            point of the UniqueRectangle (0 if the point is inside it) and the id of the
+            UniqueRectangle, sorted by increasing distance.
+        """
+        cell_bounds = self.__get_cell_bounds()
+        if cell_bounds is None or k < 1:
+            return []
+        (x, y) = vector_to_tuple(point)
+        (cell_x, cell_y) = self.__to_cell(x, y)
+        max_ring = max(cell_x - cell_bounds[0], cell_bounds[2] - cell_x,
+                       cell_y - cell_bounds[1], cell_bounds[3] - cell_y)
+        tested = set()
+        found = []
+        for ring in range(0, max_ring + 1):
+            for cell in self.__ring_cells(cell_x, cell_y, ring):
+                for rectangle_id in self.__cells.get(cell, ()):
+                    if rectangle_id in tested:
+                        continue
+                    tested.add(rectangle_id)
+                    found.append((self.__rectangles[rectangle_id].boundary_distance_to(point),
+                                  rectangle_id))
+            if len(found) >= k:
+                nearest = heapq.nsmallest(k, found, key=self.__found_key)
+                if nearest[-1][0] <= ring * self.__cell_size:
+                    return nearest
+        return heapq.nsmallest(k, found, key=self.__found_key)
+    def __found_key(self, found):
+        return (found[0], self.__order[found[1]])
+    def __ring_cells(self, cell_x, cell_y, ring):
+        """Returns the cells on the square ring at the specified index distance."""
+        if ring == 0:
+            return [(cell_x, cell_y)]
+        cells = [(x, y) for x in range(cell_x - ring, cell_x + ring + 1)
+                 for y in (cell_y - ring, cell_y + ring)]
+        cells.extend((x, y) for x in (cell_x - ring, cell_x + ring)
+                     for y in range(cell_y - ring + 1, cell_y + ring))
+        return cells
@@ -1,7 +1,9 @@
 """Utility functions/classes."""
 from collections import deque
 from struct import pack
+from bisect import bisect_left, insort
 from itertools import ifilter
+from threading import Lock
 
 import numpy as np
 
@@ -109,3 +111,184 @@ def moving_average(max_samples, averager=unweighted_mean):
             else:
                 average = None
 
+@initialized_coroutine
+def moving_quantile(max_samples, quantile=0.5):
+    """A generator to compute a quantile of a signal over a sliding window.
+    Keeps the window in sorted order, so each sample costs a binary search and a
+    single insertion and removal rather than a full sort of the window.
+    Initialized and used in the same way as moving_average.
+
+    Arguments:
+        max_samples: the window size over which to compute the quantile.
+        quantile: a number between 0 and 1 of the quantile to compute; linearly
+        interpolates between samples in the same way as numpy.percentile.
+
+    Sending:
+        Send values into moving_quantile to add them to the signal. Values must be
+        mutually comparable and must not be NaN.
+        Send None into moving_quantile to reset the signal.
+
+    Yielding:
+        None: if the filter has not yet collected max_samples samples.
+        Otherwise, the quantile of the max_samples most recent samples.
+    """
+    signal = deque()
+    ordered = []
+    position = quantile * (max_samples - 1)
+    lower = int(position)
+    upper = min(lower + 1, max_samples - 1)
+    fraction = position - lower
+    result = None
+    while True:
+        value = yield result
+        if value is None:
+            signal.clear()
+            del ordered[:]
+            result = None
+            continue
+        if len(signal) == max_samples:
+            del ordered[bisect_left(ordered, signal.popleft())]
+        signal.append(value)
+        insort(ordered, value)
+        if len(signal) < max_samples:
+            result = None
+        elif fraction == 0.5:
+            result = (ordered[lower] + ordered[upper]) / 2.0
+        else:
+            result = ordered[lower] + (ordered[upper] - ordered[lower]) * fraction
+def moving_median(max_samples):
+    """A generator to compute the moving median of a signal.
+    Equivalent to moving_average(max_samples, numpy.median), but updated incrementally.
+    """
+    return moving_quantile(max_samples, 0.5)
+
+@initialized_coroutine
+def moving_mean(max_samples):
+    """A generator to compute the moving unweighted mean of a signal.
+    Equivalent to moving_average(max_samples), but keeps a running sum of the window.
+    The sum is recomputed from the window once per max_samples samples, so rounding
+    errors from float samples cannot accumulate.
+    Initialized and used in the same way as moving_average.
+    """
+    signal = deque()
+    total = 0
+    num_updates = 0
+    mean = None
+    while True:
+        value = yield mean
+        if value is None:
+            signal.clear()
+            total = 0
+            num_updates = 0
+            mean = None
+            continue
+        if len(signal) == max_samples:
+            total -= signal.popleft()
+        signal.append(value)
+        total += value
+        num_updates += 1
+        if num_updates == max_samples:
+            total = sum(signal)
+            num_updates = 0
+        if len(signal) < max_samples:
+            mean = None
+        else:
+            mean = total / float(max_samples)
+
+class FilterBank(object):
+    """A bank of moving quantile filters over many signal channels.
+    Keeps the windows of all channels in one 2D ring buffer of channels x samples, so
+    that any set of channels can be updated and filtered with a few array operations
+    instead of advancing one coroutine per channel. Channels may have different window
+    sizes; the unused samples of shorter windows are kept as NaN.
+    Each channel behaves like a moving_quantile with the same window size and quantile.
+    Thread-safe, so that one bank can be shared by the Monitors of many robots.
+    """
+    def __init__(self, window_sizes=(), quantile=0.5):
+        self.__lock = Lock()
+        self.__quantile = quantile
+        self.__window_sizes = np.zeros(0, dtype=int)
+        self.__samples = np.empty((0, 0))
+        self.__heads = np.zeros(0, dtype=int)
+        self.__counts = np.zeros(0, dtype=int)
+        self.__lower = np.zeros(0, dtype=int)
+        self.__upper = np.zeros(0, dtype=int)
+        self.__fractions = np.zeros(0)
+        if window_sizes:
+            self.add_channels(window_sizes)
+
+    def __len__(self):
+        return len(self.__window_sizes)
+    def add_channels(self, window_sizes):
+        """Adds channels with the specified window sizes to the bank.
+        Returns a list of the indices of the new channels.
+        """
+        with self.__lock:
+            num_channels = len(self.__window_sizes)
+            window_sizes = np.concatenate((self.__window_sizes,
+                                           np.asarray(window_sizes, dtype=int)))
+            samples = np.full((len(window_sizes), window_sizes.max()), np.nan)
+            samples[:num_channels, :self.__samples.shape[1]] = self.__samples
+            self.__samples = samples
+            self.__window_sizes = window_sizes
+            padding = np.zeros(len(window_sizes) - num_channels, dtype=int)
+            self.__heads = np.concatenate((self.__heads, padding))
+            self.__counts = np.concatenate((self.__counts, padding))
+            positions = self.__quantile * (window_sizes - 1)
+            self.__lower = positions.astype(int)
+            self.__upper = np.minimum(self.__lower + 1, window_sizes - 1)
+            self.__fractions = positions - self.__lower
+            return range(num_channels, len(window_sizes))
+    def reset(self, channels=None):
+        """Resets the specified channels, or all channels if channels is None.
+        Equivalent to sending None into a moving_quantile.
+        """
+        with self.__lock:
+            if channels is None:
+                channels = slice(None)
+            self.__samples[channels] = np.nan
+            self.__heads[channels] = 0
+            self.__counts[channels] = 0
+    def update(self, values, channels=None):
+        """Adds one sample to each of the specified channels and filters them.
+
+        Arguments:
+            values: a sequence of the new sample of each channel. A value of None
+            resets its channel.
+            channels: a sequence of the indices of the channels to update, in the same
+            order as values. If None, updates all channels.
+
+        Return:
+            A list of the filtered value of each specified channel, which is None if the
+            channel has not yet collected a full window of samples.
+        """
+        if channels is None:
+            channels = range(len(self))
+        if None in values:
+            filtered = [None] * len(channels)
+            self.reset([channel for (channel, value) in zip(channels, values)
+                        if value is None])
+            updated = [index for (index, value) in enumerate(values) if value is not None]
+            if updated:
+                updated_filtered = self.update([values[index] for index in updated],
+                                               [channels[index] for index in updated])
+                for (index, value) in zip(updated, updated_filtered):
+                    filtered[index] = value
+            return filtered
+        channels = np.asarray(channels, dtype=int)
+        rows = np.arange(len(channels))
+        with self.__lock:
+            heads = self.__heads[channels]
+            window_sizes = self.__window_sizes[channels]
+            self.__samples[channels, heads] = values
+            self.__heads[channels] = (heads + 1) % window_sizes
+            counts = np.minimum(self.__counts[channels] + 1, window_sizes)
+            self.__counts[channels] = counts
+            ordered = np.sort(self.__samples[channels], axis=1)
+            lower = ordered[rows, self.__lower[channels]]
+            upper = ordered[rows, self.__upper[channels]]
+            fractions = self.__fractions[channels]
+        quantiles = np.where(fractions == 0.5, (lower + upper) / 2.0,
+                             lower + (upper - lower) * fractions)
+        return [quantile if full else None for (quantile, full)
+                in zip(quantiles.tolist(), (counts == window_sizes).tolist())]
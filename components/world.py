@@ -2,15 +2,17 @@
 from collections import defaultdict
 from itertools import chain
 
-from components.util import rgb_to_hex, clip, between, iter_first_not_none, min_first
-from components.messaging import Signal, Broadcaster
+from components.util import rgb_to_hex, clip, between, min_first
+from components.messaging import Signal, Broadcaster, reacts_to
 from components.concurrency import Reactor
 from components.geometry import Pose, Frame, MobileFrame, Rectangle
 from components.geometry import to_vector, vector_to_tuple, vectors_to_flat
 from components.geometry import to_angle, direction_vector
 from components.geometry import transformation, compose
 from components.geometry import transform, transform_x, transform_y, transform_all, rotate_pose
-from components.geometry import ray_distance_to, segment_transformation, line_intersection
+from components.geometry import transform_points, points_to_flat
+from components.geometry import RayCaster, segment_transformation, line_intersection
+from components.spatial import UniformGrid
 
 _FLOOR_WHITE = 90
 
@@ -35,8 +37,13 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         the name of the side of the rectangle to localize to ("North", "South", "East", or "West").
         If the rectangle id is None, will guess the rectangle. If the name of the side is
         None, will guess the side.
+        Pose, ScannerPose, Floor, Proximity, and PSD Signals are conflated per robot.
+
+    If a grid cell size is given, Walls, Borders, and Packages are also indexed in
+    UniformGrids, which are used for virtual sensing and localization in place of
+    linear scans over all of them. This is worthwhile for worlds with many objects.
     """
-    def __init__(self, name, world_bounds, canvas, scale=20):
+    def __init__(self, name, world_bounds, canvas, scale=20, grid_cell_size=None):
         super(VirtualWorld, self).__init__(name)
         self.__bounds = world_bounds
         self._canvas = canvas
@@ -68,6 +75,17 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
             "proximityRight": defaultdict(lambda: None),
             "psd": defaultdict(lambda: None)
         }
+        self._ray_casters = {}
+        for signal_name in ("Pose", "ScannerPose", "Floor", "Proximity", "PSD"):
+            self.conflate(signal_name)
+        if grid_cell_size is None:
+            self._spatial_indices = None
+        else:
+            self._spatial_indices = {
+                "wall": UniformGrid(grid_cell_size),
+                "border": UniformGrid(grid_cell_size),
+                "package": UniformGrid(grid_cell_size)
+            }
 
     # Utility for subclasses
     # Grid
@@ -149,71 +167,71 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         pose = self._sensors["pose"][robot_name]
         virtual_robot = self._robots[robot_name].get_virtual()
         matrix = compose(self.get_transformation(), transformation(pose))
-        transformed = transform_all(matrix, virtual_robot.get_corners())
-        self.broadcast(Signal("UpdateCoords", self.get_name(), robot_name,
+        signals = []
+        transformed = transform_points(matrix, virtual_robot.get_corner_points())
+        signals.append(Signal("UpdateCoords", self.get_name(), robot_name,
                               (self._primitives["robotChassis"][robot_name],
-                               vectors_to_flat(transformed))))
-        transformed = transform_all(matrix, virtual_robot.get_left_floor_corners())
-        self.broadcast(Signal("UpdateCoords", self.get_name(), robot_name,
+                               points_to_flat(transformed))))
+        transformed = transform_points(matrix, virtual_robot.get_left_floor_corner_points())
+        signals.append(Signal("UpdateCoords", self.get_name(), robot_name,
                               (self._primitives["robotFloorLeft"][robot_name],
-                               vectors_to_flat(transformed))))
-        transformed = transform_all(matrix, virtual_robot.get_right_floor_corners())
-        self.broadcast(Signal("UpdateCoords", self.get_name(), robot_name,
+                               points_to_flat(transformed))))
+        transformed = transform_points(matrix, virtual_robot.get_right_floor_corner_points())
+        signals.append(Signal("UpdateCoords", self.get_name(), robot_name,
                               (self._primitives["robotFloorRight"][robot_name],
-                               vectors_to_flat(transformed))))
-        self.__update_proximity(robot_name)
+                               points_to_flat(transformed))))
+        signals.extend(self.__get_proximity_updates(robot_name, matrix))
         try:
-            self.__update_psd(robot_name)
+            signals.extend(self.__get_psd_updates(robot_name, matrix))
         except KeyError:
             pass
+        self.broadcast_many(signals)
     def __update_floor(self, robot_name, floor_left, floor_right):
         robot = self._robots[robot_name]
         left_rescaled = robot.to_relative_whiteness(floor_left)
         left_hex = rgb_to_hex(left_rescaled, left_rescaled, left_rescaled)
-        self.broadcast(Signal("UpdateConfig", self.get_name(), robot_name,
-                              (self._primitives["robotFloorLeft"][robot_name],
-                               {"fill": left_hex, "outline": left_hex})))
         right_rescaled = robot.to_relative_whiteness(floor_right)
         right_hex = rgb_to_hex(right_rescaled, right_rescaled, right_rescaled)
-        self.broadcast(Signal("UpdateConfig", self.get_name(), robot_name,
-                              (self._primitives["robotFloorRight"][robot_name],
-                               {"fill": right_hex, "outline": right_hex})))
+        self.broadcast_many([
+            Signal("UpdateConfig", self.get_name(), robot_name,
+                   (self._primitives["robotFloorLeft"][robot_name],
+                    {"fill": left_hex, "outline": left_hex})),
+            Signal("UpdateConfig", self.get_name(), robot_name,
+                   (self._primitives["robotFloorRight"][robot_name],
+                    {"fill": right_hex, "outline": right_hex}))
+        ])
     def __update_proximity(self, robot_name):
+        self.broadcast_many(self.__get_proximity_updates(robot_name))
+    def __get_proximity_updates(self, robot_name, matrix=None):
+        """Returns a list of the UpdateCoords Signals for the proximity beams."""
         robot = self._robots[robot_name]
         virtual_robot = robot.get_virtual()
         distances = (robot.to_prox_distance(self._sensors["proximityLeft"][robot_name]),
                      robot.to_prox_distance(self._sensors["proximityRight"][robot_name]))
-        sensor_coords = virtual_robot.get_proximity_coords()
-        obstacle_coords = list(virtual_robot.get_proximity_distance_coords(*distances))
-        matrix = compose(self.get_transformation(),
-                         transformation(self._sensors["pose"][robot_name]))
-        if obstacle_coords[0] is None:
-            obstacle_coords[0] = sensor_coords[0]
-        if obstacle_coords[1] is None:
-            obstacle_coords[1] = sensor_coords[1]
-        beam_coords = ((sensor_coords[0], obstacle_coords[0]),
-                       (sensor_coords[1], obstacle_coords[1]))
-        self.broadcast(Signal("UpdateCoords", self.get_name(), robot_name,
-                              (self._primitives["robotProximityLeft"][robot_name],
-                               vectors_to_flat(transform_all(matrix, beam_coords[0])))))
-        self.broadcast(Signal("UpdateCoords", self.get_name(), robot_name,
-                              (self._primitives["robotProximityRight"][robot_name],
-                               vectors_to_flat(transform_all(matrix, beam_coords[1])))))
+        if matrix is None:
+            matrix = compose(self.get_transformation(),
+                             transformation(self._sensors["pose"][robot_name]))
+        transformed = points_to_flat(
+            transform_points(matrix, virtual_robot.get_proximity_beam_points(*distances)))
+        return [Signal("UpdateCoords", self.get_name(), robot_name,
+                       (self._primitives["robotProximityLeft"][robot_name], transformed[0:4])),
+                Signal("UpdateCoords", self.get_name(), robot_name,
+                       (self._primitives["robotProximityRight"][robot_name], transformed[4:8]))]
     def __update_psd(self, robot_name):
+        self.broadcast_many(self.__get_psd_updates(robot_name))
+    def __get_psd_updates(self, robot_name, matrix=None):
+        """Returns a list of the UpdateCoords Signal for the PSD beam."""
         robot = self._robots[robot_name]
-        virtual_robot = robot.get_virtual()
+        scanner = robot.get_virtual().get_scanner()
         distance = robot.to_psd_distance(self._sensors["psd"][robot_name])
-        sensor_coords = virtual_robot.get_scanner().get_psd_coords()
-        obstacle_coords = virtual_robot.get_scanner().get_psd_distance_coords(distance)
-        if obstacle_coords is None:
-            obstacle_coords = sensor_coords[1]
-        beam_coords = (sensor_coords[0], obstacle_coords)
-        matrix = compose(self.get_transformation(),
-                         compose(transformation(self._sensors["pose"][robot_name]),
-                                 transformation(self._sensors["scannerPose"][robot_name])))
-        self.broadcast(Signal("UpdateCoords", self.get_name(), robot_name,
-                              (self._primitives["robotPSD"][robot_name],
-                               vectors_to_flat(transform_all(matrix, beam_coords)))))
+        if matrix is None:
+            matrix = compose(self.get_transformation(),
+                             transformation(self._sensors["pose"][robot_name]))
+        matrix = compose(matrix, transformation(self._sensors["scannerPose"][robot_name]))
+        return [Signal("UpdateCoords", self.get_name(), robot_name,
+                       (self._primitives["robotPSD"][robot_name],
+                        points_to_flat(transform_points(
+                            matrix, scanner.get_psd_beam_points(distance)))))]
     # Walls
     def add_wall(self, wall):
         """Adds a wall.
@@ -222,6 +240,9 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
             wall: a Wall.
         """
         self._objects["wall"][wall.get_id()] = wall
+        self._ray_casters = {}
+        if self._spatial_indices is not None:
+            self._spatial_indices["wall"].add(wall)
         self.__draw_wall(wall)
     def __draw_wall(self, wall):
         wall_id = wall.get_id()
@@ -238,6 +259,8 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
             border: a Border.
         """
         self._objects["border"][border.get_id()] = border
+        if self._spatial_indices is not None:
+            self._spatial_indices["border"].add(border)
         self.__draw_border(border)
     def __draw_border(self, border):
         border_id = border.get_id()
@@ -257,6 +280,9 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         """
         package.register("ResetPose", self)
         self._objects["package"][package.get_id()] = package
+        self._ray_casters = {}
+        if self._spatial_indices is not None:
+            self._spatial_indices["package"].add(package)
         self.__draw_package(package)
     def __draw_package(self, package):
         package_id = package.get_id()
@@ -267,13 +293,18 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         self._primitives["packageLabel"][package_id] = package_label
     def __update_package(self, package_id, pose):
         package = self._objects["package"][package_id]
+        self._ray_casters = {}
+        if self._spatial_indices is not None:
+            self._spatial_indices["package"].update(package)
         matrix = compose(self.get_transformation(), transformation(pose))
         transformed = vectors_to_flat(transform_all(matrix, package.get_corners()))
-        self.broadcast(Signal("UpdateCoords", self.get_name(), package_id,
-                              (self._primitives["package"][package_id], transformed)))
-        self.broadcast(Signal("UpdateCoords", self.get_name(), package_id,
-                              (self._primitives["packageLabel"][package_id],
-                               vector_to_tuple(transform(matrix, to_vector(0, 0))))))
+        self.broadcast_many([
+            Signal("UpdateCoords", self.get_name(), package_id,
+                   (self._primitives["package"][package_id], transformed)),
+            Signal("UpdateCoords", self.get_name(), package_id,
+                   (self._primitives["packageLabel"][package_id],
+                    vector_to_tuple(transform(matrix, to_vector(0, 0)))))
+        ])
     # Support
     def __draw_rectangle(self, rectangle):
         matrix = compose(self.get_transformation(), rectangle.get_transformation())
@@ -290,6 +321,9 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
     def get_floor_color(self, coords):
         """Determines the floor color at the specified coords, given as a column vector.
         Color returned as a grayscale value between 0 and 255, inclusive."""
+        if self._spatial_indices is not None:
+            borders = self._spatial_indices["border"].rectangles_at(coords)
+            return borders[0].get_color() if borders else _FLOOR_WHITE
         for border in self._objects["border"].values():
             if border.in_rectangle(coords):
                 color = border.get_color()
@@ -305,8 +339,14 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         Returns a 3-tuple of the distance to the nearest Wall or Package, the name of the
         side of the Rectangle intersecting with the ray, and the id of that Rectangle.
         """
-        all_rectangles = self._objects["wall"].values() + self._objects["package"].values()
-        return ray_distance_to(all_rectangles, coords, angle)
+        if self._spatial_indices is not None:
+            distances = (self._spatial_indices["wall"].ray_distance_to(coords, angle),
+                         self._spatial_indices["package"].ray_distance_to(coords, angle))
+            try:
+                return min_first(distance for distance in distances if distance is not None)
+            except ValueError:
+                return None
+        return self.__get_ray_caster("proximity").ray_distance_to(coords, angle)
     def get_psd_distance(self, coords, angle):
         """Determines the distance to the nearest obstacle along the angle from the coords.
 
@@ -317,7 +357,22 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         Returns a 3-tuple of the distance to the nearest Wall intersecting with the ray, the name
         of the intersecting side of that Wall, and the id of that Wall.
         """
-        return ray_distance_to(self._objects["wall"].values(), coords, angle)
+        if self._spatial_indices is not None:
+            return self._spatial_indices["wall"].ray_distance_to(coords, angle)
+        return self.__get_ray_caster("psd").ray_distance_to(coords, angle)
+    def __get_ray_caster(self, sensor):
+        """Returns the RayCaster of the Rectangles visible to the sensor, building it if needed.
+        Any change to the Rectangles in the world discards all RayCasters.
+        """
+        ray_casters = self._ray_casters
+        if sensor not in ray_casters:
+            if sensor == "proximity":
+                rectangles = chain(self._objects["wall"].values(),
+                                   self._objects["package"].values())
+            else:
+                rectangles = self._objects["wall"].values()
+            ray_casters[sensor] = RayCaster(rectangles)
+        return ray_casters[sensor]
     # Localization
     def guess_rectangle(self, point, rect_type=None):
         """Guesses the nearest rectangle, and its nearest side, to the specified point.
@@ -329,17 +384,26 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
 
         Returns a 3-tuple of the distance to the nearest Rectangle of that type, the name of the
         nearest side of that Rectangle, and the id of that Rectangle.
+        The nearest Rectangle is the one with the nearest boundary point to the point, as found
+        by the spatial indices, if any; the distance is to the line of its nearest side.
         """
         if rect_type is None:
-            rects = chain(self._objects["wall"].items(), self._objects["package"].items())
+            rect_types = ("wall", "package")
         else:
-            rects = self._objects[rect_type].items()
-        rectangles = [rectangle.point_distance_to(point) + (rect_id, )
-                      for (rect_id, rectangle) in rects]
-        try:
-            return min_first(iter_first_not_none(rectangles))
-        except ValueError:
+            rect_types = (rect_type,)
+        if self._spatial_indices is not None:
+            candidates = [(distance, self._objects[index_type][rect_id])
+                          for index_type in rect_types
+                          for (distance, rect_id)
+                          in self._spatial_indices[index_type].nearest(point)]
+        else:
+            candidates = [(rectangle.boundary_distance_to(point), rectangle)
+                          for index_type in rect_types
+                          for rectangle in self._objects[index_type].values()]
+        if not candidates:
             return None
+        rectangle = min(candidates, key=lambda candidate: candidate[0])[1]
+        return rectangle.point_distance_to(point) + (rectangle.get_id(), )
     def localize_prox(self, robot_name, rectangle_id=None, rectangle_side=None):
         """Update the robot's position based on proximity sensor data.
         If rectangle_id is None, guesses the rectangle to localize against.
@@ -367,8 +431,7 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         if rect is None or rectangle_side is None:
             return
         # Make the adjustment
-        rect_matrix = rect.get_transformation()
-        side = transform_all(rect_matrix, rect.get_side(rectangle_side))
+        side = rect.get_transformed_side(rectangle_side)
         (_, angle, translation) = segment_transformation(prox_left, prox_right, *side)
         original = self._sensors["pose"][robot_name]
         rotated = rotate_pose(original, original.Coord, angle)
@@ -401,8 +464,7 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
         if rect is None or rectangle_side is None:
             return
         # Make the adjustment
-        rect_matrix = rect.get_transformation()
-        side = transform_all(rect_matrix, rect.get_side(rectangle_side))
+        side = rect.get_transformed_side(rectangle_side)
         intersection = line_intersection(point, direction_vector(angle),
                                          side[0], side[1] - side[0])
         if intersection is None or not between(0, 1, intersection[1]):
@@ -435,42 +497,84 @@ class VirtualWorld(Reactor, Broadcaster, Frame):
     # Implementation of parent abstract methods
     def _react(self, signal):
         if signal.Namespace in self._robots:
-            if signal.Name == "Pose" or signal.Name == "ResetPose" or signal.Name == "SetPose":
-                self._sensors["pose"][signal.Namespace] = signal.Data
-                self.__update_robot(signal.Namespace)
-            elif signal.Name == "ScannerPose":
-                self._sensors["scannerPose"][signal.Namespace] = signal.Data
-                try:
-                    self.__update_psd(signal.Namespace)
-                except KeyError:
-                    pass
-            elif signal.Name == "Floor":
-                self.__update_floor(signal.Namespace, *signal.Data)
-            elif signal.Name == "Proximity":
-                self._sensors["proximityLeft"][signal.Namespace] = signal.Data[0]
-                self._sensors["proximityRight"][signal.Namespace] = signal.Data[1]
-                try:
-                    self.__update_proximity(signal.Namespace)
-                except KeyError:
-                    pass
-            elif signal.Name == "PSD":
-                self._sensors["psd"][signal.Namespace] = signal.Data
-                try:
-                    self.__update_psd(signal.Namespace)
-                except KeyError:
-                    pass
-            elif signal.Name == "LocalizeProx":
-                self.localize_prox(signal.Namespace, signal.Data[0], signal.Data[1])
-            elif signal.Name == "LocalizePSD":
-                self.localize_psd(signal.Namespace, signal.Data[0], signal.Data[1])
+            self._dispatch(signal)
         elif signal.Sender == "Package" and signal.Namespace in self._objects["package"]:
             if signal.Name == "ResetPose" or signal.Name == "SetPose":
                 self.__update_package(signal.Namespace, signal.Data)
+
+    # Robot Signal handlers
+    @reacts_to("Pose", "ResetPose", "SetPose")
+    def __react_pose(self, signal):
+        self._sensors["pose"][signal.Namespace] = signal.Data
+        self.__update_robot(signal.Namespace)
+    @reacts_to("ScannerPose")
+    def __react_scanner_pose(self, signal):
+        self._sensors["scannerPose"][signal.Namespace] = signal.Data
+        try:
+            self.__update_psd(signal.Namespace)
+        except KeyError:
+            pass
+    @reacts_to("Floor")
+    def __react_floor(self, signal):
+        self.__update_floor(signal.Namespace, *signal.Data)
+    @reacts_to("Proximity")
+    def __react_proximity(self, signal):
+        self._sensors["proximityLeft"][signal.Namespace] = signal.Data[0]
+        self._sensors["proximityRight"][signal.Namespace] = signal.Data[1]
+        try:
+            self.__update_proximity(signal.Namespace)
+        except KeyError:
+            pass
+    @reacts_to("PSD")
+    def __react_psd(self, signal):
+        self._sensors["psd"][signal.Namespace] = signal.Data
+        try:
+            self.__update_psd(signal.Namespace)
+        except KeyError:
+            pass
+    @reacts_to("LocalizeProx")
+    def __react_localize_prox(self, signal):
+        self.localize_prox(signal.Namespace, signal.Data[0], signal.Data[1])
+    @reacts_to("LocalizePSD")
+    def __react_localize_psd(self, signal):
+        self.localize_psd(signal.Namespace, signal.Data[0], signal.Data[1])
+
+    # Frame
     def get_pose(self):
         return Pose(to_vector(0, 0), 0)
     def _get_scaling(self):
         return (self.__scale, -self.__scale)
 
+class HeadlessCanvas(object):
+    """Stand-in for a Tkinter Canvas, so that a VirtualWorld can run without a GUI.
+    Methods which create canvas items return unique item ids; other methods do nothing.
+    """
+    def __init__(self):
+        super(HeadlessCanvas, self).__init__()
+        self.__num_items = 0
+
+    def __create_item(self):
+        self.__num_items += 1
+        return self.__num_items
+    def create_line(self, *args, **kwargs):
+        """Returns the id of a new line item."""
+        return self.__create_item()
+    def create_oval(self, *args, **kwargs):
+        """Returns the id of a new oval item."""
+        return self.__create_item()
+    def create_polygon(self, *args, **kwargs):
+        """Returns the id of a new polygon item."""
+        return self.__create_item()
+    def create_text(self, *args, **kwargs):
+        """Returns the id of a new text item."""
+        return self.__create_item()
+    def coords(self, *args, **kwargs):
+        """Ignores changes to the coords of an item."""
+        pass
+    def itemconfig(self, *args, **kwargs):
+        """Ignores changes to the config of an item."""
+        pass
+
 class UniqueRectangle(Rectangle):
     """Models a unique rectangle in the virtual world.
     Any UniqueRectangle in the virtual world has a unique id."""
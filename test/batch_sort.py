@@ -0,0 +1,286 @@
+"""Headless Monte Carlo runs of the box-sorting scenario of gui_sort.
+Each episode runs the DistributePlanner and DeliverPlanner against a virtual world in
+simulated time, with randomized start poses, miscalibrated speed multipliers, and noisy
+sensors, and episodes are run across a pool of processes. Reports the success rate,
+the completion time, and the final pose error of each robot, relative to an episode
+without any randomization.
+
+Run with `python -m test.batch_sort`. Use --save to record the results of every episode.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from collections import namedtuple
+
+import numpy as np
+
+from components.messaging import Signal, Broadcaster
+from components.geometry import Pose, to_vector, normalize_angle
+from components.concurrency import Reactor, EventLoop, SimulationClock
+from components.robots import Robot, VirtualRobot, Beeper, centroid_to_instant_center
+from components.sensors import VirtualMonitor
+from components.world import VirtualWorld, HeadlessCanvas
+from components.control import PrimitiveController
+from test.gui_sort import DistributePlanner, DeliverPlanner, populate_world
+from test.gui_sort import START_POSES, MOVE_MULTIPLIER, ROTATE_MULTIPLIER
+
+WORLD_BOUNDS = [-20, -20, 40, 20]
+OPERATOR_NAME = "GUISort" # the target of Finished commands which ask for another box
+
+# Episode describes the randomization and simulation settings of one episode.
+# StartPoses are centroid poses, and MoveErrors and RotateErrors are factors by which each
+# robot's actual speed multipliers differ from its calibrated ones. SensorNoise is the
+# standard deviation of the noise added to every sensor value. PoseTranslationThreshold and
+# PoseRotationThreshold are the minimum changes, in cm and radians, between Pose updates.
+Episode = namedtuple("Episode", ["Seed", "StartPoses", "MoveErrors", "RotateErrors",
+                                 "SensorNoise", "Step", "MaxTime", "PoseTranslationThreshold",
+                                 "PoseRotationThreshold"])
+# EpisodeResult summarizes an episode. CompletionTime is in simulated seconds, or None if
+# the planners did not finish within MaxTime, and FinalPoses are instant-center poses.
+EpisodeResult = namedtuple("EpisodeResult", ["Seed", "Finished", "CompletionTime",
+                                             "FinalPoses"])
+
+# Randomized components
+class MiscalibratedRobot(Robot):
+    """A purely virtual Robot whose actual speed differs from its calibrated speed by
+    constant factors, as if its speed multipliers were miscalibrated."""
+    def __init__(self, virtual_robot, move_error=1, rotate_error=1):
+        super(MiscalibratedRobot, self).__init__(None, virtual_robot)
+        self.__move_error = move_error
+        self.__rotate_error = rotate_error
+
+    def move(self, speed):
+        self._virtual.move(self.to_virtual_move_speed(speed) * self.__move_error)
+    def rotate(self, speed):
+        self._virtual.rotate(self.to_virtual_rotate_speed(speed) * self.__rotate_error)
+
+class NoisyVirtualMonitor(VirtualMonitor):
+    """A VirtualMonitor which adds Gaussian noise to its sensor values."""
+    def __init__(self, name, robot, virtual_world, noise, rng):
+        super(NoisyVirtualMonitor, self).__init__(name, robot, virtual_world)
+        self.__noise = noise
+        self.__rng = rng
+
+    def broadcast(self, signal):
+        if self.__noise and signal.Name in ("Floor", "Proximity"):
+            signal = signal._replace(Data=tuple(self.__add_noise(value)
+                                                for value in signal.Data))
+        elif self.__noise and signal.Name == "PSD":
+            signal = signal._replace(Data=self.__add_noise(signal.Data))
+        super(NoisyVirtualMonitor, self).broadcast(signal)
+    def __add_noise(self, value):
+        return None if value is None else value + self.__rng.gauss(0, self.__noise)
+
+class CompletionTracking(object):
+    """Mixin for a SimplePrimitivePlanner to record when its commands run out."""
+    def __init__(self, name, robot, monitor=None, clock=None):
+        self.completion_time = None
+        super(CompletionTracking, self).__init__(name, robot, monitor, clock)
+
+    def _generate_commands(self):
+        commands = super(CompletionTracking, self)._generate_commands()
+        value = yield next(commands)
+        while True:
+            command = commands.send(value)
+            if command is None and self.completion_time is None:
+                self.completion_time = self._clock.time()
+            value = yield command
+class TrackedDistributePlanner(CompletionTracking, DistributePlanner):
+    """A DistributePlanner which records when its commands run out."""
+    pass
+class TrackedDeliverPlanner(CompletionTracking, DeliverPlanner):
+    """A DeliverPlanner which records when its commands run out."""
+    pass
+
+class Operator(Reactor, Broadcaster):
+    """Stands in for the user of GUISort, who adds another box whenever asked."""
+    def __init__(self, name, robot_name):
+        super(Operator, self).__init__(name)
+        self.__robot_name = robot_name
+
+    def _react(self, signal):
+        if signal.Name == "Continue" and signal.Data == self.get_name():
+            self.broadcast(Signal("Continue", self.get_name(), self.__robot_name,
+                                  self.__robot_name))
+
+# Episodes
+def run_episode(episode):
+    """Runs an episode in simulated time and returns its EpisodeResult."""
+    rng = random.Random(episode.Seed)
+    clock = SimulationClock(episode.Step)
+    loop = EventLoop(clock=clock)
+    world = VirtualWorld("Virtual World", WORLD_BOUNDS, HeadlessCanvas(), 10)
+    populate_world(world)
+    operator = Operator(OPERATOR_NAME, "Robot 1")
+    threads = [world, operator]
+    robots = []
+    planners = []
+    for (index, planner_class) in enumerate((TrackedDistributePlanner, TrackedDeliverPlanner)):
+        virtual = VirtualRobot("Robot {}".format(index),
+                               pose=centroid_to_instant_center(episode.StartPoses[index]),
+                               servo_angle=(0.5 * np.pi), clock=clock)
+        virtual.set_pose_thresholds(episode.PoseTranslationThreshold,
+                                    episode.PoseRotationThreshold)
+        robot = MiscalibratedRobot(virtual, episode.MoveErrors[index],
+                                   episode.RotateErrors[index])
+        robot.move_multiplier = MOVE_MULTIPLIER
+        robot.rotate_multiplier = ROTATE_MULTIPLIER
+        world.add_robot(robot)
+        robots.append(robot)
+
+        monitor = NoisyVirtualMonitor("Monitor {}".format(index), robot, world,
+                                      episode.SensorNoise, rng)
+        monitor.register("Floor", world)
+        monitor.register("Proximity", world)
+        monitor.register("PSD", world)
+        beeper = Beeper("Beeper {}".format(index), robot, clock=clock)
+        controller = PrimitiveController("MotionController {}".format(index), robot, monitor)
+        controller.register("LocalizeProx", world)
+        controller.register("LocalizePSD", world)
+        planner = planner_class(planner_class.__name__, robot, clock=clock)
+        planner.register("Motion", controller)
+        planner.register("Localize", controller)
+        planner.register("Stop", controller)
+        planner.register("Beep", beeper)
+        planner.register("Servo", monitor)
+        controller.register("Moved", planner)
+        planners.append(planner)
+        threads.extend([virtual, monitor, beeper, controller, planner])
+    planners[0].register("Continue", planners[1])
+    planners[1].register("Continue", planners[0])
+    planners[1].register("Continue", operator)
+    operator.register("Continue", planners[1])
+
+    for thread in threads:
+        thread.set_event_loop(loop)
+        thread.start()
+    start_time = clock.time()
+    for (planner, robot) in zip(planners, robots):
+        planner.send(Signal("Start", OPERATOR_NAME, robot.get_name(), None))
+    finished = loop.run_until(lambda: all(planner.completion_time is not None
+                                          for planner in planners),
+                              episode.MaxTime)
+    completion_time = (max(planner.completion_time for planner in planners) - start_time
+                       if finished else None)
+    final_poses = [robot.get_virtual().get_pose() for robot in robots]
+    for thread in reversed(threads):
+        thread.quit()
+    return EpisodeResult(episode.Seed, finished, completion_time,
+                         [(float(pose.Coord[0, 0]), float(pose.Coord[1, 0]), pose.Angle)
+                          for pose in final_poses])
+
+def sample_episode(seed, args):
+    """Returns an Episode with randomization drawn from the seed."""
+    rng = random.Random(seed)
+    start_poses = [Pose(pose.Coord + to_vector(rng.gauss(0, args.position_noise),
+                                               rng.gauss(0, args.position_noise)),
+                        pose.Angle + rng.gauss(0, args.angle_noise))
+                   for pose in START_POSES]
+    move_errors = [1 + rng.gauss(0, args.multiplier_noise) for _ in START_POSES]
+    rotate_errors = [1 + rng.gauss(0, args.multiplier_noise) for _ in START_POSES]
+    return Episode(seed, start_poses, move_errors, rotate_errors, args.sensor_noise,
+                   args.step, args.max_time, args.pose_translation_threshold,
+                   args.pose_rotation_threshold)
+def nominal_episode(args):
+    """Returns an Episode without any randomization."""
+    return Episode(None, START_POSES, [1] * len(START_POSES), [1] * len(START_POSES), 0,
+                   args.step, args.max_time, args.pose_translation_threshold,
+                   args.pose_rotation_threshold)
+
+# Aggregation
+def pose_errors(result, reference):
+    """Returns 2-tuples of the position and angle errors of each robot's final pose."""
+    return [(float(np.hypot(pose[0] - reference_pose[0], pose[1] - reference_pose[1])),
+             abs(normalize_angle(pose[2] - reference_pose[2])))
+            for (pose, reference_pose) in zip(result.FinalPoses, reference.FinalPoses)]
+def is_success(result, reference, tolerance):
+    """Checks whether the episode finished with every robot within the position
+    tolerance of its final position in the reference episode."""
+    return (result.Finished and
+            all(position_error <= tolerance
+                for (position_error, _) in pose_errors(result, reference)))
+def describe(values, unit):
+    """Returns a string summarizing the distribution of the values."""
+    if not values:
+        return "n/a"
+    return "mean {:.3f} {unit}, median {:.3f} {unit}, p95 {:.3f} {unit}, max {:.3f} {unit}".format(
+        np.mean(values), np.median(values), np.percentile(values, 95), np.max(values),
+        unit=unit)
+def print_summary(results, reference, tolerance):
+    """Prints the success rate, completion times, and final pose errors of the results."""
+    successes = [result for result in results if is_success(result, reference, tolerance)]
+    print("Episodes: {}".format(len(results)))
+    print("Finished: {:.1%}".format(sum(1 for result in results if result.Finished)
+                                    / float(len(results))))
+    print("Succeeded: {:.1%} (final positions within {} cm of the reference)".format(
+        len(successes) / float(len(results)), tolerance))
+    print("Completion time: {} (reference {:.3f} s)".format(
+        describe([result.CompletionTime for result in results if result.Finished], "s"),
+        reference.CompletionTime))
+    errors = [pose_errors(result, reference) for result in results if result.Finished]
+    for index in range(0, len(reference.FinalPoses)):
+        print("Robot {} final position error: {}".format(
+            index, describe([robot_errors[index][0] for robot_errors in errors], "cm")))
+        print("Robot {} final angle error: {}".format(
+            index, describe([robot_errors[index][1] for robot_errors in errors], "rad")))
+
+def main():
+    """Runs episodes."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--episodes", type=int, default=1000, help="number of episodes")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first episode; episodes use consecutive seeds")
+    parser.add_argument("--position-noise", type=float, default=0.5,
+                        help="standard deviation of the start positions, in cm")
+    parser.add_argument("--angle-noise", type=float, default=0.05,
+                        help="standard deviation of the start angles, in radians")
+    parser.add_argument("--multiplier-noise", type=float, default=0.05,
+                        help="relative standard deviation of the actual speed multipliers")
+    parser.add_argument("--sensor-noise", type=float, default=1.0,
+                        help="standard deviation of the sensor values")
+    parser.add_argument("--step", type=float, default=0.001,
+                        help="step of the simulation clock, in seconds")
+    parser.add_argument("--max-time", type=float, default=600,
+                        help="simulated seconds after which an episode is abandoned")
+    parser.add_argument("--pose-translation-threshold", type=float, default=0.2,
+                        help="minimum change in position, in cm, between Pose updates")
+    parser.add_argument("--pose-rotation-threshold", type=float, default=0.01,
+                        help="minimum change in angle, in radians, between Pose updates")
+    parser.add_argument("--tolerance", type=float, default=2.0,
+                        help="final position error, in cm, within which an episode succeeds")
+    parser.add_argument("--save", metavar="PATH", help="save the results of every episode")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    reference = run_episode(nominal_episode(args))
+    episodes = [sample_episode(seed, args)
+                for seed in range(args.seed, args.seed + args.episodes)]
+    pool = multiprocessing.Pool(args.processes)
+    results = []
+    try:
+        for result in pool.imap_unordered(run_episode, episodes, chunksize=4):
+            results.append(result)
+            if len(results) % 100 == 0:
+                print("Ran {} episodes in {:.1f} s".format(len(results),
+                                                          time.time() - start_time))
+    finally:
+        pool.terminate()
+    results.sort(key=lambda result: result.Seed)
+    print_summary(results, reference, args.tolerance)
+    if args.save is not None:
+        with open(args.save, "w") as results_file:
+            json.dump({"reference": reference._asdict(),
+                       "episodes": [dict(result._asdict(),
+                                         Success=is_success(result, reference, args.tolerance))
+                                    for result in results]},
+                      results_file, indent=2)
+        print("Saved results to {}".format(args.save))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""Headless micro-benchmarks of geometry, sensing, kinematics, filtering, and calibration.
+Reports the throughput of each benchmark in operations per second, the number of objects
+each operation leaves allocated, and, where the resource module is available, how much
+running the benchmark grew the peak resident memory of the process.
+
+Run with `python -m test.benchmark`. Use --save to record the results as a baseline, and
+--compare to check the results against a saved baseline; the script exits with an error
+status if any benchmark is slower than its baseline by more than the tolerance.
+"""
+import gc
+import sys
+import time
+import json
+import random
+import argparse
+from itertools import cycle
+
+import numpy as np
+
+from components.util import moving_average, moving_median, moving_mean, FilterBank
+from components.geometry import Pose, to_vector, transformation, transform_all, compose
+from components.geometry import to_angle
+from components.robots import Robot, VirtualRobot, VirtualFleet
+from components.concurrency import SimulationClock
+from components.world import VirtualWorld, HeadlessCanvas, Wall, Border, Package
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+WALL_SPACING = 20 # cm between the centers of neighboring walls
+NUM_SAMPLE_POSES = 64
+REPEATS = 3
+
+# Setup
+def make_world(num_walls, grid_cell_size=None):
+    """Returns a VirtualWorld with the specified number of Walls laid out on a square grid,
+    plus a Border for every other Wall and a Package for every fourth Wall."""
+    rng = random.Random(num_walls)
+    side = int(np.ceil(np.sqrt(num_walls)))
+    half_length = 0.5 * side * WALL_SPACING
+    bounds = [int(-half_length) - WALL_SPACING, int(-half_length) - WALL_SPACING,
+              int(half_length) + WALL_SPACING, int(half_length) + WALL_SPACING]
+    world = VirtualWorld("Virtual World", bounds, HeadlessCanvas(), 1, grid_cell_size)
+    rect_id = 0
+    for index in range(0, num_walls):
+        center_x = (index % side) * WALL_SPACING - half_length
+        center_y = (index // side) * WALL_SPACING - half_length
+        world.add_wall(Wall(rect_id, center_x, center_y,
+                            rng.uniform(2, 10), rng.uniform(2, 10)))
+        rect_id += 1
+        if index % 2 == 0:
+            world.add_border(Border(rect_id, 0, center_x + 0.5 * WALL_SPACING, center_y,
+                                    1, rng.uniform(2, 10)))
+            rect_id += 1
+        if index % 4 == 0:
+            world.add_package(Package(rect_id, center_x, center_y + 0.5 * WALL_SPACING,
+                                      rng.uniform(-np.pi, np.pi)))
+            rect_id += 1
+    return (world, bounds)
+def make_robots(world, bounds, num_robots, clock=None):
+    """Adds the specified number of virtual robots at random poses to the world."""
+    rng = random.Random(num_robots)
+    robots = []
+    for index in range(0, num_robots):
+        pose = Pose(to_vector(rng.uniform(bounds[0], bounds[2]),
+                              rng.uniform(bounds[1], bounds[3])),
+                    rng.uniform(-np.pi, np.pi))
+        robot = Robot(None, VirtualRobot("Robot {}".format(index), pose=pose, clock=clock))
+        world.add_robot(robot)
+        robots.append(robot)
+    return robots
+def sample_poses(bounds):
+    """Returns a list of random poses within the bounds."""
+    rng = random.Random(0)
+    return [Pose(to_vector(rng.uniform(bounds[0], bounds[2]), rng.uniform(bounds[1], bounds[3])),
+                 rng.uniform(-np.pi, np.pi))
+            for _ in range(0, NUM_SAMPLE_POSES)]
+
+# Benchmarks
+def bench_transform_all():
+    """Transforms the corners of a robot chassis."""
+    corners = VirtualRobot("Robot").get_corners()
+    matrix = transformation(Pose(to_vector(3, 4), 0.5))
+    return lambda: transform_all(matrix, corners)
+def bench_rectangle_ray_distance():
+    """Casts a ray against a single Wall."""
+    wall = Wall(0, 0, 0, 10, 4)
+    rays = cycle(sample_poses([-20, -20, 20, 20]))
+    def _run():
+        ray = next(rays)
+        wall.ray_distance_to(ray.Coord, ray.Angle)
+    return _run
+def bench_world_sensing(sensing, num_walls, num_robots, grid_cell_size=None):
+    """Runs one virtual sensing tick for every robot in a world.
+
+    Arguments:
+        sensing: "proximity", "psd", or "floor".
+    """
+    (world, bounds) = make_world(num_walls, grid_cell_size)
+    robots = make_robots(world, bounds, num_robots)
+    virtuals = [robot.get_virtual() for robot in robots]
+    def _run_proximity():
+        for virtual in virtuals:
+            pose = virtual.get_pose()
+            for coords in transform_all(transformation(pose), virtual.get_proximity_coords()):
+                world.get_proximity_distance(coords, pose.Angle)
+    def _run_psd():
+        for virtual in virtuals:
+            matrix = compose(transformation(virtual.get_pose()),
+                             transformation(virtual.get_scanner().get_pose()))
+            sensor_coords = transform_all(matrix, virtual.get_scanner().get_psd_coords())
+            world.get_psd_distance(sensor_coords[0],
+                                   to_angle(sensor_coords[1] - sensor_coords[0]))
+    def _run_floor():
+        for virtual in virtuals:
+            matrix = transformation(virtual.get_pose())
+            for coords in transform_all(matrix, virtual.get_floor_centers()):
+                world.get_floor_color(coords)
+    return {"proximity": _run_proximity, "psd": _run_psd, "floor": _run_floor}[sensing]
+def bench_kinematics(integrator, num_robots):
+    """Integrates the motion of every robot in a world over one update, with half of
+    the robots moving and the rest rotating.
+
+    Arguments:
+        integrator: "robot" to update each VirtualRobot separately, or "fleet" to update
+        all of them at once in a VirtualFleet.
+    """
+    clock = SimulationClock(0.02)
+    (world, bounds) = make_world(8)
+    virtuals = [robot.get_virtual() for robot in make_robots(world, bounds, num_robots, clock)]
+    fleet = VirtualFleet(clock=clock)
+    for (index, virtual) in enumerate(virtuals):
+        if integrator == "fleet":
+            fleet.add_robot(virtual)
+        if index % 2 == 0:
+            virtual.move(1)
+        else:
+            virtual.rotate(0.1)
+    def _run_robot():
+        clock.advance(0.02)
+        for virtual in virtuals:
+            virtual._update()
+    def _run_fleet():
+        clock.advance(0.02)
+        fleet._update()
+    return {"robot": _run_robot, "fleet": _run_fleet}[integrator]
+def bench_moving_filter(filtering, window):
+    """Sends a sample into a moving filter.
+
+    Arguments:
+        filtering: "average[median]", "median", or "mean".
+    """
+    average = {"average[median]": lambda: moving_average(window, np.median),
+               "median": lambda: moving_median(window),
+               "mean": lambda: moving_mean(window)}[filtering]()
+    samples = cycle(random.Random(window).sample(range(0, 256), 64))
+    return lambda: average.send(next(samples))
+def bench_filter_bank(filtering, num_robots):
+    """Filters one sample of every sensor channel of a FilteringMonitor for each robot.
+
+    Arguments:
+        filtering: "coroutines" to send into one moving_median per channel, or "bank"
+        to update a single FilterBank.
+    """
+    window_sizes = [4, 4, 8, 8, 4] * num_robots
+    rng = random.Random(num_robots)
+    samples = cycle([[rng.randint(0, 255) for _ in window_sizes] for _ in range(64)])
+    if filtering == "coroutines":
+        filters = [moving_median(window_size) for window_size in window_sizes]
+        return lambda: [median.send(value) for (median, value) in zip(filters, next(samples))]
+    bank = FilterBank(window_sizes)
+    return lambda: bank.update(next(samples))
+def bench_interpolator(conversion):
+    """Converts a sensor reading using a Robot's calibration profile.
+
+    Arguments:
+        conversion: "to_prox_distance" or "to_psd_ir".
+    """
+    robot = Robot()
+    convert = getattr(robot, conversion)
+    if conversion == "to_prox_distance":
+        values = cycle(range(0, 100))
+    else:
+        values = cycle(np.linspace(0, 30, 97))
+    return lambda: convert(next(values))
+
+def get_benchmarks(world_sizes, robot_counts, grid_cell_sizes=(None,)):
+    """Returns a list of 2-tuples of benchmark names and functions to set them up.
+    World sensing benchmarks are run for every combination of world size, number of
+    robots, and grid cell size; a grid cell size of None means no spatial index.
+    """
+    benchmarks = [
+        ("geometry.transform_all", bench_transform_all),
+        ("Rectangle.ray_distance_to", bench_rectangle_ray_distance),
+        ("Robot.to_prox_distance", lambda: bench_interpolator("to_prox_distance")),
+        ("Robot.to_psd_ir", lambda: bench_interpolator("to_psd_ir"))
+    ]
+    for filtering in ("average[median]", "median", "mean"):
+        for window in (4, 8, 50):
+            name = "util.moving_{}[{}]".format(filtering, window)
+            if filtering == "average[median]":
+                name = "util.moving_average[median,{}]".format(window)
+            benchmarks.append((name, (lambda filtering=filtering, window=window:
+                                      bench_moving_filter(filtering, window))))
+    for filtering in ("coroutines", "bank"):
+        for num_robots in robot_counts:
+            name = "FilteringMonitor.{}[robots={}]".format(filtering, num_robots)
+            benchmarks.append((name, (lambda filtering=filtering, num_robots=num_robots:
+                                      bench_filter_bank(filtering, num_robots))))
+    for sensing in ("proximity", "psd", "floor"):
+        for num_walls in world_sizes:
+            for num_robots in robot_counts:
+                for grid_cell_size in grid_cell_sizes:
+                    name = "VirtualWorld.{}[walls={},robots={}".format(sensing, num_walls,
+                                                                       num_robots)
+                    if grid_cell_size is not None:
+                        name += ",grid={}".format(grid_cell_size)
+                    name += "]"
+                    benchmarks.append((name, (lambda sensing=sensing, num_walls=num_walls,
+                                                     num_robots=num_robots,
+                                                     grid_cell_size=grid_cell_size:
+                                              bench_world_sensing(sensing, num_walls, num_robots,
+                                                                  grid_cell_size))))
+    for integrator in ("robot", "fleet"):
+        for num_robots in robot_counts:
+            name = "Virtual{}._update[robots={}]".format(integrator.capitalize(), num_robots)
+            benchmarks.append((name, (lambda integrator=integrator, num_robots=num_robots:
+                                      bench_kinematics(integrator, num_robots))))
+    return benchmarks
+
+# Measurement
+def measure_rate(function, min_time):
+    """Returns the best rate, in operations per second, over several timed runs."""
+    best = 0
+    for _ in range(0, REPEATS):
+        count = 0
+        number = 1
+        start = time.time()
+        while True:
+            for _ in xrange(0, number):
+                function()
+            count += number
+            elapsed = time.time() - start
+            if elapsed >= min_time:
+                break
+            number *= 2
+        best = max(best, count / elapsed)
+    return best
+def count_objects():
+    """Returns the number of objects tracked by the garbage collector, plus the numpy
+    arrays they refer to, which the garbage collector does not track."""
+    gc.collect()
+    objects = gc.get_objects()
+    arrays = set(id(referent) for referent in gc.get_referents(*objects)
+                 if isinstance(referent, np.ndarray))
+    return len(objects) + len(arrays)
+def get_peak_rss():
+    """Returns the peak resident memory of the process so far, in KiB on Linux.
+    Returns None if the resource module is not available.
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+def measure_allocation(function, num_ops=100):
+    """Runs the function repeatedly and returns a 2-tuple of the number of objects left
+    allocated per run, and the growth of the peak resident memory of the process, in KiB,
+    or None if it cannot be measured.
+    """
+    start_objects = count_objects()
+    start_rss = get_peak_rss()
+    for _ in range(0, num_ops):
+        function()
+    rss_growth = None if start_rss is None else get_peak_rss() - start_rss
+    return ((count_objects() - start_objects) / float(num_ops), rss_growth)
+
+def run_benchmarks(benchmarks, min_time):
+    """Runs the benchmarks and returns a dict of their results, keyed by name."""
+    results = {}
+    for (name, setup) in benchmarks:
+        function = setup()
+        function() # warm up any caches
+        (retained_objects, rss_growth) = measure_allocation(function)
+        results[name] = {
+            "rate": measure_rate(function, min_time),
+            "retainedObjects": retained_objects,
+            "peakRSSGrowth": rss_growth
+        }
+        print_result(name, results[name])
+    return results
+def print_result(name, result, baseline=None):
+    """Prints the result of a benchmark, compared to its baseline if available."""
+    if result["peakRSSGrowth"] is None:
+        rss_growth = "n/a"
+    else:
+        rss_growth = "{} KiB".format(result["peakRSSGrowth"])
+    line = "{:<55} {:>14.1f} ops/s {:>+9.2f} objects/op {:>10}".format(
+        name, result["rate"], result["retainedObjects"], rss_growth)
+    if baseline is not None:
+        line += " {:>+8.1%}".format(result["rate"] / baseline["rate"] - 1)
+    print(line)
+def find_regressions(results, baselines, tolerance):
+    """Returns the names of benchmarks whose rates fell below their baselines by more
+    than the tolerance, given as a fraction of the baseline rate."""
+    return [name for (name, result) in sorted(results.items())
+            if name in baselines and result["rate"] < (1 - tolerance) * baselines[name]["rate"]]
+
+def parse_counts(text):
+    """Parses a comma-separated list of ints."""
+    return [int(count) for count in text.split(",")]
+
+def main():
+    """Runs benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--world-sizes", type=parse_counts, default=[8, 64, 512],
+                        help="comma-separated numbers of walls in the benchmark worlds")
+    parser.add_argument("--robots", type=parse_counts, default=[1, 4, 16],
+                        help="comma-separated numbers of robots in the benchmark worlds")
+    parser.add_argument("--grid-cell-sizes", type=parse_counts, default=[],
+                        help="comma-separated grid cell sizes to also benchmark worlds "
+                        "with spatial indices")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="minimum number of seconds to time each benchmark run")
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks whose names contain this string")
+    parser.add_argument("--save", metavar="PATH", help="save the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="fractional slowdown allowed before reporting a regression")
+    args = parser.parse_args()
+
+    grid_cell_sizes = [None] + args.grid_cell_sizes
+    benchmarks = [(name, setup) for (name, setup) in get_benchmarks(args.world_sizes,
+                                                                    args.robots,
+                                                                    grid_cell_sizes)
+                  if args.filter in name]
+    results = run_benchmarks(benchmarks, args.min_time)
+    if args.save is not None:
+        with open(args.save, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print("Saved baseline to {}".format(args.save))
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baselines = json.load(baseline_file)
+        print("Compared to baseline {}:".format(args.compare))
+        for name in sorted(results.keys()):
+            if name in baselines:
+                print_result(name, results[name], baselines[name])
+        regressions = find_regressions(results, baselines, args.tolerance)
+        if regressions:
+            print("Regressions: {}".format(", ".join(regressions)))
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
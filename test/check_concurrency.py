@@ -0,0 +1,136 @@
+"""Checks the ticks at which TimerWheel fires one-shot and periodic timers, in simulated time.
+
+Run with `python -m test.check_concurrency`; exits with an error if any check fails.
+"""
+import sys
+import time
+import threading
+
+from components.concurrency import InterruptableThread, TimerWheel, SimulationClock, EventLoop
+from test.checking import run_checks
+
+RESOLUTION = 0.005
+SLOTS_PER_LEVEL = 64
+
+def make_wheel():
+    """Returns a 2-tuple of a SimulationClock and a TimerWheel which reads time from it."""
+    clock = SimulationClock(RESOLUTION)
+    wheel = TimerWheel(resolution=RESOLUTION, slots_per_level=SLOTS_PER_LEVEL, num_levels=3,
+                       clock=clock)
+    return (clock, wheel)
+def turn(clock, wheel, num_ticks):
+    """Advances the clock and the wheel one tick at a time."""
+    for _ in range(0, num_ticks):
+        clock.advance(RESOLUTION)
+        wheel.advance()
+def current_tick(clock):
+    """Returns the tick of the current time of the clock."""
+    return int(round(clock.time() / RESOLUTION))
+
+def check_one_shot_ticks():
+    """One-shot timers fire at their deadline ticks, including ticks on level boundaries."""
+    (clock, wheel) = make_wheel()
+    deadlines = [1, 10, 63, 64, 65, 127, 128, 200, 4095, 4096, 4097, 5000]
+    fired = []
+    for deadline in deadlines:
+        wheel.call_later(deadline * RESOLUTION, lambda: fired.append(current_tick(clock)))
+    turn(clock, wheel, 6000)
+    assert fired == deadlines
+    assert len(wheel) == 0
+def check_periodic_ticks():
+    """Periodic timers fire at every whole multiple of their periods, including periods
+    which are whole multiples of a level of the wheel."""
+    for period_ticks in (1, 7, 64, 100, 128):
+        (clock, wheel) = make_wheel()
+        fired = []
+        timer = wheel.call_every(period_ticks * RESOLUTION,
+                                 lambda: fired.append(current_tick(clock)))
+        turn(clock, wheel, 1000)
+        assert fired == range(period_ticks, 1001, period_ticks)
+        assert timer.get_stats().Missed == 0
+def check_aligned_periods():
+    """Periodic timers with the same period fire in the same tick, whenever scheduled."""
+    (clock, wheel) = make_wheel()
+    fired = ([], [])
+    wheel.call_every(0.32, lambda: fired[0].append(current_tick(clock)))
+    turn(clock, wheel, 13)
+    wheel.call_every(0.32, lambda: fired[1].append(current_tick(clock)))
+    turn(clock, wheel, 400)
+    assert fired[0] == fired[1] == [64, 128, 192, 256, 320, 384]
+def check_cancel():
+    """Cancelled timers do not fire and are removed from the wheel."""
+    (clock, wheel) = make_wheel()
+    fired = []
+    timers = [wheel.call_later(deadline * RESOLUTION, fired.append, deadline)
+              for deadline in (5, 64, 300)]
+    periodic = wheel.call_every(10 * RESOLUTION, fired.append, None)
+    timers[1].cancel()
+    turn(clock, wheel, 30)
+    periodic.cancel()
+    turn(clock, wheel, 400)
+    assert fired == [5, None, None, None, 300]
+    assert len(wheel) == 0
+def check_quit_idle():
+    """A started wheel without timers quits promptly, however soon after starting."""
+    def start_and_quit():
+        for _ in range(0, 500):
+            wheel = TimerWheel(resolution=RESOLUTION)
+            wheel.start()
+            wheel.quit()
+    runner = threading.Thread(target=start_and_quit)
+    runner.daemon = True
+    runner.start()
+    runner.join(30)
+    assert not runner.is_alive()
+def check_idle_simulated_loop():
+    """An idle EventLoop on a SimulationClock blocks in its thread, without spinning or
+    advancing the clock, until another thread schedules a callback or quits it."""
+    loop = EventLoop(clock=SimulationClock(RESOLUTION))
+    called = threading.Event()
+    loop.start()
+    try:
+        start_cpu = time.clock()
+        time.sleep(0.2)
+        assert time.clock() - start_cpu < 0.1
+        assert loop.time() == 0
+        loop.call_soon(called.set)
+        assert called.wait(5)
+    finally:
+        loop.quit()
+def check_unsupported_executors():
+    """A thread which only implements _run cannot be started on an EventLoop or a
+    TimerWheel, and one which implements _start_timers can be started on a TimerWheel."""
+    class ThreadOnly(InterruptableThread):
+        """Does nothing in its own thread."""
+        def _run(self):
+            pass
+    class TimersToo(ThreadOnly):
+        """Schedules no timers on its TimerWheel."""
+        def _start_timers(self, timer_wheel):
+            pass
+    for (thread, executor) in ((ThreadOnly("Thread"), EventLoop()),
+                               (ThreadOnly("Thread"), TimerWheel()),
+                               (TimersToo("Thread"), EventLoop())):
+        if isinstance(executor, EventLoop):
+            thread.set_event_loop(executor)
+        else:
+            thread.set_timer_wheel(executor)
+        try:
+            thread.start()
+        except ValueError:
+            continue
+        assert False
+    thread = TimersToo("Thread")
+    thread.set_timer_wheel(TimerWheel())
+    thread.start()
+    thread.quit()
+
+CHECKS = [check_one_shot_ticks, check_periodic_ticks, check_aligned_periods, check_cancel,
+          check_quit_idle, check_idle_simulated_loop, check_unsupported_executors]
+
+def main():
+    """Runs checks."""
+    return 1 if run_checks(CHECKS) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
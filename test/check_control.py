@@ -0,0 +1,85 @@
+"""Checks the order in which PrimitiveController handles waiting commands and telemetry.
+
+Run with `python -m test.check_control`; exits with an error if any check fails.
+"""
+import sys
+
+from components.messaging import Signal
+from components.geometry import Pose, to_vector
+from components.robots import Robot, VirtualRobot
+from components.control import PrimitiveController, Motion
+from components.concurrency import TimerWheel, SimulationClock
+from test.checking import run_checks
+
+ROBOT_NAME = "Robot 0"
+MOTION = Motion("MoveBy", "DeadReckoning", 1, 80, 5)
+
+class RecordingRobot(Robot):
+    """A virtual robot which records the speeds it is commanded to move at."""
+    def __init__(self):
+        super(RecordingRobot, self).__init__(None, VirtualRobot(ROBOT_NAME))
+        self.speeds = []
+
+    def move(self, speed):
+        self.speeds.append(speed)
+        super(RecordingRobot, self).move(speed)
+
+def make_controller():
+    """Returns a 2-tuple of a RecordingRobot and a PrimitiveController for it, which is not
+    started and schedules its Deadline Signals on a TimerWheel which never fires them."""
+    robot = RecordingRobot()
+    wheel = TimerWheel(clock=SimulationClock(0.01))
+    return (robot, PrimitiveController("Controller", robot, scheduler=wheel))
+def signal(name, data=None):
+    """Returns a Signal for the controller's robot."""
+    return Signal(name, "Check", ROBOT_NAME, data)
+def pose(x_coord):
+    """Returns a Pose Signal at the specified x-coord on the x-axis."""
+    return signal("Pose", Pose(to_vector(x_coord, 0), 0))
+def react_waiting(controller):
+    """Makes the controller handle its waiting Signals one at a time, as its thread would.
+    Returns a list of the names of the Signals handled."""
+    handled = []
+    while controller._num_waiting():
+        next_signal = controller._receive(False)
+        handled.append(next_signal.Name)
+        controller._react(next_signal)
+    return handled
+
+def check_stop_after_motion():
+    """A Motion sent before a Stop or a Pause never runs after it, even behind telemetry."""
+    for stop_name in ("Stop", "Pause"):
+        (robot, controller) = make_controller()
+        controller.send_many([pose(-1), signal("Floor", (1, 1)), signal("Motion", MOTION),
+                              signal(stop_name), pose(-2)])
+        handled = react_waiting(controller)
+        assert handled.index("Motion") < handled.index(stop_name)
+        assert robot.speeds[-1] == 0
+def check_stop_before_telemetry():
+    """A Stop is handled before the waiting telemetry, however much of it is waiting."""
+    (_, controller) = make_controller()
+    controller.send_many([signal("Floor", (1, 1)), signal("Proximity", (1, 1))]
+                         + [Signal("Pose", "Check", name, Pose(to_vector(0, 0), 0))
+                            for name in ("Robot 1", "Robot 2", "Robot 3")]
+                         + [signal("Stop")])
+    assert react_waiting(controller)[0] == "Stop"
+def check_motion_after_telemetry():
+    """A Motion is started from the latest telemetry sent before it is handled."""
+    (robot, controller) = make_controller()
+    controller.send_many([pose(1), signal("Motion", MOTION), pose(3), signal("Floor", (2, 2))])
+    motion = controller._receive(False)
+    assert motion.Name == "Motion"
+    controller._react(motion)
+    assert controller._num_waiting() == 0
+    assert controller._robot_pose.Coord[0] == 3
+    assert controller._sensors["floorLeft"][ROBOT_NAME] == 2
+    assert robot.speeds[-1] > 0
+
+CHECKS = [check_stop_after_motion, check_stop_before_telemetry, check_motion_after_telemetry]
+
+def main():
+    """Runs checks."""
+    return 1 if run_checks(CHECKS) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Checks vectorized and spatially indexed queries against linear scans of the Rectangles.
+
+Run with `python -m test.check_geometry`; exits with an error if any check fails.
+"""
+import sys
+import random
+
+import numpy as np
+
+from components.util import min_first, iter_first_not_none
+from components.geometry import RayCaster, ray_distance_to, to_vector
+from components.world import UniqueRectangle, VirtualWorld, HeadlessCanvas, Wall, Package
+from components.spatial import UniformGrid
+from test.checking import run_checks
+
+NUM_RECTANGLES = 40
+NUM_RAYS = 2000
+WORLD_SIZE = 100
+
+def make_rectangles(rng):
+    """Returns a list of randomly placed and rotated UniqueRectangles, some overlapping."""
+    return [UniqueRectangle(rect_id, rng.uniform(-WORLD_SIZE, WORLD_SIZE),
+                            rng.uniform(-WORLD_SIZE, WORLD_SIZE), rng.uniform(1, 20),
+                            rng.uniform(1, 20), rng.uniform(-np.pi, np.pi))
+            for rect_id in range(0, NUM_RECTANGLES)]
+def make_rays(rng, rectangles):
+    """Returns a list of 2-tuples of random ray origins and angles, a few of them starting
+    inside rectangles."""
+    rays = [(to_vector(rng.uniform(-WORLD_SIZE, WORLD_SIZE),
+                       rng.uniform(-WORLD_SIZE, WORLD_SIZE)), rng.uniform(-np.pi, np.pi))
+            for _ in range(0, NUM_RAYS)]
+    rays.extend((rectangle.get_center(), rng.uniform(-np.pi, np.pi))
+                for rectangle in rectangles)
+    return rays
+def per_rectangle_distance_to(rectangles, coords, angle):
+    """Returns the first rectangle hit by the ray by testing each Rectangle in turn, in the
+    same form as the geometry.ray_distance_to function."""
+    distances = [rectangle.ray_distance_to(coords, angle) + (rectangle.get_id(),)
+                 for rectangle in rectangles]
+    try:
+        return min_first(iter_first_not_none(distances))
+    except ValueError:
+        return None
+def same_hit(actual, expected):
+    """Checks whether two ray casting results hit the same side at the same distance."""
+    if actual is None or expected is None:
+        return actual is expected
+    return (np.isclose(actual[0], expected[0], rtol=1e-9, atol=1e-9)
+            and actual[1:] == expected[1:])
+
+def check_ray_distance_to():
+    """ray_distance_to hits the same side at the same distance as each Rectangle does."""
+    rng = random.Random(0)
+    rectangles = make_rectangles(rng)
+    rays = make_rays(rng, rectangles)
+    num_hits = 0
+    for (coords, angle) in rays:
+        expected = per_rectangle_distance_to(rectangles, coords, angle)
+        assert same_hit(ray_distance_to(rectangles, coords, angle), expected)
+        num_hits += expected is not None
+    assert 0 < num_hits < len(rays)
+def check_batched_rays():
+    """RayCaster.ray_distances_to casts many rays the same way as one at a time."""
+    rng = random.Random(1)
+    rectangles = make_rectangles(rng)
+    rays = make_rays(rng, rectangles)
+    caster = RayCaster(rectangles)
+    assert caster.get_num_segments() == 4 * len(rectangles)
+    results = caster.ray_distances_to([coords for (coords, _) in rays],
+                                      [angle for (_, angle) in rays])
+    assert len(results) == len(rays)
+    for (result, (coords, angle)) in zip(results, rays):
+        assert same_hit(result, per_rectangle_distance_to(rectangles, coords, angle))
+def check_no_rectangles():
+    """Rays miss when there are no Rectangles."""
+    assert ray_distance_to([], to_vector(0, 0), 0) is None
+    assert RayCaster().ray_distances_to([to_vector(0, 0)] * 2, [0, 1]) == [None, None]
+def check_uniform_grid():
+    """UniformGrid.ray_distance_to hits the same side at the same distance as each
+    Rectangle does, and VirtualWorld.guess_rectangle guesses the same side of the same
+    Rectangle with spatial indices as without."""
+    rng = random.Random(2)
+    rectangles = make_rectangles(rng)
+    grid = UniformGrid(cell_size=15)
+    for rectangle in rectangles:
+        grid.add(rectangle)
+    for (coords, angle) in make_rays(rng, rectangles):
+        assert same_hit(grid.ray_distance_to(coords, angle),
+                        per_rectangle_distance_to(rectangles, coords, angle))
+    worlds = [VirtualWorld("World", [-WORLD_SIZE, -WORLD_SIZE, WORLD_SIZE, WORLD_SIZE],
+                           HeadlessCanvas(), 1, grid_cell_size)
+              for grid_cell_size in (None, 15)]
+    for world in worlds:
+        for rect_id in range(0, NUM_RECTANGLES):
+            rect_rng = random.Random(rect_id)
+            (center_x, center_y) = (rect_rng.uniform(-WORLD_SIZE, WORLD_SIZE),
+                                    rect_rng.uniform(-WORLD_SIZE, WORLD_SIZE))
+            if rect_id % 3:
+                world.add_wall(Wall(rect_id, center_x, center_y, rect_rng.uniform(1, 20),
+                                    rect_rng.uniform(1, 20)))
+            else:
+                world.add_package(Package(rect_id, center_x, center_y,
+                                          rect_rng.uniform(-np.pi, np.pi)))
+    for _ in range(0, NUM_RAYS):
+        point = to_vector(rng.uniform(-WORLD_SIZE, WORLD_SIZE),
+                          rng.uniform(-WORLD_SIZE, WORLD_SIZE))
+        for rect_type in (None, "wall", "package"):
+            (linear, indexed) = [world.guess_rectangle(point, rect_type) for world in worlds]
+            assert same_hit(indexed, linear)
+
+CHECKS = [check_ray_distance_to, check_batched_rays, check_no_rectangles, check_uniform_grid]
+
+def main():
+    """Runs checks."""
+    return 1 if run_checks(CHECKS) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
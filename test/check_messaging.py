@@ -0,0 +1,131 @@
+"""Checks the priority classes, conflation, and queue bounds of Mailbox.
+
+Run with `python -m test.check_messaging`; exits with an error if any check fails.
+"""
+import sys
+import threading
+
+from components.messaging import Signal, Mailbox
+from components.messaging import CONTROL_PRIORITY, TELEMETRY_PRIORITY
+from components.messaging import BLOCK, DROP_OLDEST, DROP_NEWEST, CONFLATE
+from test.checking import run_checks
+
+def signal(name, namespace=None, data=None):
+    """Returns a Signal sent by the checks."""
+    return Signal(name, "Check", namespace, data)
+def describe(signals):
+    """Returns a list of 3-tuples of the names, namespaces, and data of the Signals."""
+    return [(signal.Name, signal.Namespace, signal.Data) for signal in signals]
+def make_mailbox():
+    """Returns a Mailbox with Stop as a control Signal and Pose as telemetry."""
+    mailbox = Mailbox()
+    mailbox.prioritize("Stop", CONTROL_PRIORITY)
+    mailbox.prioritize("Pose", TELEMETRY_PRIORITY)
+    return mailbox
+
+def check_priorities():
+    """Signals are received by priority class, then in the order they were put."""
+    mailbox = make_mailbox()
+    for next_signal in (signal("Pose", data=1), signal("Motion", data=1), signal("Stop"),
+                        signal("Motion", data=2), signal("Pose", data=2)):
+        mailbox.put(next_signal)
+    assert describe(mailbox.get_all()) == [("Stop", None, None), ("Motion", None, 1),
+                                           ("Motion", None, 2), ("Pose", None, 1),
+                                           ("Pose", None, 2)]
+def check_get_priority_class():
+    """Getting the waiting Signals of one priority class leaves the others waiting."""
+    mailbox = make_mailbox()
+    for next_signal in (signal("Pose", data=1), signal("Motion"), signal("Stop"),
+                        signal("Pose", data=2)):
+        mailbox.put(next_signal)
+    assert describe(mailbox.get_all(TELEMETRY_PRIORITY)) == [("Pose", None, 1),
+                                                             ("Pose", None, 2)]
+    assert mailbox.get_all(TELEMETRY_PRIORITY) == []
+    assert describe(mailbox.get_all()) == [("Stop", None, None), ("Motion", None, None)]
+def check_conflation():
+    """Conflated Signals replace waiting ones of the same key in place."""
+    mailbox = make_mailbox()
+    mailbox.conflate("Pose")
+    for next_signal in (signal("Pose", "Robot 0", 1), signal("Pose", "Robot 1", 1),
+                        signal("Pose", "Robot 0", 2)):
+        mailbox.put(next_signal)
+    assert describe(mailbox.get_all()) == [("Pose", "Robot 0", 2), ("Pose", "Robot 1", 1)]
+    assert mailbox.get_drop_counts() == {}
+def check_drop_newest():
+    """A full per-name bound with DROP_NEWEST drops the Signals being put."""
+    mailbox = make_mailbox()
+    mailbox.set_queue_limit(2, DROP_NEWEST, "Beep")
+    for data in range(0, 4):
+        mailbox.put(signal("Beep", data=data))
+    mailbox.put(signal("Motion"))
+    assert describe(mailbox.get_all()) == [("Beep", None, 0), ("Beep", None, 1),
+                                           ("Motion", None, None)]
+    assert mailbox.get_drop_counts() == {"Beep": 2}
+def check_drop_oldest_by_priority():
+    """A full overall bound with DROP_OLDEST drops the oldest Signal of the lowest
+    priority class, and never drops or bounds control Signals."""
+    mailbox = make_mailbox()
+    mailbox.set_queue_limit(3, DROP_OLDEST)
+    for next_signal in (signal("Stop", data=1), signal("Motion", data=1),
+                        signal("Pose", data=1), signal("Pose", data=2),
+                        signal("Motion", data=2), signal("Stop", data=2),
+                        signal("Motion", data=3)):
+        mailbox.put(next_signal)
+    assert describe(mailbox.get_all()) == [("Stop", None, 1), ("Stop", None, 2),
+                                           ("Motion", None, 3)]
+    assert mailbox.get_drop_counts() == {"Pose": 2, "Motion": 2}
+def check_drop_oldest_only_control():
+    """A full overall bound of only control Signals drops the other Signals being put."""
+    mailbox = make_mailbox()
+    mailbox.set_queue_limit(2, DROP_OLDEST)
+    for next_signal in (signal("Stop", data=1), signal("Stop", data=2), signal("Motion"),
+                        signal("Stop", data=3)):
+        mailbox.put(next_signal)
+    assert describe(mailbox.get_all()) == [("Stop", None, 1), ("Stop", None, 2),
+                                           ("Stop", None, 3)]
+    assert mailbox.get_drop_counts() == {"Motion": 1}
+def check_conflate_policy_namespaces():
+    """A full bound with CONFLATE only replaces a Signal with the same Namespace."""
+    mailbox = make_mailbox()
+    mailbox.set_queue_limit(2, CONFLATE)
+    for next_signal in (signal("Floor", "Robot 0", 1), signal("Floor", "Robot 1", 1),
+                        signal("Floor", "Robot 0", 2), signal("Floor", "Robot 2", 1)):
+        mailbox.put(next_signal)
+    assert describe(mailbox.get_all()) == [("Floor", "Robot 1", 1), ("Floor", "Robot 2", 1)]
+    assert mailbox.get_drop_counts() == {"Floor": 2}
+def check_conflate_policy_keys():
+    """A full bound with CONFLATE only replaces a Signal with the same conflation key."""
+    mailbox = make_mailbox()
+    mailbox.conflate("UpdateCoords", lambda signal: signal.Data[0])
+    mailbox.set_queue_limit(2, CONFLATE)
+    for item in (1, 2, 3):
+        mailbox.put(signal("UpdateCoords", None, (item, "coords")))
+    assert describe(mailbox.get_all()) == [("UpdateCoords", None, (2, "coords")),
+                                           ("UpdateCoords", None, (3, "coords"))]
+def check_block():
+    """A full bound with BLOCK blocks the sender until there is room; None bypasses it."""
+    mailbox = make_mailbox()
+    mailbox.set_queue_limit(1, BLOCK)
+    mailbox.put(signal("Motion", data=1))
+    sender = threading.Thread(target=mailbox.put, args=(signal("Motion", data=2),))
+    sender.daemon = True
+    sender.start()
+    sender.join(0.1)
+    assert sender.is_alive()
+    assert mailbox.get().Data == 1
+    sender.join(1)
+    assert not sender.is_alive()
+    mailbox.put(None)
+    assert describe(mailbox.get_all()[:1]) == [("Motion", None, 2)]
+    assert len(mailbox) == 0
+
+CHECKS = [check_priorities, check_get_priority_class, check_conflation, check_drop_newest,
+          check_drop_oldest_by_priority, check_drop_oldest_only_control,
+          check_conflate_policy_namespaces, check_conflate_policy_keys, check_block]
+
+def main():
+    """Runs checks."""
+    return 1 if run_checks(CHECKS) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Checks the Pose emission policies of VirtualRobot in simulated time.
+
+Run with `python -m test.check_robots`; exits with an error if any check fails.
+"""
+import sys
+
+import numpy as np
+
+from components.messaging import Signal, Receiver
+from components.geometry import Pose, to_vector
+from components.robots import Robot, VirtualRobot, Beeper
+from components.concurrency import SimulationClock
+from test.checking import run_checks
+
+UPDATE_INTERVAL = 0.02
+NUM_UPDATES = 50
+
+def count_pose_updates(start_angle=0, move_speed=0, rotate_speed=0, min_translation=0,
+                       min_rotation=0):
+    """Moves or rotates a robot for NUM_UPDATES updates and returns the number of Pose
+    Signals broadcast by the updates after the first, which is always broadcast because
+    the stationary robot has not broadcast a Pose yet."""
+    clock = SimulationClock(UPDATE_INTERVAL)
+    robot = VirtualRobot("Robot", UPDATE_INTERVAL, Pose(to_vector(0, 0), start_angle),
+                         clock=clock)
+    receiver = Receiver()
+    robot.register("Pose", receiver)
+    robot.set_pose_thresholds(min_translation, min_rotation)
+    if move_speed:
+        robot.move(move_speed)
+    else:
+        robot.rotate(rotate_speed)
+    receiver._receive_all()
+    for _ in range(0, NUM_UPDATES):
+        clock.advance(UPDATE_INTERVAL)
+        robot._update()
+    num_poses = len(receiver._receive_all())
+    assert num_poses >= 1
+    return num_poses - 1
+
+def check_no_thresholds():
+    """Every update is broadcast by default."""
+    assert count_pose_updates(move_speed=1) == NUM_UPDATES - 1
+    assert count_pose_updates(rotate_speed=1) == NUM_UPDATES - 1
+def check_translation_threshold():
+    """A translation threshold alone skips small moves but not rotations."""
+    assert count_pose_updates(move_speed=1, min_translation=5) == 0
+    assert count_pose_updates(move_speed=10, min_translation=2.5) == 3
+    assert count_pose_updates(rotate_speed=1, min_translation=5) == NUM_UPDATES - 1
+def check_rotation_threshold():
+    """A rotation threshold alone skips small rotations but not moves."""
+    assert count_pose_updates(rotate_speed=0.1, min_rotation=0.5) == 0
+    assert count_pose_updates(rotate_speed=1, min_rotation=0.25) == 3
+    assert count_pose_updates(move_speed=1, min_rotation=0.5) == NUM_UPDATES - 1
+def check_rotation_wraparound():
+    """An angle which wraps past +/-pi is not mistaken for a large rotation."""
+    clock = SimulationClock(UPDATE_INTERVAL)
+    robot = VirtualRobot("Robot", UPDATE_INTERVAL, Pose(to_vector(0, 0), np.pi - 0.05),
+                         clock=clock)
+    receiver = Receiver()
+    robot.register("Pose", receiver)
+    robot.set_pose_thresholds(min_rotation=0.5)
+    robot.rotate(0.1)
+    clock.advance(UPDATE_INTERVAL)
+    robot._update()
+    assert len(receiver._receive_all()) == 1
+    robot._pose_angle = robot._pose_angle - 2 * np.pi
+    for _ in range(0, NUM_UPDATES):
+        clock.advance(UPDATE_INTERVAL)
+        robot._update()
+    assert not receiver._receive_all()
+def check_beeper_backlog():
+    """A Beeper with a backlog of Beeps drops the oldest ones, so the last note is played."""
+    class BeepingRobot(Robot):
+        """A virtual robot which records the notes it beeps."""
+        def __init__(self):
+            super(BeepingRobot, self).__init__(None, VirtualRobot("Robot"))
+            self.notes = []
+        def beep(self, note):
+            self.notes.append(note)
+    robot = BeepingRobot()
+    beeper = Beeper("Beeper", robot, queue_depth=4, clock=SimulationClock(UPDATE_INTERVAL))
+    beeper.send_many([Signal("Beep", "Check", "Robot", (note, 0.1))
+                      for note in (40, 45, 50, 55, 60, 0)])
+    for beep in beeper._receive_all():
+        beeper._react(beep)
+    assert robot.notes == [50, 55, 60, 0]
+    assert beeper.get_drop_counts() == {"Beep": 2}
+
+CHECKS = [check_no_thresholds, check_translation_threshold, check_rotation_threshold,
+          check_rotation_wraparound, check_beeper_backlog]
+
+def main():
+    """Runs checks."""
+    return 1 if run_checks(CHECKS) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
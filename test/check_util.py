@@ -0,0 +1,112 @@
+"""Checks the sliding-window filters and FilterBank against numpy over random signals.
+
+Run with `python -m test.check_util`; exits with an error if any check fails.
+"""
+import sys
+import random
+
+import numpy as np
+
+from components.util import moving_quantile, moving_median, moving_mean, FilterBank
+from test.checking import run_checks
+
+NUM_SAMPLES = 500
+
+def make_signal(rng, integers=False):
+    """Returns a list of random samples, with runs of repeated values."""
+    signal = []
+    while len(signal) < NUM_SAMPLES:
+        value = rng.randint(0, 20) if integers else rng.gauss(0, 100)
+        signal.extend([value] * rng.choice((1, 1, 1, 3)))
+    return signal[:NUM_SAMPLES]
+def expected_filtered(signal, max_samples, reduce_window):
+    """Returns a list of reduce_window applied to each full window of the signal, or None
+    for each sample before the first full window."""
+    return [None if index + 1 < max_samples
+            else reduce_window(signal[index + 1 - max_samples:index + 1])
+            for index in range(0, len(signal))]
+def same_filtered(actual, expected):
+    """Checks whether two lists of filtered values are equal, up to rounding errors."""
+    return (len(actual) == len(expected)
+            and all(a is b if a is None or b is None else np.isclose(a, b, rtol=1e-9)
+                    for (a, b) in zip(actual, expected)))
+
+def check_moving_quantile():
+    """moving_quantile interpolates between samples in the same way as numpy.percentile."""
+    rng = random.Random(0)
+    for integers in (False, True):
+        signal = make_signal(rng, integers)
+        for max_samples in (1, 2, 5, 8, 31):
+            for quantile in (0, 0.1, 0.25, 0.5, 0.9, 1):
+                filtered = moving_quantile(max_samples, quantile)
+                expected = expected_filtered(
+                    signal, max_samples,
+                    lambda window, quantile=quantile: np.percentile(window, 100 * quantile))
+                assert same_filtered([filtered.send(value) for value in signal], expected)
+def check_moving_median():
+    """moving_median equals numpy.median of each window, including integer samples."""
+    rng = random.Random(1)
+    for integers in (False, True):
+        signal = make_signal(rng, integers)
+        for max_samples in (1, 2, 5, 8, 31):
+            filtered = moving_median(max_samples)
+            assert same_filtered([filtered.send(value) for value in signal],
+                                 expected_filtered(signal, max_samples, np.median))
+def check_moving_mean():
+    """moving_mean equals numpy.mean of each window."""
+    rng = random.Random(2)
+    signal = make_signal(rng)
+    for max_samples in (1, 2, 5, 8, 31):
+        filtered = moving_mean(max_samples)
+        assert same_filtered([filtered.send(value) for value in signal],
+                             expected_filtered(signal, max_samples, np.mean))
+def check_reset():
+    """Sending None discards the window, so the filters wait for a new full window."""
+    for make_filter in (moving_median, moving_mean):
+        filtered = make_filter(3)
+        assert [filtered.send(value) for value in (1, 2, 3)] == [None, None, 2]
+        assert filtered.send(None) is None
+        assert [filtered.send(value) for value in (10, 20, 30, 40)] == [None, None, 20, 30]
+def check_filter_bank():
+    """Each FilterBank channel filters like a moving_quantile with the same window size,
+    whether channels are updated together or only some at a time."""
+    rng = random.Random(3)
+    window_sizes = (1, 2, 5, 8, 31, 5)
+    for quantile in (0.5, 0.25):
+        bank = FilterBank(window_sizes[:3], quantile)
+        bank.add_channels(window_sizes[3:])
+        assert len(bank) == len(window_sizes)
+        assert bank.update([], []) == []
+        signals = [make_signal(rng) for _ in window_sizes]
+        filters = [moving_quantile(max_samples, quantile) for max_samples in window_sizes]
+        all_channels = range(0, len(window_sizes))
+        for index in range(0, NUM_SAMPLES):
+            if index % 2:
+                channels = [channel for channel in all_channels if rng.random() < 0.5]
+                filtered = bank.update([signals[channel][index] for channel in channels],
+                                       channels)
+            else:
+                channels = all_channels
+                filtered = bank.update([signal[index] for signal in signals])
+            expected = [filters[channel].send(signals[channel][index]) for channel in channels]
+            assert same_filtered(filtered, expected)
+def check_filter_bank_reset():
+    """Updating a FilterBank channel with None resets only that channel."""
+    bank = FilterBank((3, 3))
+    assert bank.update([1, 1]) == [None, None]
+    assert bank.update([2, 2]) == [None, None]
+    assert bank.update([3, 3]) == [2, 2]
+    assert bank.update([None, 4]) == [None, 3]
+    assert bank.update([10, 5], [0, 1]) == [None, 4]
+    assert bank.update([20], [0]) == [None]
+    assert bank.update([30], [0]) == [20]
+
+CHECKS = [check_moving_quantile, check_moving_median, check_moving_mean, check_reset,
+          check_filter_bank, check_filter_bank_reset]
+
+def main():
+    """Runs checks."""
+    return 1 if run_checks(CHECKS) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+"""Support for the assertion-based check scripts in test."""
+
+def run_checks(checks):
+    """Runs each check function and prints its result. Returns the number of failed checks.
+    A check fails if it raises an AssertionError."""
+    num_failed = 0
+    for check in checks:
+        try:
+            check()
+        except AssertionError:
+            num_failed += 1
+            print("FAIL {}: {}".format(check.__name__, check.__doc__))
+        else:
+            print("ok   {}".format(check.__name__))
+    return num_failed
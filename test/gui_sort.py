@@ -16,6 +16,23 @@ from components.control import Motion, Pause, Wait, Finished, Color, Beep, Servo
 from components.control import PrimitiveController, SimplePrimitivePlanner
 from components.app import Simulator
 
+# Centroid poses at which the distributor and deliverer robots start
+START_POSES = (Pose(to_vector(-6, -6), 0), Pose(to_vector(24, 0), np.pi))
+# Calibration of the robots' speed multipliers
+MOVE_MULTIPLIER = 0.105
+ROTATE_MULTIPLIER = 0.06
+
+def populate_world(world):
+    """Adds the walls and the first package of the sorting scenario to the VirtualWorld."""
+    world.add_wall(Wall(0, center_x=-12, x_length=4, y_length=20))
+    world.add_wall(Wall(1, center_x=-8, center_y=-12, x_length=4, y_length=4))
+    world.add_wall(Wall(2, center_x=8, center_y=-12, x_length=4, y_length=4))
+    world.add_wall(Wall(3, center_x=12, center_y=-11, x_length=4, y_length=10))
+    world.add_wall(Wall(4, center_x=8, center_y=12, x_length=4, y_length=4))
+    world.add_wall(Wall(5, center_x=12, center_y=11, x_length=4, y_length=10))
+    world.add_wall(Wall(6, center_x=-8, center_y=12, x_length=4, y_length=4))
+    world.add_package(Package(7, center_x=18))
+
 class DistributePlanner(SimplePrimitivePlanner):
     """Plans distribution of even-numbered and odd-numbered boxes."""
     def _generate_commands(self):
@@ -199,10 +216,10 @@ class GUISort(Simulator):
 
         controller_0 = PrimitiveController("MotionController 0", self._robots[0], monitor_0)
         controller_0.register("Moved", self)
-        self.register("Motion", controller_0)
-        self.register("Stop", controller_0)
-        self.register("Pause", controller_0)
-        self.register("Resume", controller_0)
+        self.register("Motion", controller_0, self._robots[0].get_name())
+        self.register("Stop", controller_0, self._robots[0].get_name())
+        self.register("Pause", controller_0, self._robots[0].get_name())
+        self.register("Resume", controller_0, self._robots[0].get_name())
         controller_0.register("LocalizeProx", self._world)
         controller_0.register("LocalizePSD", self._world)
         self._add_thread(controller_0)
@@ -213,18 +230,18 @@ class GUISort(Simulator):
         planner_0.register("Localize", controller_0)
         planner_0.register("Stop", controller_0)
         controller_0.register("Moved", planner_0)
-        self.register("Start", planner_0)
-        self.register("Reset", planner_0)
+        self.register("Start", planner_0, self._robots[0].get_name())
+        self.register("Reset", planner_0, self._robots[0].get_name())
         planner_0.register("Beep", beeper_0)
         planner_0.register("Servo", monitor_0)
         self._add_thread(planner_0)
 
         controller_1 = PrimitiveController("MotionController 1", self._robots[1], monitor_1)
         controller_1.register("Moved", self)
-        self.register("Motion", controller_1)
-        self.register("Stop", controller_1)
-        self.register("Pause", controller_1)
-        self.register("Resume", controller_1)
+        self.register("Motion", controller_1, self._robots[1].get_name())
+        self.register("Stop", controller_1, self._robots[1].get_name())
+        self.register("Pause", controller_1, self._robots[1].get_name())
+        self.register("Resume", controller_1, self._robots[1].get_name())
         controller_1.register("LocalizeProx", self._world)
         controller_1.register("LocalizePSD", self._world)
         self._add_thread(controller_1)
@@ -235,8 +252,8 @@ class GUISort(Simulator):
         planner_1.register("Localize", controller_1)
         planner_1.register("Stop", controller_1)
         controller_1.register("Moved", planner_1)
-        self.register("Start", planner_1)
-        self.register("Reset", planner_1)
+        self.register("Start", planner_1, self._robots[1].get_name())
+        self.register("Reset", planner_1, self._robots[1].get_name())
         planner_1.register("Beep", beeper_1)
         planner_1.register("Servo", monitor_1)
         self._add_thread(planner_1)
@@ -250,27 +267,17 @@ class GUISort(Simulator):
         self._enable_start_button()
 
         # Calibration
-        self._robots[0].move_multiplier = 0.105
-        self._robots[0].rotate_multiplier = 0.06
+        self._robots[0].move_multiplier = MOVE_MULTIPLIER
+        self._robots[0].rotate_multiplier = ROTATE_MULTIPLIER
         self._robots[0].set_wheel_balance(11)
-        self._robots[1].move_multiplier = 0.105
-        self._robots[1].rotate_multiplier = 0.06
+        self._robots[1].move_multiplier = MOVE_MULTIPLIER
+        self._robots[1].rotate_multiplier = ROTATE_MULTIPLIER
     def _generate_virtual_robots(self):
-        yield VirtualRobot("Robot 0",
-                           pose=centroid_to_instant_center(Pose(to_vector(-6, -6), 0)),
-                           servo_angle=(0.5 * np.pi))
-        yield VirtualRobot("Robot 1",
-                           pose=centroid_to_instant_center(Pose(to_vector(24, 0), np.pi)),
-                           servo_angle=(0.5 * np.pi))
+        for (index, pose) in enumerate(START_POSES):
+            yield VirtualRobot("Robot {}".format(index), pose=centroid_to_instant_center(pose),
+                               servo_angle=(0.5 * np.pi))
     def _populate_world(self):
-        self._world.add_wall(Wall(0, center_x=-12, x_length=4, y_length=20))
-        self._world.add_wall(Wall(1, center_x=-8, center_y=-12, x_length=4, y_length=4))
-        self._world.add_wall(Wall(2, center_x=8, center_y=-12, x_length=4, y_length=4))
-        self._world.add_wall(Wall(3, center_x=12, center_y=-11, x_length=4, y_length=10))
-        self._world.add_wall(Wall(4, center_x=8, center_y=12, x_length=4, y_length=4))
-        self._world.add_wall(Wall(5, center_x=12, center_y=11, x_length=4, y_length=10))
-        self._world.add_wall(Wall(6, center_x=-8, center_y=12, x_length=4, y_length=4))
-        self._world.add_package(Package(7, center_x=18))
+        populate_world(self._world)
     def _start_simulator(self):
         self.__stop_button.config(state="disabled")
         self.broadcast(Signal("Start", self.get_name(), self._robots[0].get_name(), None))
@@ -0,0 +1,91 @@
+"""Measures how long sensor values take to go from a received packet to a Monitor's Signals.
+Runs a SimpleMonitor against a LocalPacketSource in place of a real robot, once polling
+every update interval and once driven by packet arrival, and reports the latency from
+each packet's arrival to the broadcast of its values or of newer ones, and the numbers of
+packets which were broadcast, skipped, or broadcast more than once.
+
+Run with `python -m test.monitor_latency`.
+"""
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from components.concurrency import Reactor
+from components.robots import Robot, LocalPacketSource
+from components.sensors import SimpleMonitor
+
+class PacketCounter(object):
+    """Generates sensor values which identify each packet, and records when each was sent."""
+    def __init__(self):
+        self.send_times = []
+
+    def __call__(self):
+        packet_id = len(self.send_times)
+        self.send_times.append(time.time())
+        return {"proximity": (packet_id % 256, packet_id // 256 % 256)}
+
+class LatencySink(Reactor):
+    """Records when the values of each packet were received."""
+    def __init__(self):
+        super(LatencySink, self).__init__("Latency Sink")
+        self.receive_times = []
+
+    def _react(self, signal):
+        if signal.Name == "Proximity":
+            packet_id = signal.Data[0] + 256 * signal.Data[1]
+            self.receive_times.append((packet_id, time.time()))
+
+def measure(event_driven, duration, packet_interval, update_interval):
+    """Runs a Monitor for the duration and returns a dict of its latency statistics."""
+    counter = PacketCounter()
+    source = LocalPacketSource(packet_interval=packet_interval, read_sensors=counter)
+    robot = Robot(source.get_hamster())
+    monitor = SimpleMonitor("Monitor", robot, update_interval, event_driven=event_driven)
+    sink = LatencySink()
+    monitor.register("Proximity", sink)
+    for thread in (sink, source, monitor):
+        thread.start()
+    time.sleep(duration)
+    for thread in (source, monitor, sink):
+        thread.quit()
+    packet_ids = [packet_id for (packet_id, _) in sink.receive_times]
+    latencies = []
+    receive_times = iter(sink.receive_times)
+    (received_id, receive_time) = next(receive_times)
+    for packet_id in range(packet_ids[0], packet_ids[-1] + 1):
+        while received_id < packet_id:
+            (received_id, receive_time) = next(receive_times)
+        latencies.append(receive_time - counter.send_times[packet_id])
+    return {
+        "broadcast": len(set(packet_ids)),
+        "skipped": packet_ids[-1] + 1 - packet_ids[0] - len(set(packet_ids)),
+        "repeated": len(packet_ids) - len(set(packet_ids)),
+        "latency": np.array(latencies)
+    }
+
+def main():
+    """Measures latency of polling and event-driven Monitors."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=5,
+                        help="seconds to run each Monitor for, including its warmup")
+    parser.add_argument("--packet-interval", type=float, default=0.02,
+                        help="seconds between packets, 0.02 for the dongle's 50 Hz")
+    parser.add_argument("--update-interval", type=float, default=0.1,
+                        help="seconds between updates of the polling Monitor")
+    args = parser.parse_args()
+
+    for (mode, event_driven) in (("polling", False), ("event-driven", True)):
+        stats = measure(event_driven, args.duration, args.packet_interval,
+                        args.update_interval)
+        latency = stats["latency"] * 1000
+        print("{}: {} packets broadcast, {} skipped, {} repeated".format(
+            mode, stats["broadcast"], stats["skipped"], stats["repeated"]))
+        print("  latency: mean {:.2f} ms, median {:.2f} ms, p95 {:.2f} ms, max {:.2f} ms"
+              .format(np.mean(latency), np.median(latency), np.percentile(latency, 95),
+                      np.max(latency)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())